@@ -0,0 +1,7 @@
+"""Performance benchmarks, run each module with ``python -m``
+
+``forest_lite.benchmarks.suite`` times the tile pipeline on synthetic
+data and compares runs against saved JSON baselines.
+``forest_lite.benchmarks.replay`` load tests a server with browser-like
+sessions.
+"""
@@ -0,0 +1,440 @@
+"""Replay browser sessions against the server to measure capacity
+
+Synthetic sessions behave like the client: load the dataset
+description and axes, then pan, zoom and animate a map, requesting
+every tile in the viewport at once like ``client/src/tiling.js``.
+Requests recorded in the server log, see ``TimingMiddleware``, can be
+replayed instead.
+
+Run against the ASGI app in-process, no sockets involved,
+
+.. code-block:: sh
+
+    python -m forest_lite.benchmarks.replay --config config.yaml
+
+or against a running server,
+
+.. code-block:: sh
+
+    python -m forest_lite.benchmarks.replay --url http://localhost:1234
+
+Throughput, latency percentiles and error rates are reported by
+request kind along with cache hit ratios read from ``/metrics``.
+"""
+import asyncio
+import json
+import math
+import time
+import urllib.parse
+from typing import List, NamedTuple
+import numpy as np
+import typer
+
+
+app = typer.Typer()
+
+VIEWPORT = (1024, 768)  # Map width, height in pixels
+MAX_ZOOM = 10
+
+
+class Result(NamedTuple):
+    url: str
+    kind: str
+    status: int
+    seconds: float
+    size: int
+
+
+class Layer(NamedTuple):
+    """Data variable of a dataset and the axis values to animate"""
+    dataset_id: int
+    data_var: str
+    dims: dict
+
+
+class InProcess:
+    """Send requests straight to an ASGI application"""
+    def __init__(self, asgi_app):
+        self.asgi_app = asgi_app
+
+    async def get(self, url):
+        path, _, query_string = url.partition("?")
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "server": ("replay", 80),
+            "client": ("replay", 0),
+            "root_path": "",
+            "path": urllib.parse.unquote(path),
+            "raw_path": path.encode(),
+            "query_string": query_string.encode(),
+            "headers": [],
+        }
+        status = None
+        chunks = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.asgi_app(scope, receive, send)
+        return status, b"".join(chunks)
+
+    async def close(self):
+        pass
+
+
+class Remote:
+    """Send requests to a running server over HTTP"""
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self._session = None
+
+    async def get(self, url):
+        import aiohttp
+        import yarl
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=0)
+            self._session = aiohttp.ClientSession(connector=connector)
+        target = yarl.URL(self.base_url + url, encoded=True)
+        async with self._session.get(target) as response:
+            return response.status, await response.read()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+
+def request_kind(url):
+    """Group requests by endpoint for reporting"""
+    path = url.partition("?")[0]
+    parts = path.strip("/").split("/")
+    if "tiles" in parts:
+        return "tile"
+    if "axis" in parts:
+        return "axis"
+    if parts[0] == "datasets" and len(parts) == 2:
+        return "description"
+    return parts[0] or "index"
+
+
+def is_lon_lat_dim(dim_name):
+    return ("latitude" in dim_name) or ("longitude" in dim_name)
+
+
+def axis_url(dataset_id, data_var, dim_name):
+    return (f"/datasets/{dataset_id}/{urllib.parse.quote(data_var)}"
+            f"/axis/{urllib.parse.quote(dim_name)}")
+
+
+def tile_url(dataset_id, data_var, zxy, query=None):
+    z, x, y = zxy
+    url = (f"/datasets/{dataset_id}/{urllib.parse.quote(data_var)}"
+           f"/tiles/{z}/{x}/{y}")
+    if query:
+        url += "?" + urllib.parse.urlencode({"query": json.dumps(query)})
+    return url
+
+
+def viewport_tiles(centre, zoom, viewport=VIEWPORT):
+    """Z/X/Y indices covering a viewport centred on world coordinates
+
+    World coordinates run from 0 to 256 across the map at zoom level
+    0, as in ``client/src/tiling.js``.
+    """
+    width, height = viewport
+    scale = 2 ** zoom
+    x, y = centre
+    half_width = width / (2 * scale)
+    half_height = height / (2 * scale)
+    i_start, i_end = (math.floor((x - half_width) * scale / 256),
+                      math.floor((x + half_width) * scale / 256))
+    j_start, j_end = (math.floor((y - half_height) * scale / 256),
+                      math.floor((y + half_height) * scale / 256))
+    return [(zoom, i, j)
+            for i in range(max(i_start, 0), min(i_end, scale - 1) + 1)
+            for j in range(max(j_start, 0), min(j_end, scale - 1) + 1)]
+
+
+def synthetic_session(layer, steps=20, seed=0, viewport=VIEWPORT):
+    """Steps of a user exploring a layer, each a list of URLs
+
+    Requests within a step are sent together.
+    """
+    rng = np.random.default_rng(seed)
+    dims = {dim: values for dim, values in layer.dims.items()
+            if len(values) > 0}
+    index = {dim: len(values) - 1 for dim, values in dims.items()}
+    animated = [dim for dim in dims if "time" in dim]
+    centre = rng.uniform(64, 192, size=2)
+    zoom = int(rng.integers(1, 5))
+
+    session = [["/datasets", f"/datasets/{layer.dataset_id}", "/viewport"] +
+               [axis_url(layer.dataset_id, layer.data_var, dim)
+                for dim in layer.dims]]
+    for _ in range(steps):
+        action = rng.choice(["pan", "zoom", "animate"], p=[0.5, 0.25, 0.25])
+        if action == "animate" and len(animated) > 0:
+            dim = animated[0]
+            index[dim] = (index[dim] + 1) % len(dims[dim])
+        elif action == "zoom":
+            zoom = int(np.clip(zoom + rng.choice([-1, 1]), 0, MAX_ZOOM))
+        else:
+            step = np.array(viewport) / (2 * 2 ** zoom)
+            centre = np.clip(centre + rng.normal(scale=step), 0, 256)
+        query = {dim: dims[dim][i] for dim, i in index.items()}
+        session.append([tile_url(layer.dataset_id, layer.data_var, zxy,
+                                 query)
+                        for zxy in viewport_tiles(centre, zoom, viewport)])
+    return session
+
+
+def recorded_sessions(path):
+    """Requests from a log of JSON request records
+
+    Lines with a JSON object holding ``path`` and ``query_string``,
+    e.g. the server's request log, are replayed one request per
+    session in the order they were recorded.
+    """
+    sessions = []
+    with open(path) as stream:
+        for line in stream:
+            start = line.find("{")
+            if start < 0:
+                continue
+            try:
+                record = json.loads(line[start:])
+            except ValueError:
+                continue
+            if "path" not in record:
+                continue
+            url = urllib.parse.quote(record["path"])
+            if record.get("query_string"):
+                url += "?" + record["query_string"]
+            sessions.append([[url]])
+    return sessions
+
+
+async def discover(client, dataset_ids=None):
+    """Layers served by the server with the values of their axes"""
+    status, body = await client.get("/datasets")
+    if status != 200:
+        raise Exception(f"GET /datasets: HTTP {status}")
+    layers = []
+    for dataset in json.loads(body)["datasets"]:
+        uid = dataset["id"]
+        if dataset_ids and uid not in dataset_ids:
+            continue
+        status, body = await client.get(f"/datasets/{uid}")
+        if status != 200:
+            continue
+        for data_var, info in json.loads(body).get("data_vars", {}).items():
+            dims = {}
+            for dim in info.get("dims", []):
+                if is_lon_lat_dim(dim):
+                    continue
+                status, body = await client.get(axis_url(uid, data_var, dim))
+                if status == 200:
+                    dims[dim] = json.loads(body).get("data", [])
+            layers.append(Layer(uid, data_var, dims))
+    return layers
+
+
+async def timed_get(client, url):
+    start = time.perf_counter()
+    try:
+        status, body = await client.get(url)
+        size = len(body)
+    except Exception:
+        status, size = None, 0
+    return Result(url, request_kind(url), status,
+                  time.perf_counter() - start, size)
+
+
+async def replay(client, sessions, concurrency=4, think=0.):
+    """Run sessions with a number of simultaneous users
+
+    :returns: list of Result and elapsed seconds
+    """
+    results = []
+    remaining = iter(sessions)
+
+    async def user():
+        for session in remaining:
+            for step in session:
+                results.extend(await asyncio.gather(
+                    *(timed_get(client, url) for url in step)))
+                if think > 0:
+                    await asyncio.sleep(think)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return results, time.perf_counter() - start
+
+
+def summarize(results, seconds):
+    """Throughput, latency percentiles and error rate by request kind"""
+    def stats(items):
+        latencies = np.array([item.seconds for item in items]) * 1000
+        errors = sum(1 for item in items
+                     if item.status is None or item.status >= 400)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        return {
+            "requests": len(items),
+            "errors": errors,
+            "error_rate": errors / len(items),
+            "p50_ms": p50,
+            "p95_ms": p95,
+            "p99_ms": p99,
+            "bytes": sum(item.size for item in items),
+        }
+
+    kinds = sorted({result.kind for result in results})
+    summary = {
+        "seconds": seconds,
+        "throughput": len(results) / seconds if seconds > 0 else 0.,
+        "kinds": {kind: stats([result for result in results
+                               if result.kind == kind])
+                  for kind in kinds},
+    }
+    if len(results) > 0:
+        summary["total"] = stats(results)
+    return summary
+
+
+def cache_counts(text):
+    """Cache hits and misses from /metrics text"""
+    counts = {}
+    for line in text.splitlines():
+        for family, i in (("forest_lite_cache_hits_total", 0),
+                          ("forest_lite_cache_misses_total", 1)):
+            prefix = family + '{cache="'
+            if line.startswith(prefix):
+                name, _, value = line[len(prefix):].partition('"} ')
+                counts.setdefault(name, [0., 0.])[i] = float(value)
+    return counts
+
+
+def cache_ratios(before, after):
+    """Hit ratio of each cache used between two /metrics snapshots"""
+    ratios = {}
+    for name, (hits, misses) in after.items():
+        old_hits, old_misses = before.get(name, (0., 0.))
+        total = (hits - old_hits) + (misses - old_misses)
+        if total > 0:
+            ratios[name] = (hits - old_hits) / total
+    return ratios
+
+
+async def metrics_snapshot(client):
+    status, body = await client.get("/metrics")
+    if status != 200:
+        return {}
+    return cache_counts(body.decode())
+
+
+async def run(client, sessions=None, layers=None, n_sessions=20, steps=20,
+              concurrency=4, think=0., seed=0):
+    """Replay recorded sessions, or synthetic sessions over layers"""
+    try:
+        if sessions is None:
+            if layers is None:
+                layers = await discover(client)
+            if len(layers) == 0:
+                raise Exception("no layers to replay")
+            sessions = [synthetic_session(layers[i % len(layers)],
+                                          steps=steps, seed=seed + i)
+                        for i in range(n_sessions)]
+        before = await metrics_snapshot(client)
+        results, seconds = await replay(client, sessions,
+                                        concurrency=concurrency,
+                                        think=think)
+        after = await metrics_snapshot(client)
+    finally:
+        await client.close()
+    summary = summarize(results, seconds)
+    summary["concurrency"] = concurrency
+    summary["caches"] = cache_ratios(before, after)
+    return summary
+
+
+def report(summary):
+    """Plain text table of a summary"""
+    lines = [f"{summary.get('total', {}).get('requests', 0)} requests in "
+             f"{summary['seconds']:.2f}s, {summary['throughput']:.1f} req/s"
+             f" with {summary['concurrency']} users",
+             "",
+             f"{'kind':<12} {'requests':>8} {'errors':>7} {'p50 ms':>9}"
+             f" {'p95 ms':>9} {'p99 ms':>9} {'MB':>8}"]
+    rows = list(summary["kinds"].items())
+    if "total" in summary:
+        rows.append(("total", summary["total"]))
+    for kind, stats in rows:
+        lines.append(f"{kind:<12} {stats['requests']:>8}"
+                     f" {stats['error_rate']:>7.1%}"
+                     f" {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f}"
+                     f" {stats['p99_ms']:>9.1f}"
+                     f" {stats['bytes'] / 1e6:>8.2f}")
+    if summary["caches"]:
+        lines += ["", f"{'cache':<32} {'hit ratio':>9}"]
+        for name, ratio in sorted(summary["caches"].items()):
+            lines.append(f"{name:<32} {ratio:>9.1%}")
+    return "\n".join(lines)
+
+
+def client_for(url, config_file):
+    if url is not None:
+        return Remote(url)
+    import forest_lite.server.main as _main
+    from forest_lite.server import config
+    if config_file is not None:
+        _main.app.dependency_overrides[config.get_settings] = (
+            config.ConfigFile(config_file))
+    return InProcess(_main.app)
+
+
+@app.command()
+def main(config_file: str = typer.Option(None, "--config"),
+         url: str = None,
+         record: str = None,
+         sessions: int = 20,
+         steps: int = 20,
+         concurrency: int = 4,
+         dataset: List[int] = typer.Option(None),
+         think: float = 0.,
+         seed: int = 0,
+         save: str = None):
+    """
+    Replay pan, zoom and animate sessions against the server.
+    """
+    client = client_for(url, config_file)
+    recorded = None
+    if record is not None:
+        recorded = recorded_sessions(record)
+
+    async def go():
+        layers = None
+        if recorded is None:
+            layers = await discover(client, dataset_ids=dataset)
+        return await run(client, sessions=recorded, layers=layers,
+                         n_sessions=sessions, steps=steps,
+                         concurrency=concurrency, think=think, seed=seed)
+
+    summary = asyncio.run(go())
+    typer.echo(report(summary))
+    if save is not None:
+        with open(save, "w") as stream:
+            json.dump(summary, stream, indent=2)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,79 @@
+"""Compare forest_lite JSON encoding with bokeh's serialize_json
+
+Run with ``python -m forest_lite.benchmarks.serialize``
+"""
+import datetime as dt
+import timeit
+import numpy as np
+from forest_lite.server.lib.serialize import serialize_json
+
+
+def payloads(seed=0):
+    """Representative response bodies"""
+    rng = np.random.default_rng(seed)
+    size = 256
+
+    # Tile downsampled from a fine grid, mostly distinct values
+    image = rng.random((size, size)).astype("f")
+    image[image < 0.3] = np.nan
+    yield "tile (distinct values)", tile(np.ma.masked_invalid(image))
+
+    # Tile upsampled from a coarse grid, e.g. zoomed in beyond the model
+    coarse = rng.random((size // 8, size // 8)).astype("f")
+    image = np.repeat(np.repeat(coarse, 8, axis=0), 8, axis=1)
+    image[:size // 4] = np.nan
+    yield "tile (repeated values)", tile(np.ma.masked_invalid(image))
+
+    # Axis of validity times
+    start = dt.datetime(2021, 1, 1)
+    times = [start + i * dt.timedelta(minutes=15) for i in range(5000)]
+    yield "axis (datetimes)", {"data": times, "attrs": {}}
+
+    # Natural Earth multi-line, many short lines
+    lines = [rng.random(rng.integers(2, 50)) * 1e7 for _ in range(4000)]
+    yield "natural earth (multi-line)", {"xs": lines, "ys": lines}
+
+
+def tile(image):
+    return {
+        "data": {
+            "x": [0.], "y": [0.], "dw": [1.], "dh": [1.],
+            "image": [image], "level": [0],
+            "units": ["K"], "tile_key": [[0, 0, 0]]
+        }
+    }
+
+
+def measure(fn, obj, number=5, repeat=3):
+    """Best time per call in seconds"""
+    return min(timeit.repeat(lambda: fn(obj), number=number,
+                             repeat=repeat)) / number
+
+
+def run():
+    from bokeh.core.json_encoder import serialize_json as bokeh_json
+    results = []
+    for label, obj in payloads():
+        results.append({
+            "name": label,
+            "bokeh_bytes": len(bokeh_json(obj)),
+            "forest_lite_bytes": len(serialize_json(obj)),
+            "bokeh_s": measure(bokeh_json, obj),
+            "forest_lite_s": measure(serialize_json, obj),
+        })
+    return results
+
+
+def main():
+    print(f"{'payload':<28} {'bokeh':>10} {'forest_lite':>12} {'speedup':>8}"
+          f" {'size':>6}")
+    for result in run():
+        bokeh_ms = result["bokeh_s"] * 1000
+        ours_ms = result["forest_lite_s"] * 1000
+        size = result["forest_lite_bytes"] / result["bokeh_bytes"]
+        print(f"{result['name']:<28} {bokeh_ms:>8.2f}ms {ours_ms:>10.2f}ms"
+              f" {bokeh_ms / ours_ms:>7.1f}x {size:>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""Benchmark suite of the tile pipeline on synthetic data
+
+Times projection and regridding (``core._tile``,
+``geo.datashader_stretch``), driver ``data_tile`` calls, JSON
+serialization and Natural Earth processing across zoom levels.
+
+Run with ``python -m forest_lite.benchmarks.suite``, save a baseline
+and compare later runs against it to flag regressions:
+
+.. code-block:: sh
+
+    python -m forest_lite.benchmarks.suite --size medium --save base.json
+    python -m forest_lite.benchmarks.suite --size medium --compare base.json
+
+Comparisons exit with status 1 if any benchmark is slower than the
+baseline by more than the threshold.
+"""
+import datetime as dt
+import fnmatch
+import json
+import platform
+import statistics
+import tempfile
+import timeit
+import numpy as np
+import typer
+from forest_lite.benchmarks import synthetic
+
+
+ZOOMS = (0, 3, 6)
+
+app = typer.Typer()
+
+
+def tile_containing(lon, lat, z):
+    """Z/X/Y of the tile at a longitude, latitude"""
+    from forest_lite.server.lib import tiling
+    (x0, x1), (y0, y1) = tiling.google_limits()
+    x, y = tiling.web_mercator(np.array([lon]), np.array([lat]))
+    n = 2 ** z
+    i = int(np.clip((x[0] - x0) // ((x1 - x0) / n), 0, n - 1))
+    j = int(np.clip((y[0] - y0) // ((y1 - y0) / n), 0, n - 1))
+    return z, i, j
+
+
+def centre(tilable):
+    lons, lats = tilable["longitude"], tilable["latitude"]
+    return float(np.median(lons)), float(np.median(lats))
+
+
+def benchmarks(size, directory):
+    """Names and functions to time, inputs are built once up front"""
+    yield from tile_benchmarks(size, directory)
+    yield from driver_benchmarks(size, directory)
+    yield from serialize_benchmarks()
+    yield from natural_earth_benchmarks()
+
+
+def tile_benchmarks(size, directory):
+    from forest_lite.server.lib import core, geo, tiling
+    for grid, generate in synthetic.GRIDS.items():
+        path = f"{directory}/{grid}.nc"
+        synthetic.write_netcdf(path, *generate(synthetic.shape(size)))
+        tilable = synthetic.read_netcdf(path)
+        lon, lat = centre(tilable)
+        for z in ZOOMS:
+            zxy = tile_containing(lon, lat, z)
+            yield (f"tile.{grid}.z{z}",
+                   lambda tilable=tilable, zxy=zxy: core._tile(tilable,
+                                                               *zxy))
+
+        # Regrid alone, coordinates already in Web Mercator
+        gx, gy = tiling.web_mercator(tilable["longitude"],
+                                     tilable["latitude"])
+        x_range, y_range = tiling.tile_extents(tile_containing(lon, lat, 0))
+        yield (f"stretch.{grid}",
+               lambda values=tilable["values"], gx=gx, gy=gy,
+               x_range=x_range, y_range=y_range: geo.datashader_stretch(
+                   values, gx, gy, x_range, y_range,
+                   plot_width=core.TILE_SIZE, plot_height=core.TILE_SIZE))
+
+
+def driver_benchmarks(size, directory):
+    from forest_lite.server.drivers import xarray_h5netcdf
+    from forest_lite.server.drivers.base import BaseDriver
+
+    # Regular lat/lon netCDF file read on every call
+    path = f"{directory}/driver.nc"
+    lons, lats, values = synthetic.regular_grid(synthetic.shape(size))
+    synthetic.write_netcdf(path, lons, lats, values)
+    settings = {"pattern": path}
+
+    def netcdf_tile(zxy):
+        xarray_h5netcdf._data_tile.cache_clear()
+        return xarray_h5netcdf.driver.data_tile(settings, synthetic.DATA_VAR,
+                                                *zxy)
+
+    for z in ZOOMS:
+        zxy = tile_containing(0, 50, z)
+        yield (f"driver.xarray_h5netcdf.z{z}",
+               lambda zxy=zxy: netcdf_tile(zxy))
+
+    # Decoded GRIB2 field served through BaseDriver.data_tile, as the
+    # nearcast driver does once pygrib has read the message
+    driver = BaseDriver()
+    tilable = synthetic.grib_tilable(synthetic.shape(size))
+
+    @driver.override("tilable")
+    def grib_tilable(settings, data_var, query=None):
+        return tilable
+
+    for z in ZOOMS:
+        zxy = tile_containing(0, 50, z)
+        yield (f"driver.grib.z{z}",
+               lambda zxy=zxy: driver.data_tile({}, synthetic.DATA_VAR,
+                                                *zxy))
+
+
+def serialize_benchmarks():
+    from forest_lite.benchmarks import serialize
+    from forest_lite.server.lib.serialize import serialize_json
+    for label, obj in serialize.payloads():
+        name = label.replace(" (", ".").replace(")", "").replace(" ", "_")
+        yield (f"serialize.{name}", lambda obj=obj: serialize_json(obj))
+
+
+def natural_earth_benchmarks():
+    from forest_lite.server.lib import atlas
+    lines = synthetic.coastlines()
+    yield "natural_earth.index", lambda: atlas.FeatureIndex(lines)
+    index = atlas.FeatureIndex(lines)
+    for z in ZOOMS + (9,):
+        zxy = tile_containing(0, 50, z)
+        yield (f"natural_earth.tile.z{z}",
+               lambda zxy=zxy: atlas.index_tile(index, zxy))
+
+
+def measure(fn, repeat=5, min_seconds=0.2):
+    """Per call timings of fn in seconds
+
+    Calls are batched so each repeat takes at least min_seconds.
+    """
+    fn()  # Warm up imports, numba compilation and caches
+    timer = timeit.Timer(fn)
+    number = 1
+    while True:
+        if timer.timeit(number) >= min_seconds:
+            break
+        number *= 2
+    times = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "best_s": min(times),
+        "median_s": statistics.median(times),
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def run(size="small", pattern="*", repeat=5, min_seconds=0.2,
+        echo=print):
+    """Time every benchmark matching pattern
+
+    :returns: JSON compatible results with machine information
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, fn in benchmarks(size, directory):
+            if not fnmatch.fnmatch(name, pattern):
+                continue
+            results[name] = measure(fn, repeat=repeat,
+                                    min_seconds=min_seconds)
+            echo(f"{name:<36} {results[name]['best_s'] * 1000:>10.3f}ms")
+    return {
+        "meta": meta(size),
+        "results": results,
+    }
+
+
+def meta(size):
+    import forest_lite
+    return {
+        "size": size,
+        "shape": list(synthetic.shape(size)),
+        "date": dt.datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "forest_lite": getattr(forest_lite, "__version__", None),
+    }
+
+
+def compare(baseline, current, threshold=0.1):
+    """Change in best time of each benchmark relative to a baseline
+
+    :param threshold: fractional slow down counted as a regression
+    :returns: list of dicts with name, ratio and status, one of
+              "regression", "improvement", "ok", "new" or "missing"
+    """
+    old, new = baseline["results"], current["results"]
+    rows = []
+    for name in sorted(set(old) | set(new)):
+        if name not in old:
+            rows.append({"name": name, "ratio": None, "status": "new"})
+            continue
+        if name not in new:
+            rows.append({"name": name, "ratio": None, "status": "missing"})
+            continue
+        ratio = new[name]["best_s"] / old[name]["best_s"]
+        if ratio > 1 + threshold:
+            status = "regression"
+        elif ratio < 1 / (1 + threshold):
+            status = "improvement"
+        else:
+            status = "ok"
+        rows.append({"name": name, "ratio": ratio, "status": status})
+    return rows
+
+
+@app.command()
+def main(size: str = "small",
+         pattern: str = "*",
+         repeat: int = 5,
+         min_seconds: float = 0.2,
+         save: str = None,
+         compare_to: str = typer.Option(None, "--compare"),
+         threshold: float = 0.1):
+    """
+    Time the tile pipeline on synthetic data.
+    """
+    current = run(size=size, pattern=pattern, repeat=repeat,
+                  min_seconds=min_seconds, echo=typer.echo)
+    if save is not None:
+        with open(save, "w") as stream:
+            json.dump(current, stream, indent=2)
+        typer.echo(f"Saved results to '{save}'")
+    if compare_to is None:
+        return
+    with open(compare_to) as stream:
+        baseline = json.load(stream)
+    baseline["results"] = {name: result for name, result
+                           in baseline["results"].items()
+                           if fnmatch.fnmatch(name, pattern)}
+    if baseline["meta"]["shape"] != current["meta"]["shape"]:
+        typer.echo(f"WARNING: baseline shape {baseline['meta']['shape']}"
+                   f" differs from {current['meta']['shape']}")
+    rows = compare(baseline, current, threshold=threshold)
+    for row in rows:
+        change = ""
+        if row["ratio"] is not None:
+            change = f"{row['ratio'] - 1:+.1%}"
+        typer.echo(f"{row['name']:<36} {change:>8} {row['status']}")
+    if any(row["status"] == "regression" for row in rows):
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    app()
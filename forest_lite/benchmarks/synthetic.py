@@ -0,0 +1,162 @@
+"""Synthetic inputs for benchmarks
+
+Grids resemble the model output forest_lite serves, fields are smooth
+with a little noise so compression and deduplication are not
+unrealistically effective.
+
+>>> lons, lats, values = regular_grid((720, 1440))
+>>> write_netcdf("regular.nc", lons, lats, values)
+"""
+import numpy as np
+
+
+SIZES = {
+    "small": (180, 360),
+    "medium": (720, 1440),
+    "large": (1920, 2560),
+}
+
+DATA_VAR = "air_temperature"
+
+
+def shape(size):
+    """Grid shape from a preset name or NYxNX, e.g. 600x800"""
+    if size in SIZES:
+        return SIZES[size]
+    ny, nx = (int(n) for n in size.lower().split("x"))
+    return ny, nx
+
+
+def field(lons, lats, seed=0):
+    """Temperature-like float32 values on a grid of lons, lats"""
+    rng = np.random.default_rng(seed)
+    lons, lats = np.broadcast_arrays(*_mesh(lons, lats))
+    values = (273.15 + 30 * np.cos(np.radians(lats)) +
+              5 * np.sin(np.radians(3 * lons)) +
+              rng.normal(scale=0.5, size=lons.shape))
+    return values.astype("f")
+
+
+def _mesh(lons, lats):
+    if np.ndim(lons) == 1:
+        return np.meshgrid(lons, lats)
+    return lons, lats
+
+
+def regular_grid(shape, extent=(-180, 180, -85, 85), seed=0):
+    """1D longitudes, latitudes and 2D values"""
+    ny, nx = shape
+    x0, x1, y0, y1 = extent
+    lons = np.linspace(x0, x1, nx, endpoint=False) + (x1 - x0) / (2 * nx)
+    lats = np.linspace(y0, y1, ny)
+    return lons, lats, field(lons, lats, seed)
+
+
+def rotated_pole_grid(shape, pole_longitude=177.5, pole_latitude=37.5,
+                      extent=(-12, 12, -10, 10), seed=0):
+    """2D longitudes, latitudes of a rotated pole grid, like the UKV
+
+    :param extent: rotated longitude/latitude extent
+    """
+    import cartopy.crs
+    ny, nx = shape
+    x0, x1, y0, y1 = extent
+    rlons, rlats = np.meshgrid(np.linspace(x0, x1, nx),
+                               np.linspace(y0, y1, ny))
+    rotated = cartopy.crs.RotatedPole(pole_longitude=pole_longitude,
+                                      pole_latitude=pole_latitude)
+    points = cartopy.crs.PlateCarree().transform_points(rotated,
+                                                        rlons, rlats)
+    lons, lats = points[..., 0], points[..., 1]
+    return lons, lats, field(lons, lats, seed)
+
+
+def curvilinear_grid(shape, extent=(60, 160, -20, 50), seed=0):
+    """2D longitudes, latitudes of a warped grid, like an ocean model"""
+    ny, nx = shape
+    x0, x1, y0, y1 = extent
+    i, j = np.meshgrid(np.linspace(0, 1, nx), np.linspace(0, 1, ny))
+    lons = x0 + (x1 - x0) * i + 3 * np.sin(2 * np.pi * j)
+    lats = y0 + (y1 - y0) * j + 2 * np.sin(2 * np.pi * i)
+    return lons, lats, field(lons, lats, seed)
+
+
+GRIDS = {
+    "regular": regular_grid,
+    "rotated_pole": rotated_pole_grid,
+    "curvilinear": curvilinear_grid,
+}
+
+
+def write_netcdf(path, lons, lats, values, data_var=DATA_VAR):
+    """Save a grid with CF-style longitude/latitude coordinates
+
+    1D coordinates are dimensions, 2D coordinates are auxiliary
+    coordinates on y, x dimensions.
+    """
+    import xarray
+    attrs = {"units": "K", "standard_name": data_var}
+    if np.ndim(lons) == 1:
+        dataset = xarray.Dataset(
+            {data_var: (("latitude", "longitude"), values, attrs)},
+            coords={"longitude": ("longitude", lons,
+                                  {"units": "degrees_east"}),
+                    "latitude": ("latitude", lats,
+                                 {"units": "degrees_north"})})
+    else:
+        dataset = xarray.Dataset(
+            {data_var: (("y", "x"), values,
+                        dict(attrs, coordinates="longitude latitude"))},
+            coords={"longitude": (("y", "x"), lons,
+                                  {"units": "degrees_east"}),
+                    "latitude": (("y", "x"), lats,
+                                 {"units": "degrees_north"})})
+    dataset.to_netcdf(path, engine="h5netcdf")
+    return path
+
+
+def read_netcdf(path, data_var=DATA_VAR):
+    """Tilable dict of a file written by :func:`write_netcdf`"""
+    import xarray
+    with xarray.open_dataset(path, engine="h5netcdf") as nc:
+        return {
+            "longitude": nc["longitude"].values,
+            "latitude": nc["latitude"].values,
+            "values": nc[data_var].values,
+            "units": nc[data_var].attrs.get("units", ""),
+        }
+
+
+def grib_tilable(shape, seed=0):
+    """Decoded GRIB2 field as returned by the nearcast driver
+
+    Regular grid with 1D coordinates, float64 values in a masked
+    array and north to south latitudes like pygrib's ``latlons()``.
+    """
+    lons, lats, values = regular_grid(shape, extent=(-30, 60, 25, 75),
+                                      seed=seed)
+    return {
+        "longitude": lons,
+        "latitude": lats[::-1],
+        "values": np.ma.masked_invalid(values[::-1].astype("d")),
+        "units": "K",
+    }
+
+
+def coastlines(count=2000, points=200, seed=0):
+    """Shapely line strings shaped like a Natural Earth feature
+
+    Random walks scattered over the globe, some cross the
+    anti-meridian.
+    """
+    import shapely.geometry
+    rng = np.random.default_rng(seed)
+    lines = []
+    for _ in range(count):
+        n = rng.integers(2, points)
+        start = rng.uniform((-180, -80), (180, 80))
+        steps = rng.normal(scale=0.2, size=(n, 2))
+        coords = start + np.cumsum(steps, axis=0)
+        coords[:, 1] = np.clip(coords[:, 1], -85, 85)
+        lines.append(shapely.geometry.LineString(coords))
+    return lines
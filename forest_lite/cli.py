@@ -9,6 +9,7 @@ SUCCESS = typer.style("SUCCESS", fg=typer.colors.BLUE) + ": "
 import click
 import os
 import yaml
+from contextlib import contextmanager
 
 
 app = typer.Typer()
@@ -32,10 +33,11 @@ def in_use(port):
         return s.connect_ex(('localhost', port)) == 0
 
 
-def get_settings(file_name, driver_name, palette):
-    def fn():
-        from forest_lite.server import config
-        return config.Settings(datasets=[
+def settings_data(file_name, driver_name, palette, warm_up=False):
+    """Config of a single file, same layout as a config file"""
+    return {
+        "warm_up": {"enabled": warm_up},
+        "datasets": [
             {
                 "label": file_name,
                 "palettes": {
@@ -54,10 +56,73 @@ def get_settings(file_name, driver_name, palette):
                     }
                 }
             }
-        ])
+        ]
+    }
+
+
+def get_settings(file_name, driver_name, palette, warm_up=False):
+    def fn():
+        from forest_lite.server import config
+        return config.Settings(**settings_data(file_name, driver_name,
+                                               palette, warm_up=warm_up))
     return fn
 
 
+@contextmanager
+def shared_cache_dir(max_mb):
+    """Temporary directory for the cache shared by worker processes
+
+    Created on /dev/shm, i.e. in shared memory, where available.
+    """
+    import shutil
+    import tempfile
+    from forest_lite.server.lib import shared_cache
+    parent = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    directory = tempfile.mkdtemp(prefix="forest_lite-", dir=parent)
+    os.environ[shared_cache.ENV_DIRECTORY] = directory
+    os.environ[shared_cache.ENV_MAX_BYTES] = str(max_mb * 1024 ** 2)
+    try:
+        yield directory
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def run_workers(config_file, port, workers, shared_cache_mb):
+    """Serve with several processes reading settings from config_file"""
+    import uvicorn
+    os.environ["CONFIG_FILE"] = os.path.abspath(config_file)
+    with shared_cache_dir(shared_cache_mb) as directory:
+        typer.echo(f"{INFO} Starting {workers} workers, shared cache:"
+                   f" {directory}")
+        uvicorn.run("forest_lite.server.main:app", port=port,
+                    workers=workers)
+
+
+def import_server(profile):
+    """Import server modules one by one to time each step"""
+    from forest_lite.server import startup
+    typer.echo(f"{INFO} Import modules")
+    with profile.measure("import uvicorn"):
+        import uvicorn
+    profile.import_modules(startup.SERVER_MODULES)
+
+
+def resolve_drivers(names, profile):
+    """Time driver imports, errors are reported by config loading"""
+    from forest_lite.server import drivers
+    for name in sorted(set(names) - {""}):
+        with profile.measure(f"driver {name}"):
+            try:
+                drivers.registry.get(name)
+            except Exception:
+                pass
+
+
+def echo_profile(profile):
+    typer.echo(f"{INFO} Start up profile")
+    typer.echo(profile.report())
+
+
 def browser_thread(url):
     import threading
     import webbrowser
@@ -70,15 +135,30 @@ def open_cmd(file_name: str,
              driver: str = "iris",
              open_tab: bool = True,
              palette: str = "Viridis",
-             port: int = 1234):
+             port: int = 1234,
+             profile_startup: bool = False,
+             warm_up: bool = False,
+             workers: int = 1,
+             shared_cache_mb: int = 1024):
     """
     Explore a file.
     """
-
-    typer.echo(f"{INFO} Import modules")
+    from forest_lite.server.startup import Profile
+    profile = Profile()
+    import_server(profile)
     import uvicorn
     import forest_lite.server.main as _main
-    from forest_lite.server import config
+    from forest_lite.server import config, drivers
+
+    resolve_drivers([driver], profile)
+    try:
+        drivers.registry.get(driver)
+    except Exception as e:
+        typer.echo(f"{FAIL} driver '{driver}': {e}")
+        raise typer.Exit(code=1)
+
+    if profile_startup:
+        echo_profile(profile)
 
     port = scan_port(port)
 
@@ -87,7 +167,17 @@ def open_cmd(file_name: str,
         thread = browser_thread(url)
         thread.start()
 
-    callback = get_settings(file_name, driver, palette)
+    if workers > 1:
+        # Worker processes read settings from a file
+        import tempfile
+        data = settings_data(file_name, driver, palette, warm_up=warm_up)
+        with tempfile.NamedTemporaryFile("w", suffix=".yaml") as stream:
+            yaml.dump(data, stream)
+            stream.flush()
+            run_workers(stream.name, port, workers, shared_cache_mb)
+        return
+
+    callback = get_settings(file_name, driver, palette, warm_up=warm_up)
     _main.app.dependency_overrides[config.get_settings] = callback
     uvicorn.run(_main.app, port=port)
 
@@ -95,9 +185,15 @@ def open_cmd(file_name: str,
 @app.command()
 def run(config_file: str,
         open_tab: bool = True,
-        port: int = 1234):
+        port: int = 1234,
+        profile_startup: bool = False,
+        workers: int = 1,
+        shared_cache_mb: int = 1024):
     """
     Run a long-running instance with a config file.
+
+    With more than one worker, rendered tiles and decoded arrays are
+    shared between worker processes.
     """
     if not os.path.exists(config_file):
         typer.echo(f"{FAIL} {config_file} not found on file system")
@@ -113,22 +209,39 @@ def run(config_file: str,
     port = scan_port(port)
 
     # Launch FastAPI server
-    typer.echo(f"{INFO} Import modules")
+    from forest_lite.server.startup import Profile
+    profile = Profile()
+    import_server(profile)
     import uvicorn
     import forest_lite.server.main as _main
-    from forest_lite.server import config
-
-    def get_settings():
-        import yaml
-        with open(config_file) as stream:
-            data = yaml.safe_load(stream)
-        return config.Settings(**data)
+    from forest_lite.server import config, drivers
+
+    # Parse once up front, re-parsed only if the file changes
+    get_settings = config.ConfigFile(config_file)
+    with profile.measure("parse config"):
+        stamp = os.stat(config_file).st_mtime_ns
+        settings = config.load(config_file)
+    resolve_drivers([dataset.driver.name for dataset in settings.datasets],
+                    profile)
+    try:
+        get_settings.reload(stamp, parsed=settings)
+    except drivers.DriverError as e:
+        for label, error in e.errors.items():
+            typer.echo(f"{FAIL} dataset '{label}': {error}")
+        raise typer.Exit(code=1)
+
+    if profile_startup:
+        echo_profile(profile)
 
     if open_tab:
         url = f"http://localhost:{port}"
         thread = browser_thread(url)
         thread.start()
 
+    if workers > 1:
+        run_workers(config_file, port, workers, shared_cache_mb)
+        return
+
     _main.app.dependency_overrides[config.get_settings] = get_settings
     uvicorn.run(_main.app, port=port)
 
@@ -9,23 +9,67 @@ export const WEB_MERCATOR_EXTENT = {
 }
 
 
+// Delay before re-requesting provisional tiles
+export const PROVISIONAL_RETRY_MS = 2000
+
+
 // Memoize Futures
 function memoize(method) {
     let cache = {}
-    return async function() {
+    const memoized = async function() {
         let args = JSON.stringify(arguments)
         cache[args] = cache[args] || method.apply(this, arguments)
         return cache[args]
     }
+    memoized.forget = function() {
+        delete cache[JSON.stringify(arguments)]
+    }
+    return memoized
 }
 
 
+// Abort controllers of tile requests in flight by URL
+const inFlight = {}
+
+
+// Provisional tiles, approximations served while the server
+// finishes the exact tile, and aborted requests are not memoized
 const fetchTile = memoize(async url => {
-    return fetch(url)
-        .then(response => response.json())
+    const controller = new AbortController()
+    inFlight[url] = controller
+    try {
+        const response = await fetch(url, { signal: controller.signal })
+        const tile = await response.json()
+        if (response.headers.get("X-Tile-Provisional") != null) {
+            fetchTile.forget(url)
+            tile.provisional = true
+        }
+        return tile
+    } catch (error) {
+        fetchTile.forget(url)
+        throw error
+    } finally {
+        // A later request of the same URL keeps its controller
+        if (inFlight[url] === controller) {
+            delete inFlight[url]
+        }
+    }
 })
 
 
+// Cancel requests of tiles that have left the view, the server
+// stops working on them
+const abortTiles = (previous, urls) => {
+    previous.filter(url => !urls.includes(url))
+            .filter(url => url in inFlight)
+            .forEach(url => inFlight[url].abort())
+}
+
+
+// Most recent URLs rendered by each source
+const latestURLs = new WeakMap()
+
+
 export const renderTiles = source => urls => {
     let emptyImage = {
         x: [],
@@ -34,8 +78,22 @@ export const renderTiles = source => urls => {
         dh: [],
         image: []
     }
-    let promises = urls.map(fetchTile)
+    abortTiles(latestURLs.get(source) || [], urls)
+    latestURLs.set(source, urls)
+    // Memoized by URL alone, not the index and array passed by map
+    let promises = urls.map(url => fetchTile(url))
     Promise.all(promises)
+        .then(tiles => {
+            if (tiles.some(tile => tile.provisional)) {
+                setTimeout(() => {
+                    // Skip if the view has moved on
+                    if (latestURLs.get(source) === urls) {
+                        renderTiles(source)(urls)
+                    }
+                }, PROVISIONAL_RETRY_MS)
+            }
+            return tiles
+        })
         .then(tiles => tiles.filter(tile => getErrors(tile).length === 0))
         .then(tiles => tiles.map(tile => tile.data))
         .then(tiles => tiles.reduce(imageReducer, emptyImage))
@@ -52,6 +110,10 @@ export const renderTiles = source => urls => {
             source.data = data
             source.change.emit()
         })
+        .catch(error => {
+            // Superseded by a later view
+            if (error.name !== "AbortError") throw error
+        })
 }
 
 /**
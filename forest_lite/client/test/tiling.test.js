@@ -95,3 +95,50 @@ test.each`
 `("$tile returns $expected", ({ tile, expected }) => {
     expect(tiling.validTile(tile)).toEqual(expected)
 })
+
+
+describe("renderTiles", () => {
+    const flush = () => new Promise(resolve => setTimeout(resolve, 0))
+
+    const response = headers => ({
+        json: async () => ({ data: { image: [] } }),
+        headers: { get: name => headers[name] || null }
+    })
+
+    // Polyfill installed by jest.setup.js
+    const fetch = global.fetch
+
+    afterEach(() => {
+        global.fetch = fetch
+    })
+
+    test("fetches provisional tiles again", async () => {
+        global.fetch = jest.fn()
+            .mockResolvedValueOnce(response({ "X-Tile-Provisional": "true" }))
+            .mockResolvedValue(response({}))
+        const source = { data: {}, change: { emit: jest.fn() } }
+        const url = "/datasets/0/air/tiles/2/1/3"
+        for (let i = 0; i < 3; i++) {
+            tiling.renderTiles(source)([url])
+            await flush()
+        }
+        expect(global.fetch).toHaveBeenCalledTimes(2)
+        expect(source.change.emit).toHaveBeenCalledTimes(3)
+    })
+
+    test("fetches aborted tiles again", async () => {
+        const error = new Error("aborted")
+        error.name = "AbortError"
+        global.fetch = jest.fn()
+            .mockRejectedValueOnce(error)
+            .mockResolvedValue(response({}))
+        const source = { data: {}, change: { emit: jest.fn() } }
+        const url = "/datasets/0/air/tiles/3/2/5"
+        tiling.renderTiles(source)([url])
+        await flush()
+        tiling.renderTiles(source)([url])
+        await flush()
+        expect(global.fetch).toHaveBeenCalledTimes(2)
+        expect(source.change.emit).toHaveBeenCalledTimes(1)
+    })
+})
@@ -15,6 +15,7 @@ module.exports = merge(common, {
         new HtmlWebpackPlugin({
             title: 'FOREST Lite',
             template: path.resolve(__dirname, "src", "index.prod.html"),
+            inject: false,  // Template links hashed names
             minify: false
         })
     ],
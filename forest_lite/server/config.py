@@ -1,15 +1,78 @@
 import os
+import logging
+import threading
 from functools import lru_cache
 import yaml
 from forest_lite.server.lib.config import Config
+from forest_lite.server import drivers
+
+
+logger = logging.getLogger(__name__)
 
 
 Settings = Config  # TODO: Remove alias
 
 
-@lru_cache
-def get_settings():
-    path = os.getenv("CONFIG_FILE")
+def load(path):
+    """Parse YAML configuration file"""
     with open(path) as stream:
         data = yaml.safe_load(stream)
-    return Config(**data)
+    return Config(**(data or {}))
+
+
+class ConfigFile:
+    """In-memory settings re-read whenever the file's mtime changes
+
+    Parsed settings are swapped in as a single attribute assignment
+    so concurrent requests see either the old or the new
+    configuration, never a partially built one. Drivers are resolved
+    as part of loading. If a reload fails, e.g. the file is caught
+    mid-write or names an unknown driver, the previous settings are
+    kept until the file changes again.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._state = (None, None)  # (mtime, settings)
+
+    def __call__(self):
+        mtime, settings = self._state
+        stamp = os.stat(self.path).st_mtime_ns
+        if stamp != mtime:
+            settings = self.reload(stamp)
+        return settings
+
+    def reload(self, stamp=None, parsed=None):
+        """Settings of the file at stamp
+
+        :param parsed: settings already parsed from the file at stamp
+        """
+        with self._lock:
+            mtime, settings = self._state
+            if stamp is None:
+                stamp = os.stat(self.path).st_mtime_ns
+            if stamp == mtime:
+                return settings  # Another thread got here first
+            try:
+                new_settings = parsed
+                if new_settings is None:
+                    new_settings = load(self.path)
+                drivers.registry.load(new_settings)
+            except Exception:
+                if settings is None:
+                    raise
+                logger.exception(f"could not reload {self.path}")
+                self._state = (stamp, settings)  # Log once per change
+                return settings
+            settings = new_settings
+            self._state = (stamp, settings)
+        return settings
+
+
+@lru_cache
+def config_file(path):
+    return ConfigFile(path)
+
+
+def get_settings():
+    return config_file(os.getenv("CONFIG_FILE"))()
@@ -1,21 +1,122 @@
+"""Driver discovery
+
+Drivers are found by name, first amongst the modules in this package,
+then amongst package entry points registered in the
+``forest_lite.drivers`` group and finally as a ``module:attribute``
+import string.
+
+A third-party package can make a driver available by name with an
+entry point in its ``setup.py``.
+
+>>> setup(
+...     entry_points={
+...         "forest_lite.drivers": [
+...             "my_driver = my_package.my_module:driver"
+...         ]
+...     }
+... )
+
+"""
+import importlib.metadata
+import importlib.util
+import threading
 from importlib import import_module
 from forest_lite.server.drivers.base import BaseDriver
 
 
+ENTRY_POINT_GROUP = "forest_lite.drivers"
+
+
+class DriverNotFound(Exception):
+    """Driver name could not be resolved"""
+
+
+class DriverError(Exception):
+    """One or more configured drivers failed to load"""
+    def __init__(self, errors):
+        self.errors = errors
+        lines = [f"{label}: {error}" for label, error in errors.items()]
+        super().__init__("\n".join(lines))
+
+
+class Registry:
+    """Driver instances resolved once by name
+
+    Resolution imports modules, scans package metadata and runs
+    driver set up code, so it is done when settings are loaded
+    rather than on every request.
+    """
+    def __init__(self):
+        self._drivers = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str):
+        try:
+            return self._drivers[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._drivers:
+                self._drivers[name] = find_driver(name)
+            return self._drivers[name]
+
+    def load(self, settings):
+        """Resolve the driver of every configured dataset
+
+        :raises DriverError: listing every dataset that failed
+        """
+        errors = {}
+        for dataset in settings.datasets:
+            if dataset.driver.name == "":
+                continue  # Datasets without data, e.g. palette only
+            try:
+                self.get(dataset.driver.name)
+            except Exception as e:
+                errors[dataset.label] = e
+        if len(errors) > 0:
+            raise DriverError(errors)
+
+    def clear(self):
+        with self._lock:
+            self._drivers.clear()
+
+
+registry = Registry()
+
+
 def from_spec(spec):
-    return find_driver(spec.name)
+    return registry.get(spec.name)
 
 
 def find_driver(name: str):
     """Find driver instance"""
+    if ":" in name:
+        mod_name, obj_name = name.split(":")
+        return getattr(import_module(mod_name), obj_name)
+
+    mod_name = f"forest_lite.server.drivers.{name}"
+    if is_module(mod_name):
+        return import_module(mod_name).driver
+
+    entry_points = driver_entry_points()
+    if name in entry_points:
+        return entry_points[name].load()
+
+    raise DriverNotFound(f"unknown driver: '{name}'")
+
+
+def is_module(mod_name):
     try:
-        module = import_module(f"forest_lite.server.drivers.{name}")
-        return module.driver
-    except ModuleNotFoundError as e:
-        print(e)
-        if name in e.msg:
-            mod_name, obj_name = name.split(":")
-            module = import_module(mod_name)
-            return getattr(module, obj_name)
-        else:
-            raise e
+        return importlib.util.find_spec(mod_name) is not None
+    except ModuleNotFoundError:
+        return False  # Parent package missing, e.g. dotted names
+
+
+def driver_entry_points():
+    """Drivers advertised by installed packages"""
+    entry_points = importlib.metadata.entry_points()
+    if hasattr(entry_points, "select"):
+        entry_points = entry_points.select(group=ENTRY_POINT_GROUP)
+    else:
+        entry_points = entry_points.get(ENTRY_POINT_GROUP, [])
+    return {entry_point.name: entry_point for entry_point in entry_points}
@@ -1,5 +1,7 @@
+import os
 import numpy as np
 from forest_lite.server.lib import core
+from forest_lite.server.util import get_file_names
 from forest_lite.server.inject import Injectable
 
 
@@ -9,9 +11,10 @@ class BaseDriver(Injectable):
         """Coordinate/Dimension meta-data and values"""
         return []
 
-    def data_tile(self, settings, data_var, z, x, y, query=None):
+    def data_tile(self, settings, data_var, z, x, y, query=None,
+                  tile_size=None):
         tilable = self.tilable(settings, data_var, query=query)
-        return core._tile(tilable, z, x, y)
+        return core._tile(tilable, z, x, y, tile_size=tile_size)
 
     def tilable(self, settings, data_var, query=None):
         return {
@@ -21,5 +24,29 @@ class BaseDriver(Injectable):
             "units": ""
         }
 
+    def grid_spacing(self, settings, data_var, query=None):
+        """Longitude spacing of the source grid in degrees
+
+        Sets the native zoom of a dataset, None if unknown, i.e. every
+        zoom level is rendered from source.
+        """
+        return None
+
     def description(self, settings):
         return {}
+
+    def get_geojson(self, settings, timestamp_ms, bbox=None, zoom=None):
+        """Features at a time, optionally only within bbox"""
+        return b'{"type":"FeatureCollection","features":[]}'
+
+    def sources(self, settings, data_var, query=None):
+        """Paths of files tiles are made from
+
+        Their identities are part of cached tile keys, by default the
+        files matching a ``pattern`` setting.
+        """
+        pattern = settings.get("pattern") if isinstance(settings,
+                                                        dict) else None
+        if pattern is None:
+            return []
+        return get_file_names(os.path.expanduser(pattern))
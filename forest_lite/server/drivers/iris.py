@@ -2,11 +2,8 @@
 import json
 import datetime as dt
 import numpy as np
-import iris
-from iris.analysis.cartography import unrotate_pole
-from iris.coord_systems import RotatedGeogCS
-from functools import lru_cache
 from forest_lite.server.util import get_file_names
+from forest_lite.server.lib import metrics, sources
 from forest_lite.server.drivers import BaseDriver
 from forest_lite.server.drivers.types import (
     Description,
@@ -43,6 +40,9 @@ def points(settings, data_var, dim_name, query=None):
 
 @driver.override("tilable")
 def tilable(settings, data_var, query=None):
+    import iris
+    from iris.analysis.cartography import unrotate_pole
+    from iris.coord_systems import RotatedGeogCS
     file_names = get_file_names(settings["pattern"])
     cubes = get_cubes(file_names[0], data_var)
     cube = cubes[0]
@@ -108,7 +108,11 @@ def fromisoformat(text):
     raise e
 
 
-get_cubes = lru_cache(iris.load)
+@metrics.track_cache("iris_cubes")
+@sources.file_cache()
+def get_cubes(source, *args):
+    import iris
+    return iris.load(source.path, *args)
 
 
 @driver.override("description")
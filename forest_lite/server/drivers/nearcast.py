@@ -7,12 +7,11 @@ import datetime as dt
 import numpy as np
 import os
 import re
-from functools import lru_cache
 from forest_lite.server.util import get_file_names
+from forest_lite.server.lib import metrics, shared_cache, sources
 from forest_lite.server.drivers.base import BaseDriver
 from forest_lite.server.drivers.types import Description, Points, PointsAttrs
 from pydantic import BaseModel
-import pygrib as pg
 import pytz
 
 
@@ -102,10 +101,12 @@ def nearcast_description(settings):
     })
 
 
-@lru_cache
-def get_data_vars(path):
+@metrics.track_cache("nearcast_data_vars")
+@sources.file_cache()
+def get_data_vars(source):
+    import pygrib as pg
     items = []
-    messages = pg.open(path)
+    messages = pg.open(source.path)
     for message in messages.select():
         items.append({
             "name": message['name'],
@@ -181,8 +182,12 @@ def nearcast_tilable(settings, data_var, query: TileQuery = None):
     return get_grib2_data(path, timestamp_s, data_var)
 
 
-@lru_cache
-def get_grib2_data(path, timestamp_s, variable):
+@metrics.track_cache("nearcast_grib2_data")
+@sources.file_cache()
+@shared_cache.memoize("nearcast_grib2_data")
+def get_grib2_data(source, timestamp_s, variable):
+    import pygrib as pg
+    path = source.path
     time = dt.datetime.fromtimestamp(timestamp_s)
     cache = {}
     messages = pg.index(path,
@@ -214,6 +219,7 @@ def get_grib2_data(path, timestamp_s, variable):
 
 
 def get_first_fixed_surface(path, variable):
+    import pygrib as pg
     messages = pg.index(path, "name")
     try:
         for message in messages.select(name=variable):
@@ -225,6 +231,7 @@ def get_first_fixed_surface(path, variable):
 
 
 def get_validity(path, variable):
+    import pygrib as pg
     messages = pg.index(path, "name")
     try:
         for message in messages.select(name=variable):
@@ -1,7 +1,6 @@
 """
 Map FOREST-Lite REST API to source API
 """
-import aiohttp
 from pydantic import BaseModel
 from forest_lite.server.drivers.base import BaseDriver
 
@@ -41,6 +40,7 @@ async def data_tile(settings_dict, data_var, z, x, y, query=None):
 
 
 async def http_get(endpoint):
+    import aiohttp
     async with aiohttp.ClientSession() as session:
         async with session.get(endpoint) as response:
             content = await response.json()
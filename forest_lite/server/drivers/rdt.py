@@ -1,33 +1,152 @@
-"""Simple RDT geoJSON driver"""
+"""RDT geoJSON driver
+
+Rapid Developing Thunderstorm (RDT) files hold convective cells as a
+geoJSON feature collection, one file per time. Files are large and
+never change once written, so each is parsed once. The cache keeps
+every feature already serialized with its bounding box, plus a gzip
+copy of the whole file that is served without recompressing.
+
+Requests with a ``bbox`` or ``zoom`` get only the cells in view,
+found by comparing the view with every bounding box in one array
+operation. At a given zoom cells smaller than ``min_pixels`` screen
+pixels are left out.
+
+.. code-block:: yaml
+
+    driver:
+      name: rdt
+      settings:
+        directory: /scratch/frpf/HIGHWAY/RDT/json
+"""
 import re
 import os
-import glob
+import gzip
+import json
 import datetime as dt
 import numpy as np
+from pydantic import BaseModel
+from forest_lite.server.drivers.base import BaseDriver
+from forest_lite.server.drivers.types import GeoJSON
+from forest_lite.server.lib import metrics, sources
 
 
 DIRECTORY = "/scratch/frpf/HIGHWAY/RDT/json"
 GLOB_PATTERN = "RDT_features_eastafrica_*.json"
 FORMAT_PATTERN = "RDT_features_eastafrica_{:%Y%m%d%H%M}.json"
+CHUNK_SIZE = 64 * 1024
+TILE_SIZE = 256
+
+
+class Settings(BaseModel):
+    directory: str = DIRECTORY
+    glob_pattern: str = GLOB_PATTERN
+    format_pattern: str = FORMAT_PATTERN
+    min_pixels: float = 1.
+
+
+driver = BaseDriver()
+
+
+@driver.override("get_geojson")
+def get_geojson(settings, timestamp_ms, bbox=None, zoom=None):
+    """Feature collection at a time, optionally only cells in view
+
+    :param bbox: (west, south, east, north) in degrees
+    """
+    settings = Settings(**settings)
+    time = np.datetime64(timestamp_ms, 'ms').astype('O')
+    path = get_path(time, settings.directory, settings.format_pattern)
+    collection = load(path)
+    if (bbox is None) and (zoom is None):
+        return GeoJSON(gzip=collection.gzip, path=path)
+    hits = collection.select(bbox=bbox, zoom=zoom,
+                             min_pixels=settings.min_pixels)
+    return GeoJSON(chunks=collection.chunks(hits))
+
+
+class FeatureCollection:
+    """Serialized features of a file with a bounding box index
+
+    :param content: geoJSON bytes as read from the file
+    """
+    def __init__(self, content):
+        obj = json.loads(content)
+        features = obj.pop("features", [])
+        self.head = json.dumps(obj, separators=(",", ":")).encode()
+        self.features = [json.dumps(feature, separators=(",", ":")).encode()
+                         for feature in features]
+        self.bounds = np.array([bounds(feature) for feature in features],
+                               dtype="d").reshape(-1, 4)
+        self.gzip = gzip.compress(content, compresslevel=6)
+
+    def __len__(self):
+        return len(self.features)
+
+    def select(self, bbox=None, zoom=None, min_pixels=1.):
+        """Indices of features in view and big enough to see"""
+        minx, miny, maxx, maxy = self.bounds.T
+        keep = np.isfinite(minx)
+        if bbox is not None:
+            x0, y0, x1, y1 = bbox
+            keep &= (minx <= x1) & (maxx >= x0) & (miny <= y1) & (maxy >= y0)
+        if zoom is not None:
+            pixel = 360 / (TILE_SIZE * 2 ** zoom)
+            size = np.maximum(maxx - minx, maxy - miny)
+            keep &= size >= min_pixels * pixel
+        return np.flatnonzero(keep)
+
+    def chunks(self, indices):
+        """Feature collection bytes of features at indices in pieces"""
+        if self.head == b"{}":
+            chunk = b'{"features":['
+        else:
+            chunk = self.head[:-1] + b',"features":['
+        for n, i in enumerate(indices):
+            if n > 0:
+                chunk += b","
+            chunk += self.features[i]
+            if len(chunk) >= CHUNK_SIZE:
+                yield chunk
+                chunk = b""
+        yield chunk + b"]}"
+
+
+def bounds(feature):
+    """(minx, miny, maxx, maxy) of a feature, NaN if no coordinates"""
+    geometry = feature.get("geometry") or {}
+    points = np.array(list(coordinates(geometry.get("coordinates", []))),
+                      dtype="d").reshape(-1, 2)
+    if len(points) == 0:
+        return (np.nan,) * 4
+    return (*points.min(axis=0), *points.max(axis=0))
+
+
+def coordinates(nested):
+    """Flatten nested geoJSON coordinate lists into (x, y) pairs"""
+    if len(nested) > 0 and not isinstance(nested[0], list):
+        yield nested[:2]
+        return
+    for item in nested:
+        yield from coordinates(item)
+
+
+@metrics.track_cache("rdt_features")
+@sources.file_cache(maxsize=16)
+def load(source):
+    with open(source.path, "rb") as stream:
+        return FeatureCollection(stream.read())
 
 
-class Driver:
-    def __init__(self, name, settings):
-        self.name = name
-        self.settings = settings
+# TODO: Migrate this to general coordinates
+def get_times(limit, directory=DIRECTORY, pattern=GLOB_PATTERN):
+    paths = list_files(directory, pattern)
+    times = [parse_time(path) for path in paths]
+    return sorted(times)[-limit:]
 
-    # TODO: Migrate this to general coordinates
-    def get_times(self, limit):
-        paths = glob.glob(os.path.join(DIRECTORY, GLOB_PATTERN))
-        times = [parse_time(path) for path in paths]
-        return sorted(times)[-limit:]
 
-    def get_geojson(self, timestamp_ms):
-        time = np.datetime64(timestamp_ms, 'ms').astype('O')
-        path = get_path(time)
-        with open(path) as stream:
-            content = stream.read()
-        return content
+def list_files(directory, pattern):
+    """Matching paths, re-listed only when the directory changes"""
+    return sources.list_files(os.path.join(directory, pattern))
 
 
 def parse_time(path):
@@ -37,5 +156,5 @@ def parse_time(path):
         return dt.datetime.strptime(groups[0], "%Y%m%d%H%M")
 
 
-def get_path(time):
-    return os.path.join(DIRECTORY, FORMAT_PATTERN.format(time))
+def get_path(time, directory=DIRECTORY, pattern=FORMAT_PATTERN):
+    return os.path.join(directory, pattern.format(time))
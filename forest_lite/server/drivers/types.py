@@ -1,5 +1,5 @@
 """Types that define communication with the front-end client"""
-from typing import Dict, List
+from typing import Dict, Iterable, List, NamedTuple, Optional
 from pydantic import BaseModel
 
 
@@ -28,3 +28,15 @@ class DataVar(BaseModel):
 class Description(BaseModel):
     attrs: Dict[str, str]
     data_vars: Dict[str, DataVar]
+
+
+class GeoJSON(NamedTuple):
+    """Feature collection body without serializing on each request
+
+    ``gzip`` is a compressed copy for clients that accept it, ``path``
+    a file streamed to other clients and ``chunks`` an iterable of
+    bytes, e.g. features selected by a request.
+    """
+    gzip: Optional[bytes] = None
+    path: Optional[str] = None
+    chunks: Optional[Iterable[bytes]] = None
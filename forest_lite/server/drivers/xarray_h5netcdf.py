@@ -1,12 +1,12 @@
 import os
 import glob
 import json
-import xarray
+import numpy as np
 from forest_lite.server.drivers.base import BaseDriver
-from forest_lite.server.lib import core
+from forest_lite.server.lib import (core, metrics, shared_cache, sources,
+                                    tracing, workers)
 from pydantic import BaseModel, validator
 from typing import List
-from functools import lru_cache
 import datetime as dt
 
 
@@ -25,10 +25,38 @@ driver = BaseDriver()
 
 
 @driver.override("data_tile")
-def data_tile(settings, data_var, z, x, y, query=None):
+def data_tile(settings, data_var, z, x, y, query=None, tile_size=None):
     pattern = Settings(**settings).pattern
     engine = Settings(**settings).engine
-    return get_data_tile(pattern, engine, data_var, z, x, y, query)
+    return get_data_tile(pattern, engine, data_var, z, x, y, query,
+                         tile_size=tile_size)
+
+
+@driver.override("grid_spacing")
+def grid_spacing(settings, data_var, query=None):
+    """Longitude spacing of the latest file, read once per file"""
+    settings = Settings(**settings)
+    path = core.get_path(settings.pattern)
+    return _grid_spacing(path, settings.engine, data_var)
+
+
+@sources.file_cache()
+def _grid_spacing(source, engine, data_var):
+    import xarray
+    with xarray.open_dataset(source.path, engine=engine,
+                             decode_times=False) as nc:
+        var = nc[data_var]
+        for key in var.dims:
+            if is_longitude_dimension(key):
+                lons = var[key].values
+                break
+        else:
+            return None
+    steps = np.abs(np.diff(np.asarray(lons, dtype="d")))
+    steps = steps[steps > 0]
+    if len(steps) == 0:
+        return None
+    return float(np.median(steps))
 
 
 @driver.override("description")
@@ -36,6 +64,7 @@ def description(settings):
     settings = Settings(**settings)
     paths = sorted(glob.glob(settings.pattern))
     if len(paths) > 0:
+        import xarray
         path = paths[-1]
         with xarray.open_dataset(path,
                                  engine=settings.engine,
@@ -61,6 +90,7 @@ def points(settings, data_var, dim_name, query=None):
     attrs = {}
     data = []
     if len(paths) > 0:
+        import xarray
         path = paths[-1]
         with xarray.open_dataset(path,
                                  engine=settings.engine,
@@ -75,9 +105,11 @@ def points(settings, data_var, dim_name, query=None):
     }
 
 
-def get_data_tile(pattern, engine, data_var, z, x, y, query=None):
-    path = core.get_path(pattern)
-    return _data_tile(path, engine, data_var, z, x, y, query)
+def get_data_tile(pattern, engine, data_var, z, x, y, query=None,
+                  tile_size=None):
+    with tracing.span("discover"):
+        path = core.get_path(pattern)
+    return _data_tile(path, engine, data_var, z, x, y, query, tile_size)
 
 
 def is_longitude_dimension(key):
@@ -88,12 +120,16 @@ def is_latitude_dimension(key):
     return key.startswith("latitude") or (key == "lat")
 
 
-@lru_cache
-def _data_tile(path, engine, data_var, z, x, y, query):
+@metrics.track_cache("xarray_h5netcdf_tile")
+@sources.file_cache()
+@shared_cache.memoize("xarray_h5netcdf_tile")
+def _data_tile(source, engine, data_var, z, x, y, query, tile_size=None):
+    import xarray
     zxy = (z, x, y)
-    with xarray.open_dataset(path,
-                             engine=engine,
-                             decode_times=True) as nc:
+    with tracing.span("open"):
+        nc = xarray.open_dataset(source.path, engine=engine,
+                                 decode_times=True)
+    with nc:
 
         # Find lons/lats related to data_var
         var = nc[data_var]
@@ -130,19 +166,22 @@ def _data_tile(path, engine, data_var, z, x, y, query):
         }
 
     # Use 2D array
-    values = array.values
+    workers.checkpoint()
+    with tracing.span("read"):
+        values = array.values
 
     # Mask moisture_content_of_soil_layer (TODO: Generalise)
     if "moisture_content" in data_var:
-        fill_value = values.max()
-        values = np.ma.masked_equal(values, fill_value)
+        with tracing.span("mask"):
+            fill_value = values.max()
+            values = np.ma.masked_equal(values, fill_value)
     return {
         "data": core._tile({
             "longitude": lons,
             "latitude": lats,
             "values": values,
             "units": units
-        }, z, x, y)
+        }, z, x, y, tile_size=tile_size)
     }
 
 
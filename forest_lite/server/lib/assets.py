@@ -0,0 +1,118 @@
+"""Content hashed names and pre-compressed copies of static assets
+
+Pages link assets by a name that includes a digest of their content,
+e.g. ``lite.min.3f2a9c1be0d4.js``. A new build changes the name, so
+browsers may keep an asset forever without asking the server again.
+
+Compressed copies are written next to each asset at build time, e.g.
+``lite.min.js.gz`` and ``lite.min.js.br``, at the slowest levels as
+the cost is paid once. Copies older than their asset are ignored.
+
+.. code-block:: sh
+
+    python -m forest_lite.server.lib.assets forest_lite/client/static
+
+Only the standard library and modules of this package are imported,
+the build step runs before the server's dependencies are installed.
+"""
+import hashlib
+import os
+import re
+import sys
+import threading
+from forest_lite.server.lib import compression, sources
+
+
+HASH_LENGTH = 12
+SUFFIXES = {"zstd": ".zst", "br": ".br", "gzip": ".gz"}
+BUILD_LEVELS = {"zstd": 19, "br": 11, "gzip": 9}
+COMPRESSIBLE = (".js", ".css", ".html", ".svg", ".json", ".map", ".txt",
+                ".ttf", ".eot")
+HASHED = re.compile(r"^(.*)\.([0-9a-f]{%d})(\.[^./]+)$" % HASH_LENGTH)
+
+
+@sources.file_cache(maxsize=256)
+def content_hash(source):
+    """Digest of a file, recomputed when the file changes"""
+    digest = hashlib.sha256()
+    with open(source.path, "rb") as stream:
+        for chunk in iter(lambda: stream.read(1024 ** 2), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def hashed_name(directory, path):
+    """Name of an asset including its digest, path if not found"""
+    try:
+        digest = content_hash(os.path.join(directory, path))
+    except (FileNotFoundError, NotADirectoryError):
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{digest}{ext}"
+
+
+def split_hashed(path):
+    """Asset path and digest of a hashed name, digest None if plain"""
+    match = HASHED.match(path)
+    if match is None:
+        return path, None
+    root, digest, ext = match.groups()
+    return root + ext, digest
+
+
+def variant(path, encoding):
+    """Pre-compressed copy of path if present and up to date"""
+    target = path + SUFFIXES[encoding]
+    try:
+        stat = os.stat(target)
+    except FileNotFoundError:
+        return None
+    if stat.st_mtime_ns < os.stat(path).st_mtime_ns:
+        return None
+    return target, stat
+
+
+def precompress(directory, minimum_size=compression.MINIMUM_SIZE,
+                encodings=None):
+    """Write compressed copies of assets worth compressing
+
+    :returns: paths written
+    """
+    if encodings is None:
+        encodings = compression.available()
+    written = []
+    for root, _, names in os.walk(directory):
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            if (not name.endswith(COMPRESSIBLE) or
+                    os.path.getsize(path) < minimum_size):
+                continue
+            body = None
+            for encoding in encodings:
+                if variant(path, encoding) is not None:
+                    continue
+                if body is None:
+                    with open(path, "rb") as stream:
+                        body = stream.read()
+                encoded = compression.compress(body, encoding,
+                                               BUILD_LEVELS[encoding])
+                if len(encoded) >= len(body):
+                    continue
+                target = path + SUFFIXES[encoding]
+                tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp, "wb") as stream:
+                    stream.write(encoded)
+                os.replace(tmp, target)
+                written.append(target)
+    return written
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    for directory in argv:
+        for path in precompress(directory):
+            print(path)
+
+
+if __name__ == "__main__":
+    main()
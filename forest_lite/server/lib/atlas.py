@@ -1,14 +1,105 @@
 """Map features lakes, borders etc."""
-import cartopy.feature
+from functools import lru_cache
+import numpy as np
+from forest_lite.server.lib import data, metrics, tiling
 from forest_lite.server.lib.data import xs_ys, cut, iterlines
 
 
 def load_feature(category, name, scale, extent):
+    return feature_index(category, name, scale).query(extent)
+
+
+@metrics.track_cache("natural_earth_feature")
+@lru_cache(maxsize=32)
+def feature_index(category, name, scale):
+    """Processed Natural Earth feature, built once per scale"""
+    import cartopy.feature
     natural_earth_feature = cartopy.feature.NaturalEarthFeature(
         category,
         name,
         scale)
-    return multiline(natural_earth_feature, extent)
+    return FeatureIndex(natural_earth_feature.geometries())
+
+
+def zoom_scale(zoom):
+    """Natural Earth scale with enough detail for a zoom level"""
+    if zoom < 3:
+        return "110m"
+    if zoom < 6:
+        return "50m"
+    return "10m"
+
+
+@metrics.track_cache("natural_earth_tile")
+@lru_cache(maxsize=2048)
+def feature_tile(category, name, zxy, tile_size=256):
+    """Lines of a Z/X/Y tile clipped and simplified to pixel size"""
+    index = feature_index(category, name, zoom_scale(zxy[0]))
+    return index_tile(index, zxy, tile_size)
+
+
+def index_tile(index, zxy, tile_size=256):
+    """Clip and simplify lines of a FeatureIndex to a Z/X/Y tile
+
+    A one pixel margin lets lines run off the edge of the tile so
+    neighbouring tiles join without gaps.
+    """
+    x_range, y_range = tiling.tile_extents(zxy)
+    pixel = (x_range[1] - x_range[0]) / tile_size
+    x_range = (x_range[0] - pixel, x_range[1] + pixel)
+    y_range = (y_range[0] - pixel, y_range[1] + pixel)
+    (lon_0, lon_1), (lat_0, lat_1) = plate_carree(x_range, y_range)
+    lines = index.query((lon_0, lon_1, lat_0, lat_1))
+    return clip_lines(lines["xs"], lines["ys"], x_range, y_range, pixel)
+
+
+def plate_carree(x, y):
+    """Inverse of spherical Web Mercator"""
+    radius = 6378137.
+    lons = np.degrees(np.asarray(x) / radius)
+    lats = np.degrees(np.arctan(np.sinh(np.asarray(y) / radius)))
+    return lons, lats
+
+
+def clip_lines(xs, ys, x_range, y_range, tolerance):
+    """Clip lines to a box and simplify with Douglas-Peucker"""
+    import shapely.geometry
+    (x0, x1), (y0, y1) = x_range, y_range
+    box = shapely.geometry.box(x0, y0, x1, y1)
+    clipped_xs, clipped_ys = [], []
+    for x, y in zip(xs, ys):
+        finite = np.isfinite(x) & np.isfinite(y)
+        x, y = x[finite], y[finite]
+        if len(x) < 2:
+            continue
+        left, right, bottom, top = x.min(), x.max(), y.min(), y.max()
+        if (right < x0) or (left > x1) or (top < y0) or (bottom > y1):
+            continue
+        line = shapely.geometry.LineString(np.column_stack([x, y]))
+        inside = ((left >= x0) and (right <= x1) and
+                  (bottom >= y0) and (top <= y1))
+        if not inside:
+            line = line.intersection(box)
+        line = line.simplify(tolerance, preserve_topology=False)
+        for part in line_strings(line):
+            coords = np.asarray(part.coords)
+            clipped_xs.append(coords[:, 0])
+            clipped_ys.append(coords[:, 1])
+    return {
+        "xs": clipped_xs,
+        "ys": clipped_ys
+    }
+
+
+def line_strings(geometry):
+    """LineStrings of a clipped geometry, points are dropped"""
+    if geometry.is_empty:
+        return []
+    if geometry.geom_type in ("LineString", "LinearRing"):
+        return [geometry]
+    if hasattr(geometry, "geoms"):
+        return [part for g in geometry.geoms for part in line_strings(g)]
+    return []
 
 
 def multiline(feature, extent=None):
@@ -18,3 +109,70 @@ def multiline(feature, extent=None):
     else:
         geometries = feature.intersecting_geometries(extent)
     return xs_ys(cut(iterlines(geometries), 180))
+
+
+class FeatureIndex:
+    """Projected lines of each geometry with a bounding box index
+
+    Lines are cut at the anti-meridian and projected to Web Mercator
+    once. Extent queries compare the extent with every bounding box
+    in a single array operation and only run shapely's exact test on
+    geometries that cross the edge of the extent, the same selection
+    as cartopy's ``intersecting_geometries``.
+
+    :param geometries: shapely geometries in longitude/latitude
+    """
+    def __init__(self, geometries):
+        self.geometries = []
+        bounds = []
+        lines = []
+        owners = []
+        for geometry in geometries:
+            if geometry is None or geometry.is_empty:
+                continue
+            for line in iterlines([geometry]):
+                lines.append(line)
+                owners.append(len(self.geometries))
+            self.geometries.append(geometry)
+            bounds.append(geometry.bounds)
+        self.bounds = np.array(bounds, dtype="d").reshape(-1, 4)
+
+        # Cut and project every line of the feature in one pass
+        x, y, sizes = data.flatten(lines)
+        x, y, sizes, parents = data.cut_flat(x, y, sizes, 180)
+        x, y = data.project(x, y)
+        self.xs, self.ys = data.unflatten(x, y, sizes)
+        owners = np.array(owners, dtype="i8")[parents]
+        self.offsets = np.searchsorted(owners,
+                                       np.arange(len(self.geometries) + 1))
+
+    def __len__(self):
+        return len(self.geometries)
+
+    def query(self, extent=None):
+        """Lines of geometries intersecting (x0, x1, y0, y1) extent"""
+        if extent is None:
+            hits = range(len(self))
+        else:
+            hits = self.intersecting(extent)
+        xs, ys = [], []
+        for i in hits:
+            start, end = self.offsets[i], self.offsets[i + 1]
+            xs += self.xs[start:end]
+            ys += self.ys[start:end]
+        return {
+            "xs": xs,
+            "ys": ys
+        }
+
+    def intersecting(self, extent):
+        """Indices of geometries intersecting extent in original order"""
+        import shapely.geometry
+        import shapely.prepared
+        x0, x1, y0, y1 = extent
+        minx, miny, maxx, maxy = self.bounds.T
+        overlap = (minx <= x1) & (maxx >= x0) & (miny <= y1) & (maxy >= y0)
+        inside = (minx >= x0) & (maxx <= x1) & (miny >= y0) & (maxy <= y1)
+        box = shapely.prepared.prep(shapely.geometry.box(x0, y0, x1, y1))
+        return [i for i in np.flatnonzero(overlap)
+                if inside[i] or box.intersects(self.geometries[i])]
@@ -0,0 +1,127 @@
+"""Content-Encoding negotiation and codecs
+
+``gzip`` is always available. ``br`` and ``zstd`` are offered when the
+optional ``brotli`` and ``zstandard`` packages are installed, both
+decompress faster than gzip in the browser and zstd compresses much
+faster at similar ratios.
+
+Bodies compressed for every request use fast ``LEVELS``. Bodies that
+are compressed once and stored, e.g. cached tiles, use the slower
+``STORED_LEVELS`` as the cost is paid once. Responses smaller than
+``MINIMUM_SIZE`` are not worth the CPU and are sent as they are.
+"""
+import zlib
+from functools import lru_cache
+
+
+PREFERENCE = ("zstd", "br", "gzip")
+LEVELS = {"zstd": 3, "br": 4, "gzip": 6}
+STORED_LEVELS = {"zstd": 12, "br": 9, "gzip": 9}
+MINIMUM_SIZE = 1024
+MODULES = {"br": ("brotli", "brotlicffi"), "zstd": ("zstandard",)}
+
+
+def _import(encoding):
+    from importlib import import_module
+    for name in MODULES[encoding]:
+        try:
+            return import_module(name)
+        except ImportError:
+            continue
+    raise ImportError(f"no module for '{encoding}' encoding")
+
+
+@lru_cache()
+def available():
+    """Encodings this server can produce in order of preference"""
+    encodings = []
+    for encoding in PREFERENCE:
+        if encoding in MODULES:
+            try:
+                _import(encoding)
+            except ImportError:
+                continue
+        encodings.append(encoding)
+    return tuple(encodings)
+
+
+def parse_accept(header):
+    """Quality value of each coding in an Accept-Encoding header"""
+    qualities = {}
+    for item in header.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        if coding == "":
+            continue
+        q = 1.
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.
+        qualities[coding.lower()] = q
+    return qualities
+
+
+def negotiate(header, encodings=None):
+    """Best encoding the client accepts, None for identity
+
+    Highest quality wins, ties go to the server's preference.
+    """
+    if not header:
+        return None
+    if encodings is None:
+        encodings = available()
+    qualities = parse_accept(header)
+    best, best_q = None, 0.
+    for encoding in encodings:
+        q = qualities.get(encoding, qualities.get("*", 0.))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(body, encoding, level=None):
+    """Body compressed in one call"""
+    if level is None:
+        level = LEVELS.get(encoding)
+    if encoding == "gzip":
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        return compressor.compress(body) + compressor.flush()
+    if encoding == "br":
+        return _import("br").compress(body, quality=level)
+    if encoding == "zstd":
+        return _import("zstd").ZstdCompressor(level=level).compress(body)
+    raise ValueError(f"unknown encoding: '{encoding}'")
+
+
+class Compressor:
+    """Incremental compression of a streamed body"""
+    def __init__(self, encoding, level=None):
+        if level is None:
+            level = LEVELS.get(encoding)
+        if encoding == "gzip":
+            obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+            self._compress, self._finish = obj.compress, obj.flush
+        elif encoding == "br":
+            obj = _import("br").Compressor(quality=level)
+            self._compress, self._finish = obj.process, obj.finish
+        elif encoding == "zstd":
+            obj = _import("zstd").ZstdCompressor(level=level).compressobj()
+            self._compress, self._finish = obj.compress, obj.flush
+        else:
+            raise ValueError(f"unknown encoding: '{encoding}'")
+
+    def compress(self, chunk):
+        return self._compress(chunk)
+
+    def finish(self):
+        return self._finish()
+
+
+def headers(encoding):
+    """Response headers of a body in encoding, None for identity"""
+    if encoding is None:
+        return {}
+    return {"Content-Encoding": encoding, "Vary": "Accept-Encoding"}
@@ -1,7 +1,7 @@
 """Configuration parsing"""
-import bokeh.palettes
-from pydantic import BaseModel, root_validator, validator, ValidationError
-from typing import List, Dict, Union
+from pydantic import (BaseModel, PrivateAttr, root_validator, validator,
+                      ValidationError)
+from typing import List, Dict, Optional, Union
 
 
 class Viewport(BaseModel):
@@ -30,6 +30,7 @@ class NamedPalette(BaseModel):
 
     @root_validator()
     def must_be_valid_bokeh_palette(cls, values):
+        import bokeh.palettes
         try:
             name = values.get("name")
             number = values.get("number")
@@ -40,6 +41,7 @@ class NamedPalette(BaseModel):
         return values
 
     def palette(self):
+        import bokeh.palettes
         colors = bokeh.palettes.all_palettes[self.name][self.number]
         if self.reverse:
             colors = colors[::-1]
@@ -47,12 +49,45 @@ class NamedPalette(BaseModel):
 
 
 class Dataset(BaseModel):
+    """Dataset served by a driver
+
+    ``tile_size`` is the width and height of data tiles in pixels,
+    e.g. 512 for HiDPI screens. Tiles beyond ``max_zoom`` are made
+    from an ancestor tile, see forest_lite.server.lib.overzoom. None
+    derives it from the driver's grid spacing. ``reduction`` makes
+    tiles from their cached children, see
+    forest_lite.server.lib.pyramid. ``metatile`` renders blocks of
+    NxN tiles in one pass, see forest_lite.server.lib.metatile.
+    """
     label: str
     view: str = "tiled_image"
     driver: Driver = Driver()
     palettes: Dict[str, Palette] = {}
     user_groups: List[str] = None
     uid: int = 0
+    tile_size: int = 256
+    max_zoom: Optional[int] = None
+    reduction: Optional[str] = None
+    metatile: int = 1
+
+    @validator("tile_size")
+    def must_be_positive(cls, v):
+        if v <= 0:
+            raise ValueError("tile_size must be positive")
+        return v
+
+    @validator("metatile")
+    def must_be_power_of_two(cls, v):
+        if v <= 0 or (v & (v - 1)) != 0:
+            raise ValueError("metatile must be a power of two")
+        return v
+
+    @validator("reduction")
+    def must_be_reduction_method(cls, v):
+        from forest_lite.server.lib.pyramid import METHODS
+        if v is not None and v not in METHODS:
+            raise ValueError(f"reduction must be one of {METHODS}")
+        return v
 
     @validator("palettes", pre=True, each_item=True)
     def support_named_palettes(cls, v):
@@ -61,9 +96,79 @@ class Dataset(BaseModel):
         return v
 
 
+class WarmUp(BaseModel):
+    """Start up warm-up stage, see forest_lite.server.warmup"""
+    enabled: bool = False
+    datasets: bool = True
+
+
+class Prewarm(BaseModel):
+    """Warm caches when files change, see forest_lite.server.prewarm"""
+    enabled: bool = False
+    poll_seconds: float = 60
+    min_zoom: int = 0
+    max_zoom: int = 5
+    times: int = 3
+    data_vars: Optional[List[str]] = None
+    tiles_per_second: Optional[float] = 20
+    threads: int = 1
+
+
+class Profiling(BaseModel):
+    """On-demand sampling profiler, see forest_lite.server.lib.profiler
+
+    Disabled unless enabled and a token is set, requests must
+    present the token.
+    """
+    enabled: bool = False
+    token: Optional[str] = None
+    interval: float = 0.005
+    max_seconds: float = 30
+
+
+class RemoteCache(BaseModel):
+    """Network tile cache backend, ``http`` or a module:attribute"""
+    name: str = "http"
+    settings: dict = {}
+
+
+class TileCache(BaseModel):
+    """Tiered tile cache, see forest_lite.server.lib.tile_cache
+
+    Tiles taking longer than ``deadline_seconds`` are answered with
+    a provisional tile cut from a cached ancestor while the exact
+    tile is finished in the background.
+    """
+    enabled: bool = False
+    memory_bytes: int = 256 * 1024 ** 2
+    disk_directory: Optional[str] = None
+    disk_bytes: int = 10 * 1024 ** 3
+    remote: Optional[RemoteCache] = None
+    deadline_seconds: Optional[float] = None
+    _tiers: Optional[str] = PrivateAttr(default=None)
+
+    def tiers(self):
+        """JSON of the settings that describe cache tiers, made once"""
+        if self._tiers is None:
+            self._tiers = self.json(include={
+                "memory_bytes", "disk_directory", "disk_bytes", "remote"})
+        return self._tiers
+
+
 class Config(BaseModel):
     viewport: Viewport = Viewport()
     datasets: List[Dataset] = []
+    warm_up: WarmUp = WarmUp()
+    prewarm: Prewarm = Prewarm()
+    profiling: Profiling = Profiling()
+    tile_cache: TileCache = TileCache()
+    _index: Dict[int, Dataset] = PrivateAttr(default_factory=dict)
+
+    def __init__(self, **data):
+        super().__init__(**data)
+        # First dataset wins if uids are duplicated
+        self._index = {dataset.uid: dataset
+                       for dataset in reversed(self.datasets)}
 
     @root_validator(pre=True)
     def auto_id(cls, values):
@@ -77,6 +182,10 @@ class Config(BaseModel):
     def from_dict(cls, settings):
         return cls(**settings)
 
+    def dataset(self, uid) -> Optional[Dataset]:
+        """Find dataset by uid"""
+        return self._index.get(uid)
+
 
 def auto_id(items):
     for i, item in enumerate(items):
@@ -1,28 +1,33 @@
 """Example Python I/O library"""
-import glob
-import xarray
 import numpy as np
-from forest_lite.server.lib import tiling
+from forest_lite.server.lib import sources, tiling, tracing, workers
 
 
 TILE_SIZE = 256 # 256 # 64  # 128
 
 
-def _tile(tilable, z, x, y):
-    """Convenient interface for extension drivers"""
+def _tile(tilable, z, x, y, tile_size=None):
+    """Convenient interface for extension drivers
+
+    :param tile_size: pixels along each side, default TILE_SIZE
+    """
+    if tile_size is None:
+        tile_size = TILE_SIZE
     zxy = (z, x, y)
     if "longitude" in tilable:
         lons = tilable["longitude"]
         lats = tilable["latitude"]
-        web_mercator_x, web_mercator_y = tiling.web_mercator(lons, lats)
+        with tracing.span("project"):
+            web_mercator_x, web_mercator_y = tiling.web_mercator(lons, lats)
     else:
         web_mercator_x = tilable["web_mercator_x"]
         web_mercator_y = tilable["web_mercator_y"]
     values = tilable["values"]
     units = tilable["units"]
+    workers.checkpoint()
     data = tiling.data_tile(web_mercator_x, web_mercator_y,
                             values, zxy,
-                            tile_size=TILE_SIZE)
+                            tile_size=tile_size)
     data.update({
         "units": [units],
         "tile_key": [[x, y, z]]
@@ -31,6 +36,7 @@ def _tile(tilable, z, x, y):
 
 
 def get_points(path, time):
+    import xarray
     with xarray.open_dataset(path, engine="h5netcdf") as nc:
         pts = np.where(nc.time.values == time)
         if len(pts[0]) > 0:
@@ -40,7 +46,8 @@ def get_points(path, time):
 
 
 def get_path(pattern):
-    paths = sorted(glob.glob(pattern))
+    """Latest file matching pattern, listed once per directory change"""
+    paths = sources.list_files(pattern)
     if len(paths) > 0:
         return paths[-1]
     else:
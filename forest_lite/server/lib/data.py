@@ -5,20 +5,13 @@ Taken from FOREST project and trimmed down to essential methods
 """
 import numpy as np
 from forest_lite.server.lib import geo
-try:
-    import shapely.geometry
-except ImportError:
-    # ReadTheDocs unable to pip install shapely
-    pass
 
 
 def xs_ys(lines):
     """Map to Web Mercator projection and bokeh multi_line structure"""
-    xs, ys = [], []
-    for lons, lats in lines:
-        x, y = geo.web_mercator(lons, lats)
-        xs.append(x)
-        ys.append(y)
+    x, y, sizes = flatten(lines)
+    x, y = project(x, y)
+    xs, ys = unflatten(x, y, sizes)
     return {
         "xs": xs,
         "ys": ys
@@ -27,25 +20,82 @@ def xs_ys(lines):
 
 def cut(lines, x):
     """Cut lines in two if they cross a vertical line"""
-    for line in lines:
-        xs, ys = line
-        xs, ys = np.ma.asarray(xs), np.ma.asarray(ys)
-        if (np.min(xs) < x) and (np.max(xs) > x):
-            pts = np.ma.asarray(xs) < x
-            yield xs[pts], ys[pts]
-            yield xs[~pts], ys[~pts]
-        else:
-            yield line
+    flat_x, flat_y, sizes = flatten(lines)
+    flat_x, flat_y, sizes, _ = cut_flat(flat_x, flat_y, sizes, x)
+    return list(zip(*unflatten(flat_x, flat_y, sizes)))
+
+
+def flatten(lines):
+    """Concatenate lines into x, y arrays and the size of each line"""
+    lines = [(np.asarray(xs, dtype="d"), np.asarray(ys, dtype="d"))
+             for xs, ys in lines]
+    sizes = np.array([len(xs) for xs, _ in lines], dtype="i8")
+    if len(lines) == 0:
+        return np.zeros(0), np.zeros(0), sizes
+    x = np.concatenate([xs for xs, _ in lines])
+    y = np.concatenate([ys for _, ys in lines])
+    return x, y, sizes
+
+
+def unflatten(x, y, sizes):
+    """Split concatenated x, y arrays back into lines"""
+    if len(sizes) == 0:
+        return [], []
+    splits = np.cumsum(sizes)[:-1]
+    return np.split(x, splits), np.split(y, splits)
+
+
+def project(x, y):
+    """Web Mercator coordinates of flattened lines in one transform"""
+    if len(x) == 0:
+        return np.zeros(0), np.zeros(0)
+    return geo.web_mercator(x, y)
+
+
+def cut_flat(x, y, sizes, x_cut):
+    """Cut flattened lines that cross a vertical line in one pass
+
+    Points of a crossing line either side of the cut become separate
+    lines, points left of the cut first, each in original order.
+
+    :returns: x, y, sizes and the index of the input line of each
+              output line
+    """
+    n = len(sizes)
+    if n == 0:
+        return x, y, sizes, np.zeros(0, dtype="i8")
+    starts = np.cumsum(sizes) - sizes
+    filled = sizes > 0
+    lows = np.full(n, np.inf)
+    highs = np.full(n, -np.inf)
+    if filled.any():
+        lows[filled] = np.minimum.reduceat(x, starts[filled])
+        highs[filled] = np.maximum.reduceat(x, starts[filled])
+    crosses = (lows < x_cut) & (highs > x_cut)
+    line = np.repeat(np.arange(n), sizes)
+    group = 2 * line + (crosses[line] & (x >= x_cut))
+    order = np.argsort(group, kind="stable")
+    counts = np.bincount(group, minlength=2 * n)
+    keep = counts > 0
+    keep[0::2] = True  # Lines without points stay as empty lines
+    pieces = np.flatnonzero(keep)
+    return x[order], y[order], counts[pieces], pieces // 2
 
 
 def iterlines(geometries):
     """Iterate lines from cartopy geometry"""
+    import shapely.geometry
+
     def xy(g):
         if isinstance(g, shapely.geometry.LineString):
             return g.xy
         else:
             return g.exterior.coords.xy
     for geometry in geometries:
+        if hasattr(geometry, "geoms"):  # Multi-part, not iterable in shapely 2
+            for g in geometry.geoms:
+                yield xy(g)
+            continue
         try:
             for g in geometry:
                 yield xy(g)
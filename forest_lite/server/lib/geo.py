@@ -6,17 +6,27 @@ Module to handle projection and sampling of points for imaging.
 
 .. autofunction:: web_mercator
 
-"""
-try:
-    import cartopy
-except ImportError:
-    # ReadTheDocs unable to pip install cartopy
-    pass
+.. note:: cartopy, datashader and xarray are imported on first use
+          to keep server start up fast
 
+"""
 import numpy as np
-import datashader
-import xarray
+from forest_lite.server.lib import tracing
+
 
+def start_numba_threads():
+    """Start numba's parallel threading layer from the calling thread
+
+    Numba's TBB threading layer hangs the interpreter at exit if it
+    was first started by a thread that finished earlier, e.g. a pool
+    thread rendering a tile. Call from the main thread before
+    datashader runs in other threads.
+    """
+    try:
+        from numba.np.ufunc.parallel import _launch_threads
+    except ImportError:
+        return
+    _launch_threads()
 
 
 def datashader_stretch(values, gx, gy, x_range, y_range,
@@ -37,6 +47,8 @@ def datashader_stretch(values, gx, gy, x_range, y_range,
         plot_height = values.shape[0]
     if plot_width is None:
         plot_width = values.shape[1]
+    import datashader
+    import xarray
     canvas = datashader.Canvas(plot_height=plot_height,
                                plot_width=plot_width,
                                x_range=x_range,
@@ -44,7 +56,8 @@ def datashader_stretch(values, gx, gy, x_range, y_range,
     if gx.ndim == 1:
         # 1D Quadmesh
         xarr = xarray.DataArray(values, coords=[('y', gy), ('x', gx)], name='Z')
-        image = canvas.quadmesh(xarr)
+        with tracing.span("regrid"):
+            image = canvas.quadmesh(xarr)
     else:
         # 2D Quadmesh
         xarr = xarray.DataArray(values,
@@ -54,13 +67,15 @@ def datashader_stretch(values, gx, gy, x_range, y_range,
                                     'Qy': (['Y', 'X'], gy)
                                 },
                                 name='Z')
-        image = canvas.quadmesh(xarr, x='Qx', y='Qy')
-    return np.ma.masked_array(image.values,
-                          mask=np.isnan(
-                              image.values))
+        with tracing.span("regrid"):
+            image = canvas.quadmesh(xarr, x='Qx', y='Qy')
+    with tracing.span("mask"):
+        return np.ma.masked_array(image.values,
+                                  mask=np.isnan(image.values))
 
 
 def web_mercator(lons, lats):
+    import cartopy.crs
     return transform(
             lons,
             lats,
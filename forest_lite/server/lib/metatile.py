@@ -0,0 +1,66 @@
+"""Render blocks of neighbouring tiles in one pass
+
+A viewport loads 16 to 40 neighbouring tiles. Rendering each one
+sets up a canvas and traverses the source grid again. A metatile of
+NxN tiles is the tile at zoom ``z - log2(N)`` rendered N times
+larger, one regrid whose pixels line up exactly with those of the
+tiles inside it. It is sliced into tiles which are all cached, the
+rest of the viewport is then served from the cache.
+
+.. code-block:: yaml
+
+    tile_cache:
+      enabled: true
+    datasets:
+      - label: Global model
+        metatile: 4
+        driver:
+          name: xarray_h5netcdf
+          settings:
+            pattern: ~/global_*.nc
+
+Metatiles are rendered by drivers whose ``data_tile`` accepts a
+``tile_size`` keyword, other drivers, e.g. ``proxy``, render tiles one
+at a time. Only used with the tile cache enabled.
+"""
+import numpy as np
+from forest_lite.server.lib import tiling
+
+
+def block(zxy, size):
+    """Metatile containing tile zxy and the tiles inside it
+
+    Near zoom 0 metatiles shrink to the whole world.
+
+    :param size: tiles along each side, a power of two
+    :returns: (metatile zxy, tiles along each side, tiles in order)
+    """
+    z, x, y = zxy
+    shift = min(size.bit_length() - 1, z)
+    n = 2 ** shift
+    x0, y0 = (x >> shift) << shift, (y >> shift) << shift
+    tiles = [(z, x0 + i, y0 + j) for j in range(n) for i in range(n)]
+    return (z - shift, x >> shift, y >> shift), n, tiles
+
+
+def split(obj, n, zxy):
+    """Tile zxy sliced from a metatile n tiles across"""
+    data = obj.get("data") if isinstance(obj, dict) else None
+    if isinstance(data, dict):
+        return dict(obj, data=split(data, n, zxy))
+    if not isinstance(obj, dict) or "image" not in obj:
+        return obj
+    z, x, y = zxy
+    i, j = x % n, y % n
+    images = []
+    for image in obj["image"]:
+        image = np.ma.asarray(image)
+        height, width = image.shape[-2] // n, image.shape[-1] // n
+        images.append(image[..., j * height:(j + 1) * height,
+                            i * width:(i + 1) * width])
+    (x0, x1), (y0, y1) = tiling.tile_extents(zxy)
+    result = dict(obj, x=[x0], y=[y0], dw=[x1 - x0], dh=[y1 - y0],
+                  image=images, level=[z])
+    if "tile_key" in obj:
+        result["tile_key"] = [[x, y, z]]
+    return result
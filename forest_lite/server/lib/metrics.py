@@ -0,0 +1,303 @@
+"""Prometheus style metrics
+
+Minimal counters, gauges and histograms rendered in the Prometheus
+text exposition format by the /metrics endpoint.
+
+>>> REQUESTS = Counter("requests_total", "Requests", ["route"])
+>>> REQUESTS.labels(route="/datasets").inc()
+>>> print(render())
+
+Caches built with ``functools.lru_cache``, or anything else with a
+compatible ``cache_info()`` method, report hits, misses and evictions
+once registered with :func:`track_cache`.
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1., 2.5, 5., 10., math.inf)
+
+
+class Registry:
+    """Metrics and cache collectors rendered together"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._caches = {}
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"metric '{metric.name}' already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def track_cache(self, name, cache):
+        with self._lock:
+            self._caches[name] = cache
+        return cache
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+            caches = dict(self._caches)
+        lines = []
+        for metric in metrics:
+            lines += metric.render()
+        lines += render_caches(caches)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(),
+                 registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, **labels):
+        """Child metric for a combination of label values"""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        try:
+            return self._children[key]
+        except KeyError:
+            pass
+        with self._lock:
+            if key not in self._children:
+                self._children[key] = self._child()
+            return self._children[key]
+
+    def _default(self):
+        """Metrics without labels act as their only child"""
+        if len(self.labelnames) > 0:
+            raise ValueError(f"metric '{self.name}' requires labels")
+        return self.labels()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}",
+                 f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = list(self._children.items())
+        for key, child in children:
+            labels = dict(zip(self.labelnames, key))
+            lines += child.samples(self.name, labels)
+        return lines
+
+
+class _Value:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = 0.
+        self._function = None
+
+    def inc(self, amount=1.):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1.):
+        with self._lock:
+            self._value -= amount
+
+    def set(self, value):
+        with self._lock:
+            self._value = float(value)
+
+    def set_function(self, function):
+        """Read value from function at render time"""
+        self._function = function
+
+    def get(self):
+        if self._function is not None:
+            return float(self._function())
+        return self._value
+
+    def samples(self, name, labels):
+        return [sample(name, labels, self.get())]
+
+
+class Counter(_Metric):
+    """Monotonically increasing total"""
+    kind = "counter"
+    _child = _Value
+
+    def inc(self, amount=1.):
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+    kind = "gauge"
+    _child = _Value
+
+    def inc(self, amount=1.):
+        self._default().inc(amount)
+
+    def dec(self, amount=1.):
+        self._default().dec(amount)
+
+    def set(self, value):
+        self._default().set(value)
+
+    def set_function(self, function):
+        self._default().set_function(function)
+
+    @contextmanager
+    def track_inprogress(self):
+        child = self._default()
+        child.inc()
+        try:
+            yield
+        finally:
+            child.dec()
+
+
+class _Buckets:
+    def __init__(self, bounds):
+        self._lock = threading.Lock()
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.sum = 0.
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self, name, labels):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds, counts):
+            cumulative += count
+            le = "+Inf" if bound == math.inf else repr(float(bound))
+            lines.append(sample(f"{name}_bucket", dict(labels, le=le),
+                                cumulative))
+        lines.append(sample(f"{name}_sum", labels, total))
+        lines.append(sample(f"{name}_count", labels, cumulative))
+        return lines
+
+
+class Histogram(_Metric):
+    """Distribution of observations, e.g. latencies in seconds"""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        bounds = sorted(float(bound) for bound in buckets)
+        if bounds[-1] != math.inf:
+            bounds.append(math.inf)
+        self.buckets = tuple(bounds)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _child(self):
+        return _Buckets(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+
+def track_cache(name, registry=REGISTRY):
+    """Decorator to report hits, misses and evictions of a cache
+
+    >>> @track_cache("atlas_feature")
+    ... @lru_cache(maxsize=32)
+    ... def load(name):
+    ...     ...
+    """
+    def decorator(cache):
+        return registry.track_cache(name, cache)
+    return decorator
+
+
+def render_caches(caches):
+    """Cache statistics as counter and gauge families"""
+    if len(caches) == 0:
+        return []
+    families = [
+        ("forest_lite_cache_hits_total", "counter", "Cache hits"),
+        ("forest_lite_cache_misses_total", "counter", "Cache misses"),
+        ("forest_lite_cache_evictions_total", "counter", "Cache evictions"),
+        ("forest_lite_cache_entries", "gauge", "Entries held by cache"),
+    ]
+    stats = {name: cache_stats(cache) for name, cache in caches.items()}
+    lines = []
+    for i, (family, kind, documentation) in enumerate(families):
+        lines.append(f"# HELP {family} {documentation}")
+        lines.append(f"# TYPE {family} {kind}")
+        for name, values in sorted(stats.items()):
+            lines.append(sample(family, {"cache": name}, values[i]))
+    return lines
+
+
+def cache_stats(cache):
+    """Hits, misses, evictions and entries from cache_info()
+
+    Every miss of a bounded lru_cache inserts an entry, so entries
+    beyond the current size were evicted.
+    """
+    info = cache.cache_info()
+    evictions = getattr(info, "evictions", None)
+    if evictions is None:
+        evictions = 0
+        if info.maxsize is not None:
+            evictions = max(0, info.misses - info.currsize)
+    return info.hits, info.misses, evictions, info.currsize
+
+
+def sample(name, labels, value):
+    """Single line of the text exposition format"""
+    if len(labels) > 0:
+        pairs = ",".join(f'{key}="{escape(value)}"'
+                         for key, value in labels.items())
+        name = f"{name}{{{pairs}}}"
+    return f"{name} {format_value(value)}"
+
+
+def escape(value):
+    return (str(value).replace("\\", r"\\")
+                      .replace("\n", r"\n")
+                      .replace('"', r'\"'))
+
+
+def format_value(value):
+    value = float(value)
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if value != value:
+        return "NaN"
+    if value.is_integer() and abs(value) < 2 ** 53:
+        return str(int(value))
+    return repr(value)
+
+
+def render():
+    """Default registry in text exposition format"""
+    return REGISTRY.render()
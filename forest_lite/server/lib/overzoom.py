@@ -0,0 +1,132 @@
+"""Tiles beyond a dataset's native resolution
+
+Past the zoom where a tile pixel is finer than a grid cell, regridding
+the source only repeats cells. Tiles beyond a dataset's native zoom
+are cut from the ancestor tile at that zoom and upsampled, so one
+read of the source serves every deeper tile beneath it.
+
+.. code-block:: yaml
+
+    datasets:
+      - label: Global model
+        tile_size: 512
+        max_zoom: 6
+        driver:
+          name: xarray_h5netcdf
+          settings:
+            pattern: ~/global_*.nc
+
+Without ``max_zoom`` the native zoom follows from the driver's
+``grid_spacing``, drivers that do not know it render every zoom
+level from source.
+"""
+import math
+import numpy as np
+from forest_lite.server.lib import core, tiling, workers
+
+
+def native_zoom(spacing, tile_size=core.TILE_SIZE):
+    """Lowest zoom whose pixels are no larger than a grid cell
+
+    :param spacing: longitude spacing of the grid in degrees
+    """
+    if spacing is None or not spacing > 0:
+        return None
+    return max(0, math.ceil(math.log2(360 / (tile_size * spacing))))
+
+
+def dataset_zoom(dataset, data_var, query=None):
+    """Native zoom of a dataset, None if every zoom is rendered"""
+    if dataset.max_zoom is not None:
+        return dataset.max_zoom
+    from forest_lite.server import drivers
+    driver = drivers.from_spec(dataset.driver)
+    spacing = driver.grid_spacing(dataset.driver.settings, data_var,
+                                  query=query)
+    if not isinstance(spacing, (int, float)):
+        return None  # Unknown or a coroutine of a remote driver
+    return native_zoom(spacing, dataset.tile_size)
+
+
+def knows_spacing(driver):
+    """Whether a driver has a grid_spacing of its own
+
+    The BaseDriver default always answers None.
+    """
+    from forest_lite.server.drivers.base import BaseDriver
+    method = getattr(driver, "grid_spacing", None)
+    if method is None:
+        return False
+    return getattr(method, "__func__", None) is not BaseDriver.grid_spacing
+
+
+def tile_kwargs(dataset):
+    """Keyword arguments of driver.data_tile for a dataset
+
+    Default sized tiles pass none, drivers written before tile sizes
+    were configurable keep working.
+    """
+    if dataset.tile_size == core.TILE_SIZE:
+        return {}
+    return {"tile_size": dataset.tile_size}
+
+
+def ancestor(zxy, zoom):
+    """Tile at zoom containing tile zxy"""
+    z, x, y = zxy
+    shift = z - zoom
+    return (zoom, x >> shift, y >> shift)
+
+
+def decode(obj):
+    """Images of a decoded JSON tile as masked arrays"""
+    data = obj.get("data") if isinstance(obj, dict) else None
+    if isinstance(data, dict):
+        return dict(obj, data=decode(data))
+    if not isinstance(obj, dict) or "image" not in obj:
+        return obj
+    images = [np.ma.masked_invalid(np.asarray(image, dtype="f8"))
+              for image in obj["image"]]
+    return dict(obj, image=images)
+
+
+def upsample(obj, ancestor_zxy, zxy):
+    """Tile zxy cut from a tile of one of its ancestors
+
+    Each pixel repeats the ancestor pixel it falls in, the same
+    nearest neighbour look as rendering the grid at that zoom.
+    """
+    data = obj.get("data") if isinstance(obj, dict) else None
+    if isinstance(data, dict):
+        return dict(obj, data=upsample(data, ancestor_zxy, zxy))
+    if not isinstance(obj, dict) or "image" not in obj:
+        return obj
+    za, xa, ya = ancestor_zxy
+    z, x, y = zxy
+    n = 2 ** (z - za)
+    i, j = x - xa * n, y - ya * n
+    images = []
+    for image in obj["image"]:
+        image = np.ma.asarray(image)
+        height, width = image.shape[-2:]
+        rows = (j * height + np.arange(height)) // n
+        cols = (i * width + np.arange(width)) // n
+        images.append(image[..., rows[:, None], cols])
+    (x0, x1), (y0, y1) = tiling.tile_extents(zxy)
+    result = dict(obj, x=[x0], y=[y0], dw=[x1 - x0], dh=[y1 - y0],
+                  image=images, level=[z])
+    if "tile_key" in obj:
+        result["tile_key"] = [[x, y, z]]
+    return result
+
+
+class Ancestors(workers.SharedResults):
+    """Recently used ancestor tiles shared by their descendants
+
+    Requests for tiles beneath the same ancestor, e.g. a client
+    filling the screen at high zoom, wait for a single render.
+    Results with "errors" are not kept.
+    """
+
+
+ancestors = Ancestors()
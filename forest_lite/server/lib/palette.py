@@ -1,8 +1,6 @@
-import bokeh.palettes
-
-
 def all_palettes():
     """List of palette definitions"""
+    import bokeh.palettes
     for name in bokeh.palettes.all_palettes:
         for number in bokeh.palettes.all_palettes[name]:
             yield {
@@ -0,0 +1,141 @@
+"""Statistical sampling profiler for live servers
+
+Samples the Python stacks of running threads at a fixed interval
+and counts identical stacks. Profiles are rendered in the collapsed
+stack format, one ``frame;frame;frame count`` line per stack, read by
+flamegraph.pl, inferno and speedscope.
+
+>>> with Sampler(interval=0.005) as sampler:
+...     render_tile()
+>>> print(sampler.collapsed())
+
+A profile of a single request only samples threads working on that
+request, the event loop thread while the request is served plus
+worker threads while they run its driver calls, see :func:`attach`.
+"""
+import collections
+import contextvars
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+
+_sampler = contextvars.ContextVar("forest_lite_sampler", default=None)
+
+
+class Sampler:
+    """Background thread sampling stacks of selected threads
+
+    :param interval: seconds between samples
+    :param thread_ids: threads to sample, None for every thread
+    """
+    def __init__(self, interval=0.005, thread_ids=None):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.counts = collections.Counter()
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name="forest_lite-profiler",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def add_thread(self, ident):
+        with self._lock:
+            self.thread_ids[ident] = self.thread_ids.get(ident, 0) + 1
+
+    def remove_thread(self, ident):
+        with self._lock:
+            self.thread_ids[ident] -= 1
+            if self.thread_ids[ident] == 0:
+                del self.thread_ids[ident]
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """Record the current stack of each selected thread"""
+        me = threading.get_ident()
+        names = {thread.ident: thread.name
+                 for thread in threading.enumerate()}
+        with self._lock:
+            selected = None
+            if self.thread_ids is not None:
+                selected = set(self.thread_ids)
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            if selected is not None and ident not in selected:
+                continue
+            stack = collapse(frame, names.get(ident, str(ident)))
+            with self._lock:
+                self.counts[stack] += 1
+        with self._lock:
+            self.samples += 1
+
+    def collapsed(self):
+        """Profile in collapsed stack format, most frequent first"""
+        with self._lock:
+            items = self.counts.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in items)
+
+
+def collapse(frame, thread_name):
+    """Frames from thread root to leaf joined by semicolons"""
+    labels = []
+    while frame is not None:
+        code = frame.f_code
+        filename = os.path.basename(code.co_filename)
+        labels.append(f"{code.co_name} ({filename}:{code.co_firstlineno})")
+        frame = frame.f_back
+    labels.append(thread_name)
+    return ";".join(reversed(labels))
+
+
+@contextmanager
+def request_profile(interval):
+    """Sample the calling thread and threads attached to this context"""
+    sampler = Sampler(interval=interval, thread_ids={})
+    token = _sampler.set(sampler)
+    sampler.add_thread(threading.get_ident())
+    sampler.start()
+    try:
+        yield sampler
+    finally:
+        sampler.stop()
+        _sampler.reset(token)
+
+
+@contextmanager
+def attach():
+    """Include the current thread in a request profile, if any"""
+    sampler = _sampler.get()
+    if sampler is None:
+        yield
+        return
+    ident = threading.get_ident()
+    sampler.add_thread(ident)
+    try:
+        yield
+    finally:
+        sampler.remove_thread(ident)
@@ -0,0 +1,84 @@
+"""Tiles made from their four cached children
+
+Once high zoom tiles of a region are cached, e.g. by heavy use or
+pre-rendering, the tile one zoom level up covers the same pixels at
+half the resolution. Reducing each 2x2 block of its children makes
+it without reading or regridding the source.
+
+.. code-block:: yaml
+
+    datasets:
+      - label: Global model
+        reduction: mean
+        driver:
+          name: xarray_h5netcdf
+          settings:
+            pattern: ~/global_*.nc
+
+``mean`` averages the unmasked pixels of each block, a block is
+masked only if all of its pixels are. ``nearest`` keeps one pixel of
+each block. Tiles with a child missing from the cache are rendered
+from source.
+"""
+import numpy as np
+from forest_lite.server.lib import tiling
+
+
+METHODS = ("nearest", "mean")
+
+
+def children(zxy):
+    """Tiles one zoom level down covering tile zxy"""
+    z, x, y = zxy
+    return [(z + 1, 2 * x + i, 2 * y + j) for j in (0, 1) for i in (0, 1)]
+
+
+def mosaic(images):
+    """Join four images in the order of :func:`children`
+
+    Rows of tile images run south to north, the first two children
+    form the bottom half.
+    """
+    images = [np.ma.asarray(image) for image in images]
+    bottom = np.ma.concatenate(images[:2], axis=-1)
+    top = np.ma.concatenate(images[2:], axis=-1)
+    return np.ma.concatenate([bottom, top], axis=-2)
+
+
+def reduce_image(image, method="mean"):
+    """Image of half the size, one pixel per 2x2 block"""
+    image = np.ma.asarray(image)
+    if method == "nearest":
+        return image[..., ::2, ::2]
+    if method == "mean":
+        height, width = image.shape[-2:]
+        blocks = image.reshape(*image.shape[:-2], height // 2, 2,
+                               width // 2, 2)
+        return np.ma.masked_invalid(blocks.mean(axis=(-3, -1)))
+    raise ValueError(f"unknown reduction: '{method}'")
+
+
+def reduce(tiles, zxy, method="mean"):
+    """Tile zxy from its children, None if they hold no images
+
+    :param tiles: decoded child tiles in the order of :func:`children`
+    """
+    if all(isinstance(tile, dict) and isinstance(tile.get("data"), dict)
+           for tile in tiles):
+        data = reduce([tile["data"] for tile in tiles], zxy, method=method)
+        if data is None:
+            return None
+        return dict(tiles[0], data=data)
+    if not all(isinstance(tile, dict) and tile.get("image")
+               for tile in tiles):
+        return None
+    images = []
+    for parts in zip(*(tile["image"] for tile in tiles)):
+        images.append(reduce_image(mosaic(parts), method=method))
+    z, x, y = zxy
+    (x0, x1), (y0, y1) = tiling.tile_extents(zxy)
+    result = dict(tiles[0], x=[x0], y=[y0], dw=[x1 - x0], dh=[y1 - y0],
+                  image=images, level=[z])
+    if "tile_key" in tiles[0]:
+        result["tile_key"] = [[x, y, z]]
+    return result
@@ -0,0 +1,293 @@
+"""NumPy aware JSON encoding
+
+Drop-in replacement for bokeh's ``serialize_json`` that produces the
+same wire format, sorted keys, compact separators, non-finite floats
+as the strings "NaN", "Infinity" and "-Infinity", masked values as
+"NaN" and datetimes as milliseconds since epoch, but writes arrays
+straight into JSON text instead of routing every element through a
+general purpose ``JSONEncoder.default`` hook.
+
+Single precision arrays are written with the shortest digits that
+round-trip to the same float32, e.g. 0.1 rather than bokeh's
+0.10000000149011612, the same values in smaller responses.
+
+Float arrays dominate the cost of a response, mostly in formatting
+each float. Tiles typically repeat values, masked regions or pixels
+finer than the source grid, so arrays with many repeats are
+formatted once per distinct value and assembled by index.
+
+>>> serialize_json({"image": [np.ma.masked_invalid([1., np.nan])]})
+b'{"image":[[1.0,"NaN"]]}'
+
+"""
+import collections
+import datetime as dt
+import decimal
+import json
+import math
+import sys
+import numpy as np
+
+
+__all__ = ["serialize_json"]
+
+
+EPOCH = dt.datetime(1970, 1, 1)
+NP_EPOCH = np.datetime64(0, "ms")
+NP_MS = np.timedelta64(1, "ms")
+
+# Arrays smaller than this are not worth de-duplicating
+DEDUPE_MIN_SIZE = 1024
+
+# Sample size used to estimate the fraction of distinct values
+DEDUPE_SAMPLE_SIZE = 1024
+
+_encode_str = json.encoder.encode_basestring_ascii
+_encode_list = json.JSONEncoder(separators=(",", ":")).encode
+
+
+def serialize_json(obj) -> bytes:
+    """Encode obj as JSON bytes"""
+    chunks = []
+    _encode(obj, chunks)
+    return "".join(chunks).encode("ascii")
+
+
+def _encode(obj, chunks):
+    if isinstance(obj, str):
+        chunks.append(_encode_str(obj))
+    elif obj is None:
+        chunks.append("null")
+    elif obj is True:
+        chunks.append("true")
+    elif obj is False:
+        chunks.append("false")
+    elif isinstance(obj, int):
+        chunks.append(int.__repr__(obj))
+    elif isinstance(obj, float):
+        chunks.append(_float(obj))
+    elif isinstance(obj, dict):
+        _encode_dict(obj, chunks)
+    elif isinstance(obj, (list, tuple, collections.deque)):
+        _encode_sequence(obj, chunks)
+    elif isinstance(obj, np.ndarray):
+        chunks.append(_array(obj))
+    else:
+        _encode(_python_type(obj), chunks)
+
+
+def _encode_dict(obj, chunks):
+    if len(obj) == 0:
+        chunks.append("{}")
+        return
+    chunks.append("{")
+    first = True
+    for key in sorted(obj):
+        if first:
+            first = False
+        else:
+            chunks.append(",")
+        chunks.append(_key(key))
+        chunks.append(":")
+        _encode(obj[key], chunks)
+    chunks.append("}")
+
+
+def _encode_sequence(obj, chunks):
+    if len(obj) == 0:
+        chunks.append("[]")
+        return
+    if _float_vectors(obj):
+        chunks.append(_float_vector_list(obj))
+        return
+    chunks.append("[")
+    first = True
+    for item in obj:
+        if first:
+            first = False
+        else:
+            chunks.append(",")
+        _encode(item, chunks)
+    chunks.append("]")
+
+
+def _float_vectors(obj):
+    """Detect lists of 1D float arrays, e.g. coastline xs or ys"""
+    first = obj[0]
+    if type(first) is not np.ndarray or first.dtype.kind != "f":
+        return False
+    return all(type(item) is np.ndarray and item.ndim == 1
+               and item.dtype == first.dtype for item in obj)
+
+
+def _float_vector_list(arrays):
+    """Format many small arrays in one pass then split into lists"""
+    tokens = _float_tokens(np.concatenate(arrays)).tolist()
+    rows = []
+    start = 0
+    for array in arrays:
+        end = start + array.size
+        rows.append("[" + ",".join(tokens[start:end]) + "]")
+        start = end
+    return "[" + ",".join(rows) + "]"
+
+
+def _key(key):
+    if isinstance(key, str):
+        return _encode_str(key)
+    if key is None:
+        return '"null"'
+    if isinstance(key, bool):
+        return '"true"' if key else '"false"'
+    if isinstance(key, (int, float)):
+        return _encode_str(json.dumps(key))
+    raise TypeError(f"keys must be str, int, float, bool or None, "
+                    f"not {key.__class__.__name__}")
+
+
+def _float(value):
+    if value != value:
+        return '"NaN"'
+    if value == math.inf:
+        return '"Infinity"'
+    if value == -math.inf:
+        return '"-Infinity"'
+    return float.__repr__(value)
+
+
+def _python_type(obj):
+    """Map NumPy, date and time values to JSON compatible types"""
+    pd = sys.modules.get("pandas")  # Only relevant if already in use
+    if pd is not None:
+        if obj is pd.NaT:
+            return math.nan
+        if isinstance(obj, (pd.Timestamp, pd.Timedelta)):
+            return obj.value / 10**6
+        if isinstance(obj, pd.Period):
+            return obj.to_timestamp().value / 10**6
+    if isinstance(obj, np.datetime64):
+        return float((obj - NP_EPOCH) / NP_MS)
+    if isinstance(obj, np.timedelta64):  # Subclass of np.integer
+        return float(obj / NP_MS)
+    if isinstance(obj, np.floating):
+        return float(obj)
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.bool_):
+        return bool(obj)
+    if isinstance(obj, dt.datetime):
+        return (obj.replace(tzinfo=None) - EPOCH).total_seconds() * 1000
+    if isinstance(obj, dt.date):
+        return obj.isoformat()
+    if isinstance(obj, dt.time):
+        return ((obj.hour * 3600 + obj.minute * 60 + obj.second) * 1000
+                + obj.microsecond / 1000.)
+    if isinstance(obj, dt.timedelta):
+        return obj.total_seconds() * 1000.
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, slice):
+        return {"start": obj.start, "stop": obj.stop, "step": obj.step}
+    raise TypeError(f"Object of type {obj.__class__.__name__} "
+                    "is not JSON serializable")
+
+
+def _array(array):
+    """JSON text of a NumPy array"""
+    if isinstance(array, np.ma.MaskedArray):
+        if np.ma.is_masked(array):
+            if array.dtype.kind in "biu":
+                array = array.astype("d")
+            array = array.filled(np.nan)
+        else:
+            array = np.ma.getdata(array)
+    kind = array.dtype.kind
+    if kind == "M":
+        array = array.astype("datetime64[us]").astype("int64") / 1000.0
+    elif kind == "m":
+        array = array.astype("timedelta64[us]").astype("int64") / 1000.0
+    elif kind == "O" and array.size > 0 and isinstance(array.flat[0],
+                                                       dt.date):
+        try:
+            array = (array.astype("datetime64[us]").astype("int64")
+                     / 1000.0)
+        except Exception:
+            pass
+    kind = array.dtype.kind
+    if kind == "f":
+        return _float_array(array)
+    if kind in "biu":
+        return _encode_list(array.tolist())
+    if kind == "O":
+        chunks = []
+        _encode(_null_to_nan(array.tolist()), chunks)
+        return "".join(chunks)
+    return _encode_list(array.tolist())
+
+
+def _null_to_nan(items):
+    """Object arrays encode None as "NaN" for compatibility"""
+    if isinstance(items, list):
+        return [_null_to_nan(item) for item in items]
+    if items is None:
+        return math.nan
+    return items
+
+
+def _float_array(array):
+    if array.size == 0:
+        return _encode_list(array.tolist())
+    if array.size >= DEDUPE_MIN_SIZE and _repetitive(array):
+        return _dedupe_float_array(array)
+    return _nest(_float_tokens(array.ravel()), array.shape)
+
+
+def _float_tokens(array):
+    """JSON number tokens of a flat float array
+
+    NumPy formats the shortest representation that round-trips, the
+    same digits as ``repr``, without creating a Python float per value.
+    Single precision values are written with single precision digits.
+    """
+    if array.dtype.itemsize <= 4:
+        tokens = array.astype("f").astype("U16")
+    else:
+        tokens = array.astype("d").astype("U32")
+    if not np.isfinite(array).all():
+        tokens[np.isnan(array)] = '"NaN"'
+        tokens[array == np.inf] = '"Infinity"'
+        tokens[array == -np.inf] = '"-Infinity"'
+    return tokens
+
+
+def _bits(array):
+    """Integer view distinguishes -0.0 from 0.0 unlike float equality"""
+    flat = np.ascontiguousarray(array).ravel()
+    return flat.view(f"u{flat.dtype.itemsize}")
+
+
+def _repetitive(array):
+    """Estimate from a sample whether most values are repeats"""
+    bits = _bits(array)
+    step = max(1, bits.size // DEDUPE_SAMPLE_SIZE)
+    sample = bits[::step]
+    return np.unique(sample).size * 4 <= sample.size
+
+
+def _dedupe_float_array(array):
+    """Format each distinct value once then assemble by index"""
+    values, inverse = np.unique(_bits(array), return_inverse=True)
+    tokens = _float_tokens(values.view(array.dtype))
+    return _nest(tokens[inverse.ravel()], array.shape)
+
+
+def _nest(tokens, shape):
+    """Join a flat array of JSON tokens into nested lists"""
+    if len(shape) == 0:
+        return tokens[0]
+    rows = tokens.reshape(-1, shape[-1])
+    joined = np.empty(len(rows), dtype=object)
+    joined[:] = ["[" + ",".join(row) + "]" for row in rows.tolist()]
+    if len(shape) == 1:
+        return joined[0]
+    return _nest(joined, shape[:-1])
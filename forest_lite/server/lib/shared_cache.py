@@ -0,0 +1,286 @@
+"""Cache shared by server processes
+
+With several workers, see ``forest_lite run --workers``, each process
+would otherwise decode files and render tiles into its own memory.
+Results of functions decorated with :func:`memoize` are stored once
+in a directory, on ``/dev/shm`` that is shared memory, and read back
+by every worker.
+
+>>> @memoize("grib2_data")
+... def get_grib2_data(path, timestamp_s, variable):
+...     ...
+
+Entries are pickled with NumPy buffers kept out-of-band and aligned
+in the file, reading maps the file so arrays are views of the same
+pages in every process. Arrays returned from the cache are read-only.
+A file lock per key lets one process compute a missing entry while
+others wait for it, entries with other keys are computed alongside.
+
+The cache is disabled, decorated functions are called directly,
+unless the ``FOREST_LITE_SHARED_CACHE`` environment variable names a
+directory. ``FOREST_LITE_SHARED_CACHE_BYTES`` limits its size.
+"""
+import collections
+import copyreg
+import functools
+import hashlib
+import io
+import json
+import mmap
+import os
+import pickle
+import struct
+import threading
+from contextlib import contextmanager
+import numpy as np
+from forest_lite.server.lib import metrics
+
+
+ENV_DIRECTORY = "FOREST_LITE_SHARED_CACHE"
+ENV_MAX_BYTES = "FOREST_LITE_SHARED_CACHE_BYTES"
+MAX_BYTES = 1024 ** 3
+MAGIC = b"FLSC"
+ALIGN = 64
+
+
+CacheInfo = collections.namedtuple(
+    "CacheInfo", ["hits", "misses", "maxsize", "currsize", "evictions"])
+
+
+class SharedCache:
+    """Directory of memory mapped entries
+
+    Oldest entries are removed once the directory holds more than
+    max_bytes.
+    """
+    def __init__(self, directory, max_bytes=MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._written = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(directory, "locks"), exist_ok=True)
+
+    def path(self, key):
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        return os.path.join(self.directory, f"{digest}.entry")
+
+    def get_or_compute(self, key, fn):
+        """Cached value of key or the result of fn() stored under key"""
+        path = self.path(key)
+        found, value = self._read(path)
+        if not found:
+            with self._locked(path):
+                found, value = self._read(path)  # Computed meanwhile?
+                if not found:
+                    value = fn()
+                    self._write(path, value)
+        with self._lock:
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return value
+
+    def _read(self, path):
+        try:
+            return True, read(path)
+        except FileNotFoundError:
+            return False, None
+        except (ValueError, pickle.UnpicklingError, EOFError):
+            remove(path)  # Unreadable, e.g. written by another version
+            return False, None
+
+    def _write(self, path, value):
+        size = write(path, value)
+        with self._lock:
+            self._written += size
+            prune = self._written > self.max_bytes / 10
+            if prune:
+                self._written = 0
+        if prune:
+            self.prune()
+
+    @contextmanager
+    def _locked(self, path):
+        """Hold the lock file of an entry
+
+        Lock files are removed on release, a waiter that locked a
+        removed file opens the new one instead.
+        """
+        try:
+            import fcntl
+        except ImportError:  # Not POSIX, accept duplicate work
+            yield
+            return
+        name = os.path.basename(path).replace(".entry", ".lock")
+        lock_path = os.path.join(self.directory, "locks", name)
+        while True:
+            stream = open(lock_path, "a")
+            fcntl.flock(stream, fcntl.LOCK_EX)
+            try:
+                current = os.stat(lock_path).st_ino
+            except FileNotFoundError:
+                current = None
+            if current == os.fstat(stream.fileno()).st_ino:
+                break
+            stream.close()
+        try:
+            yield
+        finally:
+            remove(lock_path)
+            stream.close()  # Releases the lock
+
+    def entries(self):
+        """(mtime, size, path) of every entry"""
+        items = []
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return items
+        for entry in entries:
+            if not entry.name.endswith(".entry"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            items.append((stat.st_mtime, stat.st_size, entry.path))
+        return items
+
+    def prune(self):
+        """Remove oldest entries until below 90% of max_bytes"""
+        items = sorted(self.entries())
+        total = sum(size for _, size, _ in items)
+        if total <= self.max_bytes:
+            return
+        removed = 0
+        for _, size, path in items:
+            if total <= 0.9 * self.max_bytes:
+                break
+            if remove(path):
+                removed += 1
+            total -= size
+        with self._lock:
+            self.evictions += removed
+
+    def cache_info(self):
+        return CacheInfo(self.hits, self.misses, None,
+                         len(self.entries()), self.evictions)
+
+
+def remove(path):
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _masked_array(data, mask, fill_value):
+    return np.ma.masked_array(data, mask=mask, fill_value=fill_value,
+                              copy=False)
+
+
+def _reduce_masked_array(array):
+    """Pickle data and mask as plain arrays to keep them out-of-band"""
+    return _masked_array, (array.data, array.mask, array.fill_value)
+
+
+def dumps(value):
+    """Pickle bytes and out-of-band buffers of value"""
+    stream = io.BytesIO()
+    buffers = []
+    pickler = pickle.Pickler(stream, protocol=5,
+                             buffer_callback=buffers.append)
+    pickler.dispatch_table = copyreg.dispatch_table.copy()
+    pickler.dispatch_table[np.ma.MaskedArray] = _reduce_masked_array
+    pickler.dump(value)
+    return stream.getvalue(), [buffer.raw() for buffer in buffers]
+
+
+def align(position):
+    return -(-position // ALIGN) * ALIGN
+
+
+def write(path, value):
+    """Save value atomically, readers never see a partial file
+
+    :returns: size of file in bytes
+    """
+    data, views = dumps(value)
+    offsets = []
+    position = len(data)
+    for view in views:
+        position = align(position)
+        offsets.append((position, view.nbytes))
+        position += view.nbytes
+    header = json.dumps({"pickle": len(data), "buffers": offsets}).encode()
+    prefix = MAGIC + struct.pack("<Q", len(header)) + header
+    start = align(len(prefix))
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as stream:
+        stream.write(prefix.ljust(start, b"\0"))
+        stream.write(data)
+        position = len(data)
+        for (offset, size), view in zip(offsets, views):
+            stream.write(b"\0" * (offset - position))
+            stream.write(view)
+            position = offset + size
+    os.replace(tmp, path)
+    return start + position
+
+
+def read(path):
+    """Load value with arrays mapped from the file"""
+    with open(path, "rb") as stream:
+        if os.fstat(stream.fileno()).st_size == 0:
+            raise ValueError(f"empty cache entry: {path}")
+        view = memoryview(mmap.mmap(stream.fileno(), 0,
+                                    access=mmap.ACCESS_READ))
+    if view[:4] != MAGIC:
+        raise ValueError(f"not a cache entry: {path}")
+    length, = struct.unpack("<Q", view[4:12])
+    header = json.loads(bytes(view[12:12 + length]))
+    start = align(12 + length)
+    buffers = [view[start + offset:start + offset + size]
+               for offset, size in header["buffers"]]
+    return pickle.loads(view[start:start + header["pickle"]],
+                        buffers=buffers)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process wide SharedCache configured by environment, if any"""
+    global _cache
+    directory = os.getenv(ENV_DIRECTORY)
+    if not directory:
+        return None
+    with _cache_lock:
+        if _cache is None or _cache.directory != directory:
+            max_bytes = int(os.getenv(ENV_MAX_BYTES, MAX_BYTES))
+            _cache = SharedCache(directory, max_bytes=max_bytes)
+            metrics.REGISTRY.track_cache("shared", _cache)
+        return _cache
+
+
+def memoize(name):
+    """Decorator to share results across processes
+
+    Arguments must have a stable ``repr``, e.g. paths and numbers.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            cache = get_cache()
+            if cache is None:
+                return fn(*args, **kwargs)
+            key = repr((name, args, sorted(kwargs.items())))
+            return cache.get_or_compute(key, lambda: fn(*args, **kwargs))
+        return wrapper
+    return decorator
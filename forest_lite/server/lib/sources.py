@@ -0,0 +1,186 @@
+"""Identity of source files behind cached results
+
+A path alone does not identify data, files are rewritten in place
+and new model runs replace old ones. Cached results derived from a
+file are keyed on its :class:`FileIdentity`, path, inode,
+modification time and size, so a rewritten file is a cache miss.
+
+>>> @metrics.track_cache("xarray_h5netcdf_tile")
+... @file_cache()
+... def data_tile(source, data_var, z, x, y):
+...     with xarray.open_dataset(source.path) as nc:
+...         ...
+
+Entries of a file's previous identity are dropped as soon as the
+change is seen. Drivers list files with :func:`update_catalog`,
+entries of files that are no longer listed, e.g. runs removed by a
+housekeeping job, are dropped straight away rather than waiting to
+be evicted.
+
+:func:`list_files` re-lists a pattern only when its directory
+changes, new or removed files change the directory's mtime.
+"""
+import collections
+import functools
+import glob
+import os
+import threading
+import weakref
+from typing import NamedTuple
+
+
+class FileIdentity(NamedTuple):
+    path: str
+    inode: int
+    mtime_ns: int
+    size: int
+
+
+def identify(path):
+    """Identity of a file on disk"""
+    stat = os.stat(path)
+    return FileIdentity(path, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def identities(paths):
+    """Identities of those paths that exist"""
+    result = []
+    for path in paths:
+        try:
+            result.append(identify(path))
+        except FileNotFoundError:
+            continue
+    return result
+
+
+CacheInfo = collections.namedtuple(
+    "CacheInfo", ["hits", "misses", "maxsize", "currsize", "evictions"])
+
+
+_caches = weakref.WeakSet()
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+class FileCache:
+    """Least recently used cache of results derived from a file
+
+    The first argument of the wrapped function is the source file.
+    Paths are replaced by their :class:`FileIdentity` before the call,
+    the function reads ``source.path``.
+    """
+    def __init__(self, fn, maxsize=128):
+        functools.update_wrapper(self, fn)
+        self.fn = fn
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._identities = {}  # Path to identity of cached entries
+        self._lock = threading.Lock()
+        _caches.add(self)
+
+    def __call__(self, source, *args, **kwargs):
+        if not isinstance(source, FileIdentity):
+            source = identify(source)
+        key = (source, args, tuple(sorted(kwargs.items())))
+        with self._lock:
+            self._observe(source)
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+        value = self.fn(source, *args, **kwargs)
+        with self._lock:
+            current = self._identities.get(source.path)
+            if current is not None and current != source:
+                return value  # File changed during the call, too stale
+            self._identities[source.path] = source
+            self._entries[key] = value
+            while (self.maxsize is not None and
+                   len(self._entries) > self.maxsize):
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def _observe(self, source):
+        """Drop entries of an earlier identity of the same path"""
+        previous = self._identities.get(source.path)
+        if previous != source:
+            if previous is not None:
+                self._drop({source.path})
+            self._identities[source.path] = source
+
+    def _drop(self, paths):
+        for key in [key for key in self._entries if key[0].path in paths]:
+            del self._entries[key]
+        for path in paths:
+            self._identities.pop(path, None)
+
+    def discard(self, paths):
+        """Drop entries derived from any of paths"""
+        with self._lock:
+            self._drop(set(paths))
+
+    def cache_clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._identities.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def cache_info(self):
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize,
+                             len(self._entries), self.evictions)
+
+
+def file_cache(maxsize=128):
+    """Decorator similar to lru_cache keyed on source file identity"""
+    def decorator(fn):
+        return FileCache(fn, maxsize=maxsize)
+    return decorator
+
+
+def update_catalog(pattern, paths):
+    """Record the files matching a pattern
+
+    Entries derived from files that matched last time but no longer
+    do are dropped from every :class:`FileCache`.
+    """
+    paths = frozenset(paths)
+    with _catalogs_lock:
+        previous = _catalogs.get(pattern, frozenset())
+        _catalogs[pattern] = paths
+    gone = previous - paths
+    if len(gone) > 0:
+        for cache in list(_caches):
+            cache.discard(gone)
+    return gone
+
+
+def list_files(pattern):
+    """Sorted paths matching pattern, re-listed when their directory
+    changes
+
+    Patterns with wildcards in the directory are listed every time.
+    """
+    directory = os.path.dirname(pattern) or "."
+    if glob.has_magic(directory):
+        return _list_files.__wrapped__(pattern, None)
+    try:
+        mtime_ns = os.stat(directory).st_mtime_ns
+    except FileNotFoundError:
+        return ()
+    return _list_files(pattern, mtime_ns)
+
+
+@functools.lru_cache(maxsize=64)
+def _list_files(pattern, mtime_ns):
+    paths = tuple(sorted(glob.glob(pattern)))
+    update_catalog(pattern, paths)
+    return paths
@@ -0,0 +1,387 @@
+"""Tiered cache of serialized tiles
+
+Tiles served by the tile endpoint are kept in up to three tiers,
+fastest first:
+
+1. memory, least recently used tiles in this process
+2. disk, files in a directory that survive restarts and are shared
+   by processes on the same host
+3. remote, a network service shared by sibling nodes
+
+Lookups try each tier in turn and copy a hit into the faster tiers
+above it. New tiles are written to every tier. Each tier evicts
+least recently used tiles independently once it holds more than
+its byte limit. Remote services enforce their own limits.
+
+Enabled by the ``tile_cache`` section of the config file.
+
+.. code-block:: yaml
+
+    tile_cache:
+      enabled: true
+      memory_bytes: 268435456
+      disk_directory: /var/cache/forest_lite/tiles
+      disk_bytes: 10737418240
+      remote:
+        name: http
+        settings:
+          url: http://tile-cache.local:8000/tiles
+
+The ``http`` remote stores tiles with ``GET`` and ``PUT`` requests to
+``{url}/{key}``. Other backends are named by ``module:attribute``
+import strings, a callable taking the remote settings as keyword
+arguments that returns an object with ``get(key)`` and
+``set(key, value)`` methods.
+"""
+import collections
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from functools import lru_cache
+from importlib import import_module
+from forest_lite.server.lib import metrics, sources
+
+
+logger = logging.getLogger(__name__)
+
+
+VERSION = "1"
+
+
+CacheInfo = collections.namedtuple(
+    "CacheInfo", ["hits", "misses", "maxsize", "currsize", "evictions"])
+
+
+class _Stats:
+    """Hit, miss and eviction counts reported by /metrics"""
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._stats_lock = threading.Lock()
+
+    def count(self, hit):
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def evicted(self, number=1):
+        with self._stats_lock:
+            self.evictions += number
+
+    def cache_info(self):
+        return CacheInfo(self.hits, self.misses, self.max_bytes,
+                         self.entries(), self.evictions)
+
+
+class MemoryTier(_Stats):
+    """Least recently used tiles within a byte limit"""
+    name = "memory"
+
+    def __init__(self, max_bytes):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+        self.count(value is not None)
+        return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        evicted = 0
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._items[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, old = self._items.popitem(last=False)
+                self.size -= len(old)
+                evicted += 1
+        if evicted:
+            self.evicted(evicted)
+
+    def entries(self):
+        return len(self._items)
+
+
+class DiskTier(_Stats):
+    """Tile files in a directory, modification time marks last use
+
+    Several processes may share a directory, files are written to a
+    temporary name and moved into place so readers never see part of
+    a tile.
+    """
+    name = "disk"
+
+    def __init__(self, directory, max_bytes):
+        super().__init__()
+        self.directory = os.path.expanduser(directory)
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        self.size = sum(size for _, size, _ in self.files())
+        self._lock = threading.Lock()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.tile")
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, "rb") as stream:
+                value = stream.read()
+            os.utime(path)
+        except FileNotFoundError:
+            value = None
+        self.count(value is not None)
+        return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        path = self.path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as stream:
+            stream.write(value)
+        try:
+            old_size = os.stat(path).st_size  # Promoted or re-stored
+        except FileNotFoundError:
+            old_size = 0
+        os.replace(tmp, path)
+        with self._lock:
+            self.size += len(value) - old_size
+            full = self.size > self.max_bytes
+        if full:
+            self.prune()
+
+    def files(self):
+        """(mtime, size, path) of every tile file"""
+        items = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".tile"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            items.append((stat.st_mtime, stat.st_size, entry.path))
+        return items
+
+    def prune(self):
+        """Remove least recently used files until below 90% of limit"""
+        items = sorted(self.files())
+        total = sum(size for _, size, _ in items)
+        evicted = 0
+        for _, size, path in items:
+            if total <= 0.9 * self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                evicted += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        with self._lock:
+            self.size = total
+        self.evicted(evicted)
+
+    def entries(self):
+        return len(self.files())
+
+
+class HTTPTier(_Stats):
+    """Tiles stored by a service with GET and PUT {url}/{key}
+
+    Network errors are logged and treated as misses, the service is
+    skipped for retry_seconds after a failure so an outage does not
+    add a timeout to every request.
+    """
+    name = "remote"
+    max_bytes = None
+
+    def __init__(self, url, timeout=1., retry_seconds=30.):
+        super().__init__()
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.retry_seconds = retry_seconds
+        self._failed = None
+
+    def available(self):
+        failed = self._failed
+        return (failed is None or
+                time.monotonic() - failed > self.retry_seconds)
+
+    def get(self, key):
+        import urllib.error
+        import urllib.request
+        value = None
+        if self.available():
+            try:
+                with urllib.request.urlopen(f"{self.url}/{key}",
+                                            timeout=self.timeout) as response:
+                    value = response.read()
+                self._failed = None
+            except urllib.error.HTTPError as e:
+                if e.code != 404:
+                    self.fail(e)
+            except OSError as e:
+                self.fail(e)
+        self.count(value is not None)
+        return value
+
+    def set(self, key, value):
+        import urllib.request
+        if not self.available():
+            return
+        request = urllib.request.Request(f"{self.url}/{key}", data=value,
+                                         method="PUT")
+        request.add_header("Content-Type", "application/octet-stream")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout):
+                pass
+        except OSError as e:
+            self.fail(e)
+
+    def fail(self, error):
+        self._failed = time.monotonic()
+        logger.warning(f"tile cache {self.url} unavailable: {error}")
+
+    def entries(self):
+        return 0
+
+
+class TieredCache:
+    """Tiers searched in order, hits are promoted to faster tiers"""
+    def __init__(self, tiers):
+        self.tiers = list(tiers)
+
+    def get(self, key, start=0, stop=None):
+        """Value from the first tier in tiers[start:stop] holding key"""
+        stop = len(self.tiers) if stop is None else stop
+        for i in range(start, stop):
+            value = self.tiers[i].get(key)
+            if value is not None:
+                for tier in self.tiers[:i]:
+                    tier.set(key, value)
+                return value
+        return None
+
+    def set(self, key, value, start=0, stop=None):
+        for tier in self.tiers[start:stop]:
+            tier.set(key, value)
+
+    @property
+    def local(self):
+        """Number of tiers on this host, remote tiers come last"""
+        return sum(1 for tier in self.tiers
+                   if getattr(tier, "name", "remote") != "remote")
+
+
+def tile_key(driver, data_var, zxy, query=None, sources=(),
+             tile_size=256):
+    """Digest of everything that identifies a tile
+
+    :param driver: Driver spec of the dataset, name and settings
+    :param sources: FileIdentity of each file the tile is made from,
+                    rewritten or new files change the key
+    :param tile_size: pixels along each side of the tile
+    """
+    text = json.dumps([VERSION, driver.name, driver.settings, data_var,
+                       list(zxy), canonical_query(query),
+                       [list(source) for source in sources],
+                       tile_size],
+                      sort_keys=True, default=str)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def canonical_query(query):
+    """Query text independent of key order and number formatting
+
+    e.g. '{"time":1.0,"level":2}' and '{"level":2,"time":1}' match.
+    """
+    if query is None:
+        return None
+    try:
+        obj = json.loads(query)
+    except ValueError:
+        return query
+    return json.dumps(_integral(obj), sort_keys=True, separators=(",", ":"))
+
+
+def _integral(obj):
+    """Whole floats as ints, JSON.stringify writes 1.0 as 1"""
+    if isinstance(obj, float) and obj.is_integer():
+        return int(obj)
+    if isinstance(obj, dict):
+        return {key: _integral(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [_integral(value) for value in obj]
+    return obj
+
+
+def dataset_key(dataset, data_var, zxy, query=None):
+    """Key of a dataset tile, lists and stats the dataset's files"""
+    return dataset_keys(dataset, data_var, [zxy], query)[0]
+
+
+def dataset_keys(dataset, data_var, zxys, query=None):
+    """Keys of several tiles of a dataset, files are listed once"""
+    from forest_lite.server import drivers
+    driver = drivers.from_spec(dataset.driver)
+    paths = driver.sources(dataset.driver.settings, data_var, query=query)
+    identities = sources.identities(paths)
+    return [tile_key(dataset.driver, data_var, zxy, query, identities,
+                     tile_size=dataset.tile_size) for zxy in zxys]
+
+
+def remote_tier(spec):
+    """Remote tier from name and settings"""
+    if spec.name == "http":
+        factory = HTTPTier
+    else:
+        module_name, _, attr = spec.name.partition(":")
+        factory = getattr(import_module(module_name), attr)
+    return factory(**spec.settings)
+
+
+def get_cache(settings):
+    """Cache described by tile_cache settings, None if disabled
+
+    Caches are reused while their tiers stay the same, e.g. across
+    config file reloads that change other sections or the deadline.
+    Only the latest cache is kept, two caches never share a disk
+    directory.
+    """
+    if not settings.enabled:
+        return None
+    return _build(settings.tiers())
+
+
+@lru_cache(maxsize=1)
+def _build(spec):
+    from forest_lite.server.lib.config import TileCache
+    settings = TileCache.parse_raw(spec)
+    tiers = [MemoryTier(settings.memory_bytes)]
+    if settings.disk_directory is not None:
+        tiers.append(DiskTier(settings.disk_directory, settings.disk_bytes))
+    if settings.remote is not None:
+        tiers.append(remote_tier(settings.remote))
+    for tier in tiers:
+        if hasattr(tier, "cache_info"):
+            name = getattr(tier, "name", "remote")
+            metrics.REGISTRY.track_cache(f"tile_{name}", tier)
+    return TieredCache(tiers)
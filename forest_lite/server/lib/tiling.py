@@ -1,11 +1,24 @@
 """Wrap forest.geo to make an easier interface"""
-import cartopy
+from functools import lru_cache
 import numpy as np
 from forest_lite.server.lib import geo
 
 
-GOOGLE_X_LIMITS = cartopy.crs.Mercator.GOOGLE.x_limits
-GOOGLE_Y_LIMITS = cartopy.crs.Mercator.GOOGLE.y_limits
+@lru_cache
+def google_limits():
+    """Web Mercator x/y limits, imports cartopy on first call"""
+    import cartopy.crs
+    return (cartopy.crs.Mercator.GOOGLE.x_limits,
+            cartopy.crs.Mercator.GOOGLE.y_limits)
+
+
+def __getattr__(name):
+    """Lazy GOOGLE_X_LIMITS and GOOGLE_Y_LIMITS module attributes"""
+    if name == "GOOGLE_X_LIMITS":
+        return google_limits()[0]
+    if name == "GOOGLE_Y_LIMITS":
+        return google_limits()[1]
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
 
 
 def _start(limits):
@@ -43,10 +56,11 @@ def data_tile(gx, gy, values, zxy, tile_size=128):
 def tile_extents(zxy):
     """Calculate tile x/y-range from {Z}/{X}/{Y}.png values"""
     level, i, j = zxy
-    x0 = _start(GOOGLE_X_LIMITS)
-    y0 = _start(GOOGLE_Y_LIMITS)
-    dx = _extent(GOOGLE_X_LIMITS) / (2 ** level)
-    dy = _extent(GOOGLE_Y_LIMITS) / (2 ** level)
+    x_limits, y_limits = google_limits()
+    x0 = _start(x_limits)
+    y0 = _start(y_limits)
+    dx = _extent(x_limits) / (2 ** level)
+    dy = _extent(y_limits) / (2 ** level)
     x_range = (x0 + i * dx, x0 + (i + 1) * dx)
     y_range = (y0 + j * dy, y0 + (j + 1) * dy)
     return x_range, y_range
@@ -0,0 +1,98 @@
+"""Per-request stage timings
+
+Stages along the tile path record how long they take.
+
+>>> with span("regrid"):
+...     image = canvas.quadmesh(xarr)
+
+Spans are collected by the trace of the current request, started by
+``TimingMiddleware`` and reported in a ``Server-Timing`` header.
+Outside of a trace ``span`` only costs a context variable lookup.
+The trace is held in a context variable so driver calls in worker
+threads record into the request that made them.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+
+_trace = contextvars.ContextVar("forest_lite_trace", default=None)
+
+
+class Trace:
+    """Spans recorded while serving one request"""
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, name, start, seconds):
+        with self._lock:
+            self.spans.append((name, start - self.start, seconds))
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def totals(self):
+        """Seconds per stage name, repeated stages are summed"""
+        totals = {}
+        with self._lock:
+            spans = list(self.spans)
+        for name, _, seconds in spans:
+            totals[name] = totals.get(name, 0.) + seconds
+        return totals
+
+    def records(self):
+        """Spans as dicts with millisecond offsets and durations"""
+        with self._lock:
+            spans = list(self.spans)
+        return [{"name": name,
+                 "start_ms": round(offset * 1000, 3),
+                 "duration_ms": round(seconds * 1000, 3)}
+                for name, offset, seconds in spans]
+
+    def server_timing(self):
+        """Server-Timing header value including the total so far"""
+        items = [(name, seconds) for name, seconds in self.totals().items()]
+        items.append(("total", self.elapsed()))
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}"
+                         for name, seconds in items)
+
+
+def start():
+    """Begin a trace in the current context
+
+    :returns: trace and token to pass to :func:`stop`
+    """
+    trace = Trace()
+    return trace, _trace.set(trace)
+
+
+def stop(token):
+    _trace.reset(token)
+
+
+def current():
+    return _trace.get()
+
+
+@contextmanager
+def span(name):
+    """Time a block of code as a named stage of the current request"""
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, start, time.perf_counter() - start)
+
+
+def record(name, start, seconds):
+    """Add a stage measured elsewhere, e.g. time queued for a thread"""
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(name, start, seconds)
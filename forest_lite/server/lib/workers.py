@@ -0,0 +1,206 @@
+"""Thread pool for blocking driver calls
+
+Drivers read files and render tiles synchronously. Running them in a
+dedicated pool keeps the event loop responsive and makes queueing
+visible, the number of calls waiting for a thread is exported as a
+gauge next to the number of busy threads.
+
+Work for a client that has gone away is dropped. Calls still queued
+are removed from the queue, calls already running stop at their
+next :func:`checkpoint`, e.g. between reading and regridding.
+"""
+import asyncio
+import collections
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from forest_lite.server.lib import geo, metrics, profiler, tracing
+
+
+logger = logging.getLogger(__name__)
+
+
+# Set once the request behind the current call has gone away
+_cancelled = contextvars.ContextVar("forest_lite_cancelled", default=None)
+
+
+class Cancelled(Exception):
+    """Work stopped as nobody is waiting for the result"""
+
+
+def checkpoint():
+    """Raise Cancelled if the request behind this call has gone"""
+    event = _cancelled.get()
+    if event is not None and event.is_set():
+        raise Cancelled()
+
+
+class WorkerPool:
+    """Lazily started ThreadPoolExecutor with queue accounting"""
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+        self.queued = 0
+        self.active = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                geo.start_numba_threads()
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="forest_lite")
+            return self._executor
+
+    async def run(self, fn, *args, **kwargs):
+        """Call fn(*args, **kwargs) in a worker thread
+
+        Context variables, e.g. the request trace, are copied into
+        the worker thread.
+        """
+        submitted = time.perf_counter()
+
+        def task():
+            started = time.perf_counter()
+            tracing.record("queue", submitted, started - submitted)
+            with self._lock:
+                self.queued -= 1
+                self.active += 1
+            try:
+                checkpoint()
+                with profiler.attach():
+                    return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.active -= 1
+
+        with self._lock:
+            self.queued += 1
+        context = contextvars.copy_context()
+        future = self.executor.submit(context.run, task)
+        future.add_done_callback(self._forget)
+        return await asyncio.wrap_future(future)
+
+    def spawn(self, fn, *args, **kwargs):
+        """Call fn(*args, **kwargs) in a worker thread without waiting
+
+        Errors are logged, the future is returned for callers that
+        want the result later.
+        """
+        future = self.executor.submit(contextvars.copy_context().run,
+                                      fn, *args, **kwargs)
+        future.add_done_callback(_log_error)
+        return future
+
+    def _forget(self, future):
+        """Calls cancelled before they started leave the queue"""
+        if future.cancelled():
+            with self._lock:
+                self.queued -= 1
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+def _log_error(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("background task failed", exc_info=future.exception())
+
+
+def detach(task):
+    """Let an asyncio task finish without waiting, errors are logged"""
+    task.add_done_callback(_log_error)
+    return task
+
+
+async def shared(awaitable):
+    """Await work shared by several requests
+
+    Checkpoints ignore the request that happened to start the work,
+    it finishes while anyone is waiting for it.
+    """
+    _cancelled.set(None)
+    return await awaitable
+
+
+class SharedResults:
+    """Recently used results of work shared by several requests
+
+    Requests for the same key wait for a single call. Results with
+    "errors" are not kept.
+    """
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self._items = collections.OrderedDict()
+        self._pending = {}
+
+    async def get(self, key, render):
+        """Result stored under key, awaits render() on a miss"""
+        try:
+            self._items.move_to_end(key)
+            return self._items[key]
+        except KeyError:
+            pass
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(shared(render()))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        obj = await asyncio.shield(task)
+        if not (isinstance(obj, dict) and "errors" in obj):
+            self._items[key] = obj
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return obj
+
+    def clear(self):
+        self._items.clear()
+
+
+async def until_disconnected(request, awaitable, interval=0.1):
+    """Result of awaitable, None if the client disconnects first
+
+    The client is polled every interval seconds. On disconnect the
+    work is cancelled, queued worker calls never start and running
+    ones stop at their next checkpoint.
+    """
+    event = threading.Event()
+
+    async def work():
+        _cancelled.set(event)  # Seen by worker calls made from here
+        return await awaitable
+
+    task = asyncio.ensure_future(work())
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=interval)
+        if task in done:
+            return task.result()
+        if await request.is_disconnected():
+            event.set()
+            task.cancel()
+            CANCELLED.inc()
+            return None
+
+
+pool = WorkerPool()
+
+QUEUE_DEPTH = metrics.Gauge(
+    "forest_lite_worker_queue_depth",
+    "Driver calls waiting for a worker thread")
+QUEUE_DEPTH.set_function(lambda: pool.queued)
+
+ACTIVE = metrics.Gauge(
+    "forest_lite_worker_active",
+    "Worker threads busy with driver calls")
+ACTIVE.set_function(lambda: pool.active)
+
+CANCELLED = metrics.Counter(
+    "forest_lite_cancelled_total",
+    "Requests whose work was cancelled as the client disconnected")
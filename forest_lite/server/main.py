@@ -4,26 +4,60 @@ import uvicorn
 import fastapi
 from fastapi import Request, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.staticfiles import StaticFiles
 from starlette.templating import Jinja2Templates
 from starlette.responses import FileResponse
+from forest_lite.server import config, prewarm, warmup
+from forest_lite.server.lib import compression, workers
 from forest_lite.server.routers import (api,
                                         atlas,
                                         datasets,
-                                        _graphql,
+                                        health,
+                                        metrics,
                                         palettes,
+                                        profile,
                                         viewport)
+from forest_lite.server.static import StaticAssets
+from forest_lite.server.middleware import (CompressionMiddleware,
+                                           MetricsMiddleware,
+                                           TimingMiddleware)
+from forest_lite.server.util import LazyApp
 
 
 app = fastapi.FastAPI()
 app.include_router(api.router)
 app.include_router(atlas.router)
 app.include_router(datasets.router)
-app.include_router(_graphql.router)
+app.include_router(health.router)
+app.include_router(metrics.router)
 app.include_router(palettes.router)
+app.include_router(profile.router)
 app.include_router(viewport.router)
 
+# graphene is only imported if /graphql is used
+app.add_route("/graphql",
+              LazyApp("forest_lite.server.routers._graphql:app"))
+
+
+@app.on_event("startup")
+def start_warm_up():
+    """Optional warm-up stage and cache warming of new runs
+
+    Progress reported by /ready and /prewarm respectively.
+    """
+    get_settings = app.dependency_overrides.get(config.get_settings)
+    if get_settings is None:
+        if os.getenv("CONFIG_FILE") is None:
+            return
+        get_settings = config.get_settings
+    warmup.start(get_settings())
+    prewarm.start(get_settings)
+
+
+@app.on_event("shutdown")
+def stop_workers():
+    prewarm.stop()
+    workers.pool.shutdown()
+
 
 # CORS
 origins = [
@@ -37,13 +71,27 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
-# GZip responses
-app.add_middleware(GZipMiddleware)
+# Compress responses, bodies that repeat are compressed once so
+# afford slower levels. Pre-compressed bodies are sent as they are
+app.add_middleware(CompressionMiddleware,
+                   route_levels={
+                       "/natural_earth_feature": compression.STORED_LEVELS
+                   })
+
+# Server-Timing header, requests slower than SLOW_REQUEST_MS are logged
+slow_request_ms = os.getenv("SLOW_REQUEST_MS")
+app.add_middleware(TimingMiddleware,
+                   slow_seconds=(None if slow_request_ms is None
+                                 else float(slow_request_ms) / 1000))
+
+# Request metrics, outermost to include time spent compressing
+app.add_middleware(MetricsMiddleware)
 
 
-# /static assets
+# /static assets, link with static_url() to allow long lived caching
 static_dir = os.path.join(os.path.dirname(__file__), "../client/static")
-app.mount("/static", StaticFiles(directory=static_dir), name="static")
+static = StaticAssets(directory=static_dir)
+app.mount("/static", static, name="static")
 
 
 # Templates
@@ -66,7 +114,8 @@ async def root(request: Request):
         if baseURL.endswith("/"):
             baseURL = baseURL[:-1]  # Remove trailing /
     context = {"request": request,
-               "baseURL": baseURL}
+               "baseURL": baseURL,
+               "static_url": static.url}
     return templates.TemplateResponse("index.html", context)
 
 
@@ -0,0 +1,274 @@
+"""ASGI middleware"""
+import json
+import logging
+import hashlib
+import time
+from starlette.datastructures import Headers, MutableHeaders
+from forest_lite.server.lib import compression, metrics, tile_cache, tracing
+
+
+logger = logging.getLogger(__name__)
+
+
+REQUESTS = metrics.Counter(
+    "forest_lite_requests_total",
+    "HTTP requests by route, dataset and status code",
+    ["route", "dataset", "status"])
+
+REQUEST_SECONDS = metrics.Histogram(
+    "forest_lite_request_duration_seconds",
+    "HTTP request latency by route and dataset",
+    ["route", "dataset"])
+
+RESPONSE_BYTES = metrics.Counter(
+    "forest_lite_response_bytes_total",
+    "Response body bytes served by route",
+    ["route"])
+
+IN_FLIGHT = metrics.Gauge(
+    "forest_lite_requests_in_flight",
+    "HTTP requests currently being served")
+
+
+class MetricsMiddleware:
+    """Record request counts, latency and bytes served
+
+    Requests are labelled with the route path template, e.g.
+    ``/datasets/{dataset_id}/{data_var}/tiles/{Z}/{X}/{Y}``, rather
+    than the URL to keep the number of series bounded. Added last so
+    byte counts are after compression.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        size = 0
+
+        async def wrapped_send(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        start = time.perf_counter()
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, wrapped_send)
+        finally:
+            IN_FLIGHT.dec()
+            seconds = time.perf_counter() - start
+            route = route_path(scope)
+            dataset = scope.get("path_params", {}).get("dataset_id", "")
+            REQUESTS.labels(route=route, dataset=dataset,
+                            status=status).inc()
+            REQUEST_SECONDS.labels(route=route,
+                                   dataset=dataset).observe(seconds)
+            RESPONSE_BYTES.labels(route=route).inc(size)
+
+
+class CompressionMiddleware:
+    """Compress responses with the best encoding a client accepts
+
+    Bodies smaller than minimum_size, already encoded, e.g.
+    pre-compressed cached tiles, or of media types that do not
+    compress are sent as they are. Compressed copies of whole bodies
+    are kept by digest, a body served again costs a hash rather
+    than compression.
+
+    :param route_levels: levels of whole bodies by path prefix, the
+                         longest matching prefix wins over default
+                         levels. Streamed bodies, e.g. files, are not
+                         kept so always use default levels
+    :param cache_bytes: memory for compressed copies, 0 to disable
+    """
+    def __init__(self, app, minimum_size=compression.MINIMUM_SIZE,
+                 levels=None, route_levels=None, cache_bytes=64 * 1024 ** 2):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.levels = dict(compression.LEVELS, **(levels or {}))
+        self.route_levels = sorted((route_levels or {}).items(),
+                                   key=lambda item: -len(item[0]))
+        self.cache = None
+        if cache_bytes > 0:
+            self.cache = tile_cache.MemoryTier(cache_bytes)
+            metrics.REGISTRY.track_cache("compressed", self.cache)
+
+    async def __call__(self, scope, receive, send):
+        encoding = None
+        if scope["type"] == "http":
+            headers = Headers(scope=scope)
+            encoding = compression.negotiate(headers.get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = CompressionResponder(self, encoding,
+                                         self.level(scope["path"], encoding),
+                                         send)
+        await self.app(scope, receive, responder.send)
+
+    def level(self, path, encoding):
+        for prefix, levels in self.route_levels:
+            if path.startswith(prefix) and encoding in levels:
+                return levels[encoding]
+        return self.levels[encoding]
+
+    def compress(self, body, encoding, level):
+        """Compressed body, reused if the same body was seen before"""
+        if self.cache is None:
+            return compression.compress(body, encoding, level)
+        digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        key = f"{digest}.{encoding}.{level}"
+        value = self.cache.get(key)
+        if value is None:
+            value = compression.compress(body, encoding, level)
+            self.cache.set(key, value)
+        return value
+
+
+def compressible(media_type):
+    media_type = media_type.split(";")[0].strip().lower()
+    return (media_type.startswith("text/") or
+            media_type.endswith(("json", "javascript", "xml")) or
+            media_type in ("image/svg+xml", "application/wasm"))
+
+
+class CompressionResponder:
+    """Send wrapper that compresses one response"""
+    def __init__(self, middleware, encoding, level, send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.level = level
+        self._send = send
+        self.start = None
+        self.passthrough = False
+        self.compressor = None
+
+    async def send(self, message):
+        if self.passthrough:
+            await self._send(message)
+        elif message["type"] == "http.response.start":
+            headers = Headers(raw=message.get("headers", []))
+            self.start = message
+            self.passthrough = ("content-encoding" in headers or
+                                not compressible(
+                                    headers.get("content-type", "")))
+            if self.passthrough:
+                await self._send(message)
+        elif message["type"] != "http.response.body":
+            await self._send(message)
+        elif self.compressor is None and self.start is not None:
+            await self.first_body(message)
+        else:
+            await self.next_body(message)
+
+    async def first_body(self, message):
+        start, self.start = self.start, None
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        headers = MutableHeaders(raw=start["headers"])
+        if not more_body:
+            if len(body) < self.middleware.minimum_size:
+                self.passthrough = True
+                await self._send(start)
+                await self._send(message)
+                return
+            body = self.middleware.compress(body, self.encoding, self.level)
+            headers["Content-Length"] = str(len(body))
+        else:
+            self.compressor = compression.Compressor(
+                self.encoding, self.middleware.levels[self.encoding])
+            body = self.compressor.compress(body)
+            del headers["Content-Length"]
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        await self._send(start)
+        await self._send(dict(message, body=body))
+
+    async def next_body(self, message):
+        more_body = message.get("more_body", False)
+        body = self.compressor.compress(message.get("body", b""))
+        if not more_body:
+            body += self.compressor.finish()
+        await self._send(dict(message, body=body))
+
+
+class TimingMiddleware:
+    """Server-Timing header of request stages and slow request log
+
+    Stages recorded with ``tracing.span`` while serving a request,
+    e.g. file open, regrid and serialize, are summed by name and
+    sent with the response. Requests slower than ``slow_seconds``
+    are logged at WARNING level with their path, query string and
+    spans. Every request's spans are logged at DEBUG level.
+
+    :param slow_seconds: threshold for slow request log, None to
+                         disable
+    """
+    def __init__(self, app, slow_seconds=None):
+        self.app = app
+        self.slow_seconds = slow_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace, token = tracing.start()
+        status = 500
+
+        async def wrapped_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                header = trace.server_timing().encode("latin-1")
+                message["headers"] = (list(message.get("headers", [])) +
+                                      [(b"server-timing", header)])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, wrapped_send)
+        finally:
+            tracing.stop(token)
+            seconds = trace.elapsed()
+            slow = (self.slow_seconds is not None and
+                    seconds >= self.slow_seconds)
+            if slow or logger.isEnabledFor(logging.DEBUG):
+                record = json.dumps(request_record(scope, status,
+                                                   seconds, trace))
+                if slow:
+                    logger.warning(f"slow request: {record}")
+                else:
+                    logger.debug(f"request: {record}")
+
+
+def request_record(scope, status, seconds, trace):
+    """JSON compatible summary of a request and its spans"""
+    return {
+        "method": scope.get("method"),
+        "path": scope.get("path"),
+        "query_string": scope.get("query_string", b"").decode("latin-1"),
+        "path_params": {key: str(value) for key, value in
+                        scope.get("path_params", {}).items()},
+        "status": status,
+        "duration_ms": round(seconds * 1000, 3),
+        "spans": trace.records()
+    }
+
+
+def route_path(scope):
+    """Path template of the route or mount that handled a request"""
+    endpoint = scope.get("endpoint")
+    app = scope.get("app")
+    if endpoint is not None and app is not None:
+        for route in app.router.routes:
+            if endpoint in (getattr(route, "endpoint", None),
+                            getattr(route, "app", None)):
+                return route.path
+    return "unmatched"
@@ -0,0 +1,411 @@
+"""Warm caches when a new model run lands
+
+The first forecasters to open a run that has just arrived would
+otherwise wait for cold tiles. A background job polls the files of
+each dataset and, when they change, asks the driver for axis
+meta-data and renders low zoom tiles of the first few time steps
+into the tile cache. Zoom levels beyond a dataset's native zoom are
+not warmed, their tiles are cut from warmed ancestors.
+
+.. code-block:: yaml
+
+    tile_cache:
+      enabled: true
+    prewarm:
+      enabled: true
+      poll_seconds: 60
+      max_zoom: 5
+      times: 3
+      data_vars: [air_temperature]
+      tiles_per_second: 20
+
+Tiles are stored under the same keys as the tile endpoint, keys
+include the identity of the dataset's files so tiles of the new run
+are the ones warmed. Without a tile cache only driver caches of file
+meta-data are warmed. Tiles without data are not divided further,
+e.g. the oceans of a regional model at zoom 0 skip their children.
+
+Warming gives way to interactive traffic, it pauses while calls are
+queued in the worker pool and renders at most ``tiles_per_second``.
+Progress is reported by the /prewarm endpoint.
+
+With several worker processes, see ``forest_lite run --workers``, one
+process warms, the one holding a lock in the shared cache directory.
+Progress is per process, the others report the state ``elsewhere``.
+"""
+import datetime as dt
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from forest_lite.server import drivers
+from forest_lite.server.lib import (geo, overzoom, shared_cache, sources,
+                                    tile_cache, workers)
+from forest_lite.server.lib.pyramid import children
+from forest_lite.server.lib.serialize import serialize_json
+
+
+logger = logging.getLogger(__name__)
+
+
+RUN_DIMS = ("start_time", "forecast_reference_time")
+
+
+class Progress:
+    """Thread-safe record of warming by dataset"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.state = "disabled"
+        self.datasets = {}
+
+    def set_state(self, state):
+        with self._lock:
+            self.state = state
+
+    def start(self, label, total):
+        with self._lock:
+            self.datasets[label] = {
+                "state": "warming",
+                "started": dt.datetime.utcnow().isoformat(),
+                "finished": None,
+                "total": total,
+                "rendered": 0,
+                "cached": 0,
+                "skipped": 0,
+                "errors": []
+            }
+
+    def count(self, label, outcome, number=1):
+        with self._lock:
+            self.datasets[label][outcome] += number
+
+    def error(self, label, error):
+        with self._lock:
+            errors = self.datasets[label]["errors"]
+            errors.append(str(error))
+            del errors[:-10]  # Most recent only
+
+    def finish(self, label):
+        with self._lock:
+            item = self.datasets[label]
+            item["state"] = "warm"
+            item["finished"] = dt.datetime.utcnow().isoformat()
+
+    def dict(self):
+        with self._lock:
+            datasets = {}
+            for label, item in self.datasets.items():
+                item = dict(item, errors=list(item["errors"]))
+                item["completed"] = (item["rendered"] + item["cached"] +
+                                     item["skipped"])
+                datasets[label] = item
+            return {"state": self.state, "datasets": datasets}
+
+
+progress = Progress()
+
+
+class Throttle:
+    """Pace background work behind interactive requests
+
+    :param rate: calls per second, None for no limit
+    :param pool: WorkerPool whose queued calls take priority
+    """
+    def __init__(self, rate=None, pool=None, stop=None):
+        self.rate = rate
+        self.pool = pool
+        self.stop = threading.Event() if stop is None else stop
+        self._next = 0.
+        self._lock = threading.Lock()
+
+    def wait(self):
+        while (self.pool is not None and self.pool.queued > 0 and
+               not self.stop.is_set()):
+            self.stop.wait(0.05)
+        if self.rate:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next)
+                self._next = start + 1 / self.rate
+            self.stop.wait(start - now)
+
+
+def pyramid_size(min_zoom, max_zoom):
+    """Number of tiles from min_zoom to max_zoom covering one tile"""
+    return sum(4 ** z for z in range(max_zoom - min_zoom + 1))
+
+
+def has_data(obj):
+    """False if every pixel of a tile is missing
+
+    Works with rendered tiles and their decoded JSON, where missing
+    values are "NaN" strings.
+    """
+    if isinstance(obj, dict) and isinstance(obj.get("data"), dict):
+        obj = obj["data"]
+    if not isinstance(obj, dict) or not obj.get("image"):
+        return True
+    for image in obj["image"]:
+        values = np.ma.asarray(image, dtype="f8")
+        if np.ma.masked_invalid(values).count() > 0:
+            return True
+    return False
+
+
+def is_lon_lat_dim(dim_name):
+    return ("latitude" in dim_name) or ("longitude" in dim_name)
+
+
+def js_value(value):
+    """Same JSON text as JSON.stringify in the browser"""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def query_string(query):
+    """Query parameter as sent by the client, None if no dims"""
+    if not query:
+        return None
+    return json.dumps({key: js_value(value) for key, value in query.items()},
+                      separators=(",", ":"), ensure_ascii=False)
+
+
+def axis_values(driver, settings, data_var, dim_name):
+    """Axis values as the client receives them"""
+    obj = driver.points(settings, data_var, dim_name)
+    return json.loads(serialize_json(obj)).get("data", [])
+
+
+def queries(driver, settings, data_var, dims, times=3):
+    """Query strings of the first time steps of the latest run
+
+    Run dimensions take their latest value, other time dimensions
+    their first ``times`` values and remaining dimensions their first.
+    """
+    choices = []
+    for dim_name in dims:
+        if is_lon_lat_dim(dim_name):
+            continue
+        values = axis_values(driver, settings, data_var, dim_name)
+        if len(values) == 0:
+            return []
+        if dim_name in RUN_DIMS:
+            values = values[-1:]
+        elif "time" in dim_name:
+            values = values[:times]
+        else:
+            values = values[:1]
+        choices.append((dim_name, values))
+    result = [{}]
+    for dim_name, values in choices:
+        result = [dict(query, **{dim_name: value})
+                  for query in result for value in values]
+    return [query_string(query) for query in result]
+
+
+class Job:
+    """Poll datasets and warm the ones whose files changed
+
+    :param get_settings: callable returning current Config, reloads
+                         are picked up on the next poll
+    """
+    def __init__(self, get_settings, pool=workers.pool,
+                 progress=progress):
+        self.get_settings = get_settings
+        self.progress = progress
+        self.stop_event = threading.Event()
+        self.pool = pool
+        self._seen = {}
+        self._thread = None
+
+    def poll(self, settings):
+        """Datasets with new, removed or rewritten files"""
+        changed = []
+        for dataset in settings.datasets:
+            if dataset.driver.name == "":
+                continue
+            driver = drivers.from_spec(dataset.driver)
+            paths = driver.sources(dataset.driver.settings, None)
+            identities = tuple(sources.identities(paths))
+            if len(identities) == 0:
+                continue
+            if self._seen.get(dataset.uid) != identities:
+                self._seen[dataset.uid] = identities
+                changed.append(dataset)
+        return changed
+
+    def run_once(self):
+        settings = self.get_settings()
+        for dataset in self.poll(settings):
+            if self.stop_event.is_set():
+                break
+            try:
+                self.warm(settings, dataset)
+            except Exception as e:
+                logger.exception(f"prewarm '{dataset.label}' failed")
+                self.progress.error(dataset.label, e)
+
+    def run(self):
+        while not self.stop_event.is_set():
+            self.progress.set_state("polling")
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("prewarm poll failed")
+            self.progress.set_state("waiting")
+            self.stop_event.wait(self.get_settings().prewarm.poll_seconds)
+
+    def warm(self, settings, dataset):
+        """Axis meta-data then low zoom tiles of a dataset"""
+        options = settings.prewarm
+        driver = drivers.from_spec(dataset.driver)
+        description = driver.description(dataset.driver.settings)
+        if hasattr(description, "__await__"):
+            description.close()  # Proxies to other servers
+            return
+        if not isinstance(description, dict):
+            description = description.dict()
+        layers = []
+        for data_var, desc in description.get("data_vars", {}).items():
+            if (options.data_vars is not None and
+                    data_var not in options.data_vars):
+                continue
+            for query in queries(driver, dataset.driver.settings, data_var,
+                                 desc.get("dims", []), times=options.times):
+                max_zoom = options.max_zoom
+                zoom = overzoom.dataset_zoom(dataset, data_var, query)
+                if zoom is not None:
+                    max_zoom = min(max_zoom, zoom)
+                if max_zoom >= options.min_zoom:
+                    layers.append((data_var, query, max_zoom))
+        cache = tile_cache.get_cache(settings.tile_cache)
+        if cache is None:
+            layers = []
+        total = sum(pyramid_size(options.min_zoom, max_zoom)
+                    for _, _, max_zoom in layers)
+        self.progress.start(dataset.label, total)
+        throttle = Throttle(options.tiles_per_second, pool=self.pool,
+                            stop=self.stop_event)
+        with ThreadPoolExecutor(max_workers=options.threads,
+                                thread_name_prefix="forest_lite_prewarm"
+                                ) as executor:
+            for data_var, query, max_zoom in layers:
+                self.warm_layer(executor, throttle, cache, dataset,
+                                data_var, query, options.min_zoom, max_zoom)
+        self.progress.finish(dataset.label)
+
+    def warm_layer(self, executor, throttle, cache, dataset, data_var,
+                   query, min_zoom, max_zoom):
+        """Tiles of one variable and query, zoom level by zoom level"""
+        n = 2 ** min_zoom
+        level = [(min_zoom, x, y) for x in range(n) for y in range(n)]
+        for z in range(min_zoom, max_zoom + 1):
+            if self.stop_event.is_set():
+                return
+            results = executor.map(
+                lambda zxy: self.warm_tile(throttle, cache, dataset,
+                                           data_var, zxy, query),
+                level)
+            following = []
+            for zxy, divide in zip(level, results):
+                if divide:
+                    following += children(zxy)
+                elif z < max_zoom:
+                    skipped = pyramid_size(z, max_zoom) - 1
+                    self.progress.count(dataset.label, "skipped", skipped)
+            level = following
+
+    def warm_tile(self, throttle, cache, dataset, data_var, zxy, query):
+        """Render a tile into the cache
+
+        :returns: True if the tile has data, i.e. worth dividing
+        """
+        label = dataset.label
+        throttle.wait()
+        if self.stop_event.is_set():
+            return False
+        try:
+            key = tile_cache.dataset_key(dataset, data_var, zxy, query)
+            content = cache.get(key)
+            if content is not None:
+                self.progress.count(label, "cached")
+                return has_data(json.loads(content))
+            driver = drivers.from_spec(dataset.driver)
+            obj = driver.data_tile(dataset.driver.settings, data_var, *zxy,
+                                   query=query,
+                                   **overzoom.tile_kwargs(dataset))
+            if isinstance(obj, dict) and "errors" in obj:
+                self.progress.count(label, "rendered")
+                return False
+            cache.set(key, serialize_json(obj))
+        except Exception as e:
+            logger.warning(f"prewarm {label} {data_var} {zxy}: {e}")
+            self.progress.error(label, e)
+            self.progress.count(label, "rendered")
+            return False
+        self.progress.count(label, "rendered")
+        return has_data(obj)
+
+    def start(self):
+        geo.start_numba_threads()
+        self._thread = threading.Thread(target=self.run, daemon=True,
+                                        name="forest_lite_prewarm")
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self.stop_event.set()
+        self.progress.set_state("stopped")
+
+
+_job = None
+_claim = None
+
+
+def claim(directory):
+    """Whether this process warms caches for those sharing directory
+
+    Processes compete for a lock on a file in the directory, the
+    winner holds it until it exits.
+    """
+    global _claim
+    try:
+        import fcntl
+    except ImportError:  # Not POSIX, every process warms
+        return True
+    if _claim is not None:
+        return True
+    stream = open(os.path.join(directory, "prewarm.lock"), "a")
+    try:
+        fcntl.flock(stream, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        stream.close()
+        return False
+    _claim = stream
+    return True
+
+
+def start(get_settings):
+    """Start warming in a background thread if enabled in settings"""
+    global _job
+    if not get_settings().prewarm.enabled:
+        return None
+    cache = shared_cache.get_cache()
+    if cache is not None and not claim(cache.directory):
+        progress.set_state("elsewhere")
+        return None
+    stop()
+    _job = Job(get_settings)
+    _job.start()
+    return _job
+
+
+def stop():
+    global _job
+    if _job is not None:
+        _job.stop()
+        _job = None
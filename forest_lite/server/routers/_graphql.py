@@ -112,7 +112,10 @@ class Query(graphene.ObjectType):
         return schemes
 
 
+app = GraphQLApp(schema=graphene.Schema(query=Query))
+
+
 router = APIRouter()
 
 
-router.add_route("/graphql", GraphQLApp(schema=graphene.Schema(query=Query)))
+router.add_route("/graphql", app)
@@ -1,6 +1,7 @@
-from fastapi import APIRouter, Response, Query
-from forest_lite.server.lib.atlas import load_feature
-from bokeh.core.json_encoder import serialize_json
+from fastapi import APIRouter, HTTPException, Response, Query
+from forest_lite.server.lib.atlas import load_feature, feature_tile
+from forest_lite.server.lib import tracing
+from forest_lite.server.lib.serialize import serialize_json
 import urllib.error
 
 
@@ -44,7 +45,8 @@ async def natural_earth_feature(category: str,
     extent = (minlon, maxlon, minlat, maxlat)
     try:
         obj = load_feature(category, name, scale, extent)
-        content = serialize_json(obj)
+        with tracing.span("serialize"):
+            content = serialize_json(obj)
         response = Response(content=content,
                             media_type="application/json")
         #  response.headers["Cache-Control"] = "max-age=31536000"
@@ -53,3 +55,24 @@ async def natural_earth_feature(category: str,
         return {
             "error": "Could not load natural earth feature"
         }
+
+
+@router.get("/natural_earth_feature/{category}/{name}/tiles/{Z}/{X}/{Y}")
+async def natural_earth_feature_tile(category: str,
+                                     name: str,
+                                     Z: int, X: int, Y: int):
+    """Feature clipped to a tile and simplified to its pixel size
+
+    Scale is chosen by zoom level, e.g. 110m for a world view.
+    """
+    if not (0 <= Z <= 30 and 0 <= X < 2 ** Z and 0 <= Y < 2 ** Z):
+        raise HTTPException(status_code=404,
+                            detail=f"tile {Z}/{X}/{Y} not found")
+    try:
+        obj = feature_tile(category, name, (Z, X, Y))
+    except urllib.error.HTTPError:
+        return {
+            "error": "Could not load natural earth feature"
+        }
+    return Response(content=serialize_json(obj),
+                    media_type="application/json")
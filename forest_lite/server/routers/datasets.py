@@ -1,18 +1,51 @@
+import asyncio
+import collections
 import inspect
-from fastapi import APIRouter, Response, Depends
+import json
+from fastapi import APIRouter, Request, Response, Depends, HTTPException
+from starlette.responses import FileResponse, StreamingResponse
 from forest_lite.server import drivers
-from forest_lite.server.lib import core
-from bokeh.core.json_encoder import serialize_json
+from forest_lite.server.drivers.types import GeoJSON
+from forest_lite.server.lib import (compression, core, metatile, metrics,
+                                    overzoom, pyramid, tile_cache, tracing,
+                                    workers)
 import numpy as np
 from forest_lite.server import config
 from typing import Optional
 import urllib.parse
 from forest_lite.server.config import Settings, get_settings
+from forest_lite.server.lib.serialize import serialize_json
 
 
 router = APIRouter()
 
 
+# Serialized tiles of recently rendered metatiles
+metatiles = workers.SharedResults(maxsize=2)
+
+
+DRIVER_SECONDS = metrics.Histogram(
+    "forest_lite_driver_duration_seconds",
+    "Time spent in driver methods",
+    ["driver", "method"])
+
+
+async def call_driver(dataset, method, *args, **kwargs):
+    """Timed driver method call, blocking work runs in the worker pool
+
+    Async drivers, e.g. proxies to other servers, return a coroutine
+    which is awaited on the event loop.
+    """
+    driver = drivers.from_spec(dataset.driver)
+    fn = getattr(driver, method)
+    labels = {"driver": dataset.driver.name, "method": method}
+    with DRIVER_SECONDS.labels(**labels).time(), tracing.span("driver"):
+        result = await workers.pool.run(fn, *args, **kwargs)
+        if inspect.iscoroutine(result):
+            result = await result
+    return result
+
+
 async def get_datasets(settings: Settings = Depends(get_settings)):
     """Datasets by user"""
     return [dataset for dataset in settings.datasets]
@@ -46,51 +79,367 @@ def links(dataset_id):
     }
 
 
-def by_id(datasets, uid):
-    for dataset in datasets:
-        if dataset.uid == uid:
-            return dataset
+def by_id(settings, uid):
+    """Dataset lookup, HTTP 404 if uid is not configured"""
+    dataset = settings.dataset(uid)
+    if dataset is None:
+        raise HTTPException(status_code=404,
+                            detail=f"dataset {uid} not found")
+    return dataset
 
 
 @router.get("/datasets/{dataset_id}/{data_var}/tiles/{Z}/{X}/{Y}")
-async def data_tiles(dataset_id: int,
+async def data_tiles(request: Request,
+                     dataset_id: int,
                      data_var: str,
                      Z: int, X: int, Y: int,
                      query: Optional[str] = None,
                      settings: config.Settings = Depends(config.get_settings)):
-    """GET data tile from dataset at particular time"""
-    dataset = by_id(settings.datasets, dataset_id)
-    driver = drivers.from_spec(dataset.driver)
-    settings = dataset.driver.settings
+    """GET data tile from dataset at particular time
 
-    # Support async methods
-    obj_or_coroutine = driver.data_tile(settings, data_var, Z, X, Y, query=query)
+    Work stops if the client disconnects, e.g. panned away.
+    """
+    dataset = by_id(settings, dataset_id)
+    response = await workers.until_disconnected(
+        request, tile_response(request, dataset, data_var, Z, X, Y, query,
+                               settings))
+    if response is None:
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+    return response
 
-    if inspect.iscoroutine(obj_or_coroutine):
-        obj = await obj_or_coroutine
-    else:
-        obj = obj_or_coroutine
 
-    content = serialize_json(obj)
+# Status logged when a client goes before its response is ready
+CLIENT_CLOSED_REQUEST = 499
+
+
+async def tile_response(request, dataset, data_var, Z, X, Y, query,
+                        settings):
+    """Data tile response from cache tiers or driver
+
+    A tile deadline counts from the arrival of the request, time
+    spent finding the native zoom and cache key is part of it.
+    """
+    loop = asyncio.get_event_loop()
+    arrived = loop.time()
+    cache = tile_cache.get_cache(settings.tile_cache)
+    encoding = None
+    zoom = await dataset_zoom(dataset, data_var, query)
+    if zoom is not None and Z > zoom:
+        content = await overzoom_tile(cache, dataset, data_var, (Z, X, Y),
+                                      zoom, query)
+    elif cache is None:
+        content, _ = await render_tile(dataset, data_var, Z, X, Y, query)
+    else:
+        accept = request.headers.get("accept-encoding")
+        encoding = compression.negotiate(accept)
+        deadline = settings.tile_cache.deadline_seconds
+        if deadline is None:
+            content, encoding = await cached_tile(
+                cache, dataset, data_var, Z, X, Y, query, encoding=encoding)
+        else:
+            keys = await dataset_keys(dataset, data_var, [(Z, X, Y)],
+                                      query)
+            key = (keys[0], encoding)
+            task = exact_tiles.get(key)
+            owner = task is None
+            if owner:
+                task = asyncio.ensure_future(cached_tile(
+                    cache, dataset, data_var, Z, X, Y, query,
+                    encoding=encoding))
+            try:
+                remaining = max(0., arrived + deadline - loop.time())
+                done, _ = await asyncio.wait({task}, timeout=remaining)
+                if task not in done:
+                    content = await provisional_tile(cache, dataset,
+                                                     data_var, (Z, X, Y),
+                                                     query)
+                    if content is not None and not task.done():
+                        if owner:  # Exact tile for re-requests
+                            exact_tiles[key] = workers.detach(task)
+                            task.add_done_callback(
+                                lambda _: exact_tiles.pop(key, None))
+                        return Response(content=content,
+                                        media_type="application/json",
+                                        headers=PROVISIONAL)
+                content, encoding = await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if owner:
+                    task.cancel()  # Client gone before the tile
+                raise
     response = Response(content=content,
-                        media_type="application/json")
+                        media_type="application/json",
+                        headers=compression.headers(encoding))
     #  response.headers["Cache-Control"] = "max-age=31536000"
     return response
 
 
-@router.get("/datasets/{dataset_id}")
-async def description(dataset_id: int,
-                      settings: config.Settings = Depends(config.get_settings)):
-    dataset = by_id(settings.datasets, dataset_id)
+PROVISIONAL = {"X-Tile-Provisional": "true", "Cache-Control": "no-store"}
+
+# Exact tiles still rendering after a provisional response, shared
+# with re-requests by tile key and encoding
+exact_tiles = {}
+
+
+async def provisional_tile(cache, dataset, data_var, zxy, query):
+    """Serialized tile cut from the nearest ancestor on this host
+
+    Only tiers on this host are searched, None if no ancestor of the
+    tile is cached. Runs outside the worker pool, which is likely
+    busy when the deadline passes.
+    """
+    def lookup():
+        parents = [overzoom.ancestor(zxy, z)
+                   for z in reversed(range(zxy[0]))]
+        keys = tile_cache.dataset_keys(dataset, data_var, parents, query)
+        for parent, key in zip(parents, keys):
+            content = cache.get(key, stop=cache.local)
+            if content is not None:
+                obj = overzoom.decode(json.loads(content))
+                return serialize_json(overzoom.upsample(obj, parent, zxy))
+        return None
+
+    loop = asyncio.get_event_loop()
+    with tracing.span("provisional"):
+        return await loop.run_in_executor(None, lookup)
+
+
+# Native zooms by dataset, variable, query and listed files
+native_zooms = collections.OrderedDict()
+
+
+async def dataset_zoom(dataset, data_var, query):
+    """Native zoom of a dataset, None if every zoom is rendered
+
+    Drivers are asked for their grid spacing in the worker pool once
+    per variable, query and listing of files, listings are cached
+    until a directory changes. Drivers without a grid spacing of
+    their own are not asked.
+    """
+    if dataset.max_zoom is not None:
+        return dataset.max_zoom
     driver = drivers.from_spec(dataset.driver)
+    if not overzoom.knows_spacing(driver):
+        return None
+    paths = driver.sources(dataset.driver.settings, data_var, query=query)
+    key = (dataset.uid, data_var, query, tuple(paths))
+    spec, zoom = native_zooms.get(key, (None, None))
+    if spec is dataset.driver:  # Same settings object, not reloaded
+        native_zooms.move_to_end(key)
+        return zoom
+    zoom = await workers.pool.run(overzoom.dataset_zoom, dataset, data_var,
+                                  query=query)
+    native_zooms[key] = (dataset.driver, zoom)
+    while len(native_zooms) > 256:
+        native_zooms.popitem(last=False)
+    return zoom
+
+
+async def dataset_keys(dataset, data_var, zxys, query):
+    """Cache keys of tiles of a dataset
+
+    Files are listed and stat'ed, e.g. over NFS, in the event loop's
+    executor, off the event loop and not queued behind renders in
+    the worker pool.
+    """
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, tile_cache.dataset_keys,
+                                      dataset, data_var, zxys, query)
 
-    # Support async methods
-    data_or_coroutine = driver.description(dataset.driver.settings)
-    if inspect.iscoroutine(data_or_coroutine):
-        data = await data_or_coroutine
-    else:
-        data = data_or_coroutine
 
+async def render_tile(dataset, data_var, Z, X, Y, query):
+    """Serialized tile from driver and whether it is free of errors"""
+    obj = await call_driver(dataset, "data_tile", dataset.driver.settings,
+                            data_var, Z, X, Y, query=query,
+                            **overzoom.tile_kwargs(dataset))
+    with tracing.span("serialize"):
+        content = serialize_json(obj)
+    return content, not (isinstance(obj, dict) and "errors" in obj)
+
+
+async def overzoom_tile(cache, dataset, data_var, zxy, zoom, query):
+    """Serialized tile upsampled from its ancestor at native zoom
+
+    Ancestors come from the tile cache, if enabled, and are kept
+    decoded while their descendants are requested.
+    """
+    parent = overzoom.ancestor(zxy, zoom)
+    key, = await dataset_keys(dataset, data_var, [parent], query)
+    obj = await overzoom.ancestors.get(
+        key, lambda: ancestor_tile(cache, dataset, data_var, parent, query))
+    if not (isinstance(obj, dict) and "errors" in obj):
+        with tracing.span("upsample"):
+            obj = overzoom.upsample(obj, parent, zxy)
+    with tracing.span("serialize"):
+        return serialize_json(obj)
+
+
+async def ancestor_tile(cache, dataset, data_var, zxy, query):
+    """Tile at native zoom from cache tiers or driver"""
+    if cache is None:
+        return await call_driver(dataset, "data_tile",
+                                 dataset.driver.settings, data_var, *zxy,
+                                 query=query, **overzoom.tile_kwargs(dataset))
+    content, _ = await cached_tile(cache, dataset, data_var, *zxy, query)
+    with tracing.span("decode"):
+        return overzoom.decode(json.loads(content))
+
+
+async def cached_tile(cache, dataset, data_var, Z, X, Y, query,
+                      encoding=None):
+    """Serialized tile from cache tiers or driver and its encoding
+
+    Keys include the identity of the dataset's files, memory hits
+    are served without waiting for a worker. Slower tiers are read
+    in the worker pool. A compressed copy in the requested encoding
+    is written in the background next to each tile, so later hits
+    cost no compression. Rendered tiles are stored in memory
+    straight away and written to slower tiers in the background.
+    Tiles reporting errors are not cached.
+    """
+    def lookup(key, start=0, stop=None):
+        """Copy in the requested encoding else the tile, None if missing"""
+        if encoding is not None:
+            content = cache.get(f"{key}.{encoding}", start, stop)
+            if content is not None:
+                return content, encoding
+        return cache.get(key, start, stop), None
+
+    with tracing.span("cache"):
+        key, = await dataset_keys(dataset, data_var, [(Z, X, Y)], query)
+        content, used = lookup(key, stop=1)
+        if content is None and len(cache.tiers) > 1:
+            content, used = await workers.pool.run(lookup, key, start=1)
+    if content is not None:
+        if used != encoding and compressible(content, encoding):
+            workers.pool.spawn(encode, cache, key, content, encoding)
+        return content, used
+    if dataset.reduction is not None:
+        zoom = await dataset_zoom(dataset, data_var, query)
+        if zoom is None or Z < zoom:  # Deeper tiles are never stored
+            content = await reduced_tile(cache, dataset, data_var,
+                                         (Z, X, Y), query)
+        if content is not None:
+            store(cache, key, content)
+    if content is None and dataset.metatile > 1:
+        content = await metatile_tile(cache, dataset, data_var, (Z, X, Y),
+                                      query)
+    if content is None:
+        content, ok = await render_tile(dataset, data_var, Z, X, Y, query)
+        if not ok:
+            return content, None
+        store(cache, key, content)
+    if compressible(content, encoding):
+        workers.pool.spawn(encode, cache, key, content, encoding)
+    return content, None
+
+
+async def reduced_tile(cache, dataset, data_var, zxy, query):
+    """Serialized tile reduced from its four cached children
+
+    Only tiers on this host are searched, a miss does not wait for a
+    remote tier before rendering. None if a child is not cached, the
+    caller renders from source.
+    """
+    def lookup():
+        contents = []
+        keys = tile_cache.dataset_keys(dataset, data_var,
+                                       pyramid.children(zxy), query)
+        for key in keys:
+            content = cache.get(key, stop=cache.local)
+            if content is None:
+                return None
+            contents.append(content)
+        return contents
+
+    def reduce(contents):
+        tiles = [overzoom.decode(json.loads(content))
+                 for content in contents]
+        obj = pyramid.reduce(tiles, zxy, method=dataset.reduction)
+        if obj is None:
+            return None
+        return serialize_json(obj)
+
+    with tracing.span("cache"):
+        contents = await workers.pool.run(lookup)
+    if contents is None:
+        return None
+    with tracing.span("reduce"):
+        return await workers.pool.run(reduce, contents)
+
+
+async def metatile_tile(cache, dataset, data_var, zxy, query):
+    """Serialized tile of a metatile, every tile of which is stored
+
+    Requests for tiles of the same metatile wait for one render.
+    None near zoom 0, if the driver has no ``tile_size`` keyword or
+    if the metatile reports errors, the caller renders the tile alone.
+    """
+    meta, n, tiles = metatile.block(zxy, dataset.metatile)
+    if n == 1:
+        return None
+    driver = drivers.from_spec(dataset.driver)
+    if not accepts_keyword(driver.data_tile, "tile_size"):
+        return None
+    keys = await dataset_keys(dataset, data_var, tiles, query)
+
+    def split(obj):
+        contents = {}
+        for tile, key in zip(tiles, keys):
+            content = serialize_json(metatile.split(obj, n, tile))
+            store(cache, key, content)
+            contents[tile] = content
+        return contents
+
+    async def render():
+        obj = await call_driver(dataset, "data_tile",
+                                dataset.driver.settings, data_var, *meta,
+                                query=query, tile_size=n * dataset.tile_size)
+        if isinstance(obj, dict) and "errors" in obj:
+            return obj
+        with tracing.span("split"):
+            return await workers.pool.run(split, obj)
+
+    contents = await metatiles.get(f"{keys[0]}.{n}", render)
+    if "errors" in contents:
+        return None
+    return contents[zxy]
+
+
+def accepts_keyword(fn, name):
+    """Whether fn can be called with keyword argument name"""
+    try:
+        parameters = inspect.signature(fn).parameters.values()
+    except (TypeError, ValueError):
+        return False  # Builtins and extensions without a signature
+    return any(parameter.name == name or
+               parameter.kind == inspect.Parameter.VAR_KEYWORD
+               for parameter in parameters)
+
+
+def compressible(content, encoding):
+    """Whether a compressed copy of a tile is worth storing"""
+    return encoding is not None and len(content) >= compression.MINIMUM_SIZE
+
+
+def encode(cache, key, content, encoding):
+    """Compress and store a copy of a tile"""
+    level = compression.STORED_LEVELS[encoding]
+    store(cache, f"{key}.{encoding}",
+          compression.compress(content, encoding, level))
+
+
+def store(cache, key, content):
+    """Memory tier now, slower tiers in the background"""
+    cache.set(key, content, stop=1)
+    if len(cache.tiers) > 1:
+        workers.pool.spawn(cache.set, key, content, start=1)
+
+
+@router.get("/datasets/{dataset_id}")
+async def description(dataset_id: int,
+                      settings: config.Settings = Depends(config.get_settings)):
+    dataset = by_id(settings, dataset_id)
+    data = await call_driver(dataset, "description", dataset.driver.settings)
     if not isinstance(data, dict):
         data = data.dict()
     data["dataset_id"] = dataset_id
@@ -134,27 +483,67 @@ def tile_link(dataset_id, data_var):
 
 
 @router.get("/datasets/{dataset_id}/times/{timestamp_ms}/geojson")
-async def geojson(dataset_id: int,
+async def geojson(request: Request,
+                  dataset_id: int,
                   timestamp_ms: int,
+                  bbox: Optional[str] = None,
+                  zoom: Optional[int] = None,
                   settings: config.Settings = Depends(config.get_settings)):
-    dataset = by_id(settings.datasets, dataset_id)
-    driver = drivers.from_spec(dataset.driver)
-    content = driver.get_geojson(timestamp_ms)
+    """Features at a time, bbox=west,south,east,north limits the view"""
+    dataset = by_id(settings, dataset_id)
+    # Only filters in use, drivers may predate bbox and zoom keywords
+    kwargs = {"bbox": parse_bbox(bbox), "zoom": zoom}
+    kwargs = {key: value for key, value in kwargs.items()
+              if value is not None}
+    content = await call_driver(dataset, "get_geojson",
+                                dataset.driver.settings, timestamp_ms,
+                                **kwargs)
+    if isinstance(content, GeoJSON):
+        return geojson_response(content, request)
     response = Response(content=content,
                         media_type="application/json")
     #  response.headers["Cache-Control"] = "max-age=31536000"
     return response
 
 
+def parse_bbox(text):
+    """(west, south, east, north) from comma separated degrees"""
+    if text is None:
+        return None
+    try:
+        bbox = tuple(float(value) for value in text.split(","))
+    except ValueError:
+        bbox = ()
+    if len(bbox) != 4:
+        raise HTTPException(status_code=422,
+                            detail="bbox must be west,south,east,north")
+    return bbox
+
+
+def geojson_response(content, request):
+    """Pre-compressed body if accepted, otherwise streamed"""
+    media_type = "application/json"
+    accept = request.headers.get("accept-encoding")
+    if (content.gzip is not None and
+            compression.negotiate(accept, ("gzip",)) == "gzip"):
+        return Response(content=content.gzip, media_type=media_type,
+                        headers={"Content-Encoding": "gzip",
+                                 "Vary": "Accept-Encoding"})
+    if content.path is not None:
+        return FileResponse(content.path, media_type=media_type)
+    return StreamingResponse(iter(content.chunks), media_type=media_type)
+
+
 @router.get("/datasets/{dataset_id}/times/{timestamp_ms}/points")
 async def points(dataset_id: int, timestamp_ms: int,
                  settings: config.Settings = Depends(config.get_settings)):
     time = np.datetime64(timestamp_ms, 'ms')
-    dataset = by_id(settings.datasets, dataset_id)
+    dataset = by_id(settings, dataset_id)
     dataset_name = dataset.label
     path = core.get_path(settings, dataset_name)
     obj = core.get_points(path, time)
-    content = serialize_json(obj)
+    with tracing.span("serialize"):
+        content = serialize_json(obj)
     response = Response(content=content,
                         media_type="application/json")
     #  response.headers["Cache-Control"] = "max-age=31536000"
@@ -168,7 +557,7 @@ async def palette(dataset_id: int,
 
     :returns: dataset.palettes
     """
-    dataset = by_id(settings.datasets, dataset_id)
+    dataset = by_id(settings, dataset_id)
     return dataset.palettes
 
 
@@ -179,18 +568,12 @@ async def axis(dataset_id: int,
                query: Optional[str] = None,
                settings: config.Settings = Depends(config.get_settings)):
     """GET dimension values related to particular data_var"""
-    dataset = by_id(settings.datasets, dataset_id)
-    driver = drivers.from_spec(dataset.driver)
+    dataset = by_id(settings, dataset_id)
     settings = dataset.driver.settings
-
-    # Support async methods
-    obj_or_coroutine = driver.points(settings, data_var, dim_name, query=query)
-    if inspect.iscoroutine(obj_or_coroutine):
-        obj = await obj_or_coroutine
-    else:
-        obj = obj_or_coroutine
-
-    content = serialize_json(obj)
+    obj = await call_driver(dataset, "points",
+                            settings, data_var, dim_name, query=query)
+    with tracing.span("serialize"):
+        content = serialize_json(obj)
     response = Response(content=content,
                         media_type="application/json")
     #  response.headers["Cache-Control"] = "max-age=31536000"
@@ -0,0 +1,21 @@
+"""Instance health for load balancers"""
+from fastapi import APIRouter, Response
+from forest_lite.server import prewarm, warmup
+
+
+router = APIRouter()
+
+
+@router.get("/ready")
+async def ready(response: Response):
+    """Readiness probe, HTTP 503 until warm-up has finished"""
+    progress = warmup.progress.dict()
+    if not progress["ready"]:
+        response.status_code = 503
+    return progress
+
+
+@router.get("/prewarm")
+async def prewarm_progress():
+    """Progress of warming caches for new runs"""
+    return prewarm.progress.dict()
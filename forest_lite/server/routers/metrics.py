@@ -0,0 +1,13 @@
+"""Prometheus metrics for monitoring and capacity planning"""
+from fastapi import APIRouter, Response
+from forest_lite.server.lib import metrics
+
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """Counters, gauges and histograms in text exposition format"""
+    return Response(content=metrics.render(),
+                    media_type="text/plain; version=0.0.4")
@@ -0,0 +1,134 @@
+"""On-demand profiling of a live server
+
+Disabled unless ``profiling.enabled`` and ``profiling.token`` are set
+in the config file. The token is passed as ``?token=`` or an
+``Authorization: Bearer`` header.
+
+GET /profile?seconds=10
+    Sample every thread for a time window
+
+GET /profile/request?path=/datasets/0/air_temperature/tiles/3/2/5
+    Serve one request in-process and sample only the threads
+    working on it
+
+Both respond with collapsed stacks for flamegraph.pl or speedscope.
+"""
+import asyncio
+import hmac
+import threading
+from typing import Optional
+from fastapi import (APIRouter, Depends, Header, HTTPException, Request,
+                     Response)
+from forest_lite.server import config
+from forest_lite.server.lib import profiler
+
+
+router = APIRouter()
+
+_busy = threading.Lock()
+
+
+def authorize(settings, token, authorization):
+    """HTTP 404 if profiling is disabled, 403 if token does not match"""
+    profiling = settings.profiling
+    if not profiling.enabled or not profiling.token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if token is None and authorization is not None:
+        scheme, _, credentials = authorization.partition(" ")
+        if scheme.lower() == "bearer":
+            token = credentials
+    if token is None or not hmac.compare_digest(token.encode(),
+                                                profiling.token.encode()):
+        raise HTTPException(status_code=403,
+                            detail="invalid profiling token")
+
+
+def collapsed_response(sampler, headers=None):
+    headers = dict(headers or {})
+    headers["X-Profile-Samples"] = str(sampler.samples)
+    return Response(content=sampler.collapsed(),
+                    media_type="text/plain",
+                    headers=headers)
+
+
+def acquire():
+    """One profile at a time, sampling is not free"""
+    if not _busy.acquire(blocking=False):
+        raise HTTPException(status_code=409,
+                            detail="profile already in progress")
+
+
+@router.get("/profile")
+async def profile_window(seconds: float = 5,
+                         token: Optional[str] = None,
+                         authorization: Optional[str] = Header(None),
+                         settings: config.Settings = Depends(
+                             config.get_settings)):
+    """Sample all threads for a number of seconds"""
+    authorize(settings, token, authorization)
+    seconds = max(0, min(seconds, settings.profiling.max_seconds))
+    acquire()
+    try:
+        interval = settings.profiling.interval
+        with profiler.Sampler(interval=interval) as sampler:
+            await asyncio.sleep(seconds)
+    finally:
+        _busy.release()
+    return collapsed_response(sampler)
+
+
+@router.get("/profile/request")
+async def profile_request(request: Request,
+                          path: str,
+                          token: Optional[str] = None,
+                          authorization: Optional[str] = Header(None),
+                          settings: config.Settings = Depends(
+                              config.get_settings)):
+    """Serve GET path in-process while sampling its threads"""
+    authorize(settings, token, authorization)
+    if not path.startswith("/") or path.startswith("/profile"):
+        raise HTTPException(status_code=422,
+                            detail=f"can not profile path: '{path}'")
+    path, _, query_string = path.partition("?")
+    acquire()
+    try:
+        interval = settings.profiling.interval
+        with profiler.request_profile(interval) as sampler:
+            status = await call(request.app, request.scope,
+                                path, query_string)
+    finally:
+        _busy.release()
+    return collapsed_response(sampler, {"X-Profiled-Status": str(status)})
+
+
+async def call(app, scope, path, query_string):
+    """Send a GET request straight to the ASGI application
+
+    :returns: HTTP status code, the body is discarded
+    """
+    inner = {
+        "type": "http",
+        "asgi": scope.get("asgi", {"version": "3.0"}),
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": scope.get("scheme", "http"),
+        "server": scope.get("server"),
+        "client": scope.get("client"),
+        "root_path": scope.get("root_path", ""),
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query_string.encode(),
+        "headers": [],
+    }
+    status = None
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(inner, receive, send)
+    return status
@@ -0,0 +1,80 @@
+"""Start up time profiling
+
+Records how long each import and initialisation step takes while
+the server starts so slow steps can be spotted, e.g. a driver that
+pulls in a heavy dependency at import time.
+
+>>> profile = Profile()
+>>> with profile.measure("import uvicorn"):
+...     import uvicorn
+>>> print(profile.report())
+
+"""
+import sys
+import time
+from contextlib import contextmanager
+from importlib import import_module
+
+
+# Imported one at a time so each module's own cost is visible
+SERVER_MODULES = [
+    "fastapi",
+    "forest_lite.server.lib.config",
+    "forest_lite.server.config",
+    "forest_lite.server.drivers",
+    "forest_lite.server.routers.api",
+    "forest_lite.server.routers.atlas",
+    "forest_lite.server.routers.datasets",
+    "forest_lite.server.routers.health",
+    "forest_lite.server.routers.metrics",
+    "forest_lite.server.routers.palettes",
+    "forest_lite.server.routers.profile",
+    "forest_lite.server.routers.viewport",
+    "forest_lite.server.main",
+]
+
+
+# Dependencies that should only load when a feature needs them
+HEAVY_MODULES = [
+    "bokeh",
+    "cartopy",
+    "datashader",
+    "graphene",
+    "iris",
+    "numba",
+    "pygrib",
+    "xarray",
+]
+
+
+class Profile:
+    """Ordered collection of (label, seconds) records"""
+    def __init__(self):
+        self.records = []
+
+    @contextmanager
+    def measure(self, label):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.records.append((label, time.perf_counter() - start))
+
+    def import_modules(self, names):
+        for name in names:
+            with self.measure(f"import {name}"):
+                import_module(name)
+
+    def total(self):
+        return sum(seconds for _, seconds in self.records)
+
+    def report(self):
+        """Human readable table, slowest steps are easy to spot"""
+        width = max([len(label) for label, _ in self.records] + [5])
+        lines = [f"{label:<{width}}  {seconds * 1000:8.1f} ms"
+                 for label, seconds in self.records]
+        lines.append(f"{'total':<{width}}  {self.total() * 1000:8.1f} ms")
+        loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+        if len(loaded) > 0:
+            lines.append(f"heavy modules loaded: {', '.join(loaded)}")
+        return "\n".join(lines)
@@ -0,0 +1,69 @@
+"""Static assets with hashed names and pre-compressed copies
+
+See :mod:`forest_lite.server.lib.assets` for the build step.
+"""
+import mimetypes
+import os
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from forest_lite.server.lib import assets, compression
+
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+class StaticAssets(StaticFiles):
+    """StaticFiles serving hashed names and pre-compressed copies
+
+    ``name.{digest}.ext`` is served with a long lived immutable
+    ``Cache-Control`` if the digest matches the current file, plain
+    names must be revalidated. A digest of another build, e.g. from a
+    page rendered by a node already updated in a rolling deploy, gets
+    the current file to be revalidated rather than a 404. Clients accepting an encoding get the
+    matching copy written at build time rather than compressing on
+    each request.
+    """
+    def url(self, path):
+        """Hashed name of an asset relative to the mount point"""
+        return assets.hashed_name(self.directory, path)
+
+    async def get_response(self, path, scope):
+        path, digest = assets.split_hashed(path)
+        if digest is not None:
+            full_path = os.path.join(self.directory, path)
+            try:
+                current = assets.content_hash(full_path)
+            except (FileNotFoundError, NotADirectoryError):
+                current = None
+            if current != digest:  # Page from another build
+                digest = None
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            response.headers["Cache-Control"] = (
+                IMMUTABLE if digest is not None else REVALIDATE)
+        return response
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        request_headers = Headers(scope=scope)
+        encodings = [encoding for encoding in compression.available()
+                     if assets.variant(full_path, encoding) is not None]
+        encoding = compression.negotiate(
+            request_headers.get("accept-encoding"), encodings)
+        if encoding is None:
+            response = super().file_response(full_path, stat_result, scope,
+                                             status_code=status_code)
+            if len(encodings) > 0:
+                response.headers["Vary"] = "Accept-Encoding"
+            return response
+        variant_path, variant_stat = assets.variant(full_path, encoding)
+        media_type, _ = mimetypes.guess_type(str(full_path))
+        response = FileResponse(variant_path, status_code=status_code,
+                                stat_result=variant_stat,
+                                method=scope["method"],
+                                media_type=media_type or "text/plain",
+                                headers=compression.headers(encoding))
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -1,10 +1,30 @@
 import os
-import glob
 import string
 
 
 
 def get_file_names(pattern):
     """Search disk for files"""
+    from forest_lite.server.lib import sources
     wildcard = string.Template(pattern).substitute(**os.environ)
-    return sorted(glob.glob(wildcard))
+    return list(sources.list_files(wildcard))
+
+
+class LazyApp:
+    """ASGI application imported on its first request
+
+    Keeps modules with heavy dependencies, e.g. graphene, out of
+    server start up.
+
+    :param import_path: "package.module:attribute" string
+    """
+    def __init__(self, import_path):
+        self.import_path = import_path
+        self.app = None
+
+    async def __call__(self, scope, receive, send):
+        if self.app is None:
+            from importlib import import_module
+            mod_name, attr = self.import_path.split(":")
+            self.app = getattr(import_module(mod_name), attr)
+        await self.app(scope, receive, send)
@@ -0,0 +1,148 @@
+"""Warm up JIT compiled kernels and driver caches at start up
+
+The first tile after a restart pays for numba compilation inside
+datashader's quadmesh, several seconds per code path. An optional
+warm-up stage renders tiny tiles to trigger compilation and asks
+each configured dataset for its description and axes so file
+meta-data caches are full before real traffic arrives.
+
+Progress is reported by the /ready endpoint so load balancers
+only route to warm instances.
+"""
+import logging
+import threading
+from functools import partial
+import numpy as np
+from forest_lite.server import drivers
+from forest_lite.server.lib import core, geo
+
+
+logger = logging.getLogger(__name__)
+
+
+class Progress:
+    """Thread-safe record of warm-up steps"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.state = "disabled"
+        self.steps = []
+        self.completed = 0
+        self.errors = []
+
+    def start(self, steps):
+        with self._lock:
+            self.state = "running"
+            self.steps = list(steps)
+            self.completed = 0
+            self.errors = []
+
+    def step_done(self, error=None):
+        with self._lock:
+            if error is not None:
+                self.errors.append(f"{self.steps[self.completed]}: {error}")
+            self.completed += 1
+            if self.completed == len(self.steps):
+                self.state = "ready"
+
+    @property
+    def ready(self):
+        return self.state in ("disabled", "ready")
+
+    def dict(self):
+        with self._lock:
+            current = None
+            if self.completed < len(self.steps):
+                current = self.steps[self.completed]
+            return {
+                "ready": self.ready,
+                "state": self.state,
+                "completed": self.completed,
+                "total": len(self.steps),
+                "current": current,
+                "errors": list(self.errors)
+            }
+
+
+progress = Progress()
+
+
+def warm_kernels():
+    """Compile datashader quadmesh for 1D and 2D coordinates
+
+    Grids coarser and finer than a tile exercise both the up- and
+    down-sampling kernels.
+    """
+    for shape in [(3, 4), (2 * core.TILE_SIZE, 2 * core.TILE_SIZE)]:
+        lons = np.linspace(-10, 10, shape[1])
+        lats = np.linspace(-10, 10, shape[0])
+        lons_2d, lats_2d = np.meshgrid(lons, lats)
+        for longitude, latitude in [(lons, lats), (lons_2d, lats_2d)]:
+            for dtype in ["f", "d"]:
+                core._tile({
+                    "longitude": longitude,
+                    "latitude": latitude,
+                    "values": np.zeros(shape, dtype=dtype),
+                    "units": ""
+                }, 0, 0, 0)
+
+
+def warm_dataset(dataset):
+    """Populate driver caches of file meta-data and coordinates"""
+    driver = drivers.from_spec(dataset.driver)
+    settings = dataset.driver.settings
+    description = driver.description(settings)
+    if not_local(description):
+        return
+    if not isinstance(description, dict):
+        description = description.dict()
+    for data_var, desc in description.get("data_vars", {}).items():
+        for dim_name in desc.get("dims", []):
+            not_local(driver.points(settings, data_var, dim_name))
+
+
+def not_local(obj):
+    """Async drivers proxy other servers, nothing to warm locally"""
+    if hasattr(obj, "__await__"):
+        obj.close()
+        return True
+    return False
+
+
+def steps(settings):
+    """Labelled warm-up tasks"""
+    yield "kernels", warm_kernels
+    if settings.warm_up.datasets:
+        for dataset in settings.datasets:
+            if dataset.driver.name == "":
+                continue
+            yield f"dataset {dataset.label}", partial(warm_dataset, dataset)
+
+
+def run(settings, progress=progress):
+    tasks = list(steps(settings))
+    progress.start([label for label, _ in tasks])
+    execute(tasks, progress)
+
+
+def execute(tasks, progress):
+    for label, task in tasks:
+        try:
+            task()
+        except Exception as e:
+            logger.exception(f"warm-up step '{label}' failed")
+            progress.step_done(error=e)
+        else:
+            progress.step_done()
+
+
+def start(settings, progress=progress):
+    """Run warm-up in a background thread if enabled in settings"""
+    if not settings.warm_up.enabled:
+        return None
+    tasks = list(steps(settings))
+    progress.start([label for label, _ in tasks])
+    geo.start_numba_threads()
+    thread = threading.Thread(target=execute, args=(tasks, progress),
+                              daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from forest_lite.benchmarks import suite, synthetic
+
+
+def result(seconds):
+    return {"best_s": seconds, "median_s": seconds, "number": 1, "repeat": 1}
+
+
+def test_compare():
+    baseline = {"results": {"a": result(1.), "b": result(1.),
+                            "c": result(1.), "d": result(1.)}}
+    current = {"results": {"a": result(1.5), "b": result(0.5),
+                           "c": result(1.05), "e": result(1.)}}
+    rows = suite.compare(baseline, current, threshold=0.1)
+    assert [(row["name"], row["status"]) for row in rows] == [
+        ("a", "regression"),
+        ("b", "improvement"),
+        ("c", "ok"),
+        ("d", "missing"),
+        ("e", "new"),
+    ]
+    assert rows[0]["ratio"] == pytest.approx(1.5)
+
+
+@pytest.mark.parametrize("size,expect", [
+    ("small", (180, 360)),
+    ("30x40", (30, 40)),
+])
+def test_shape(size, expect):
+    assert synthetic.shape(size) == expect
+
+
+@pytest.mark.parametrize("grid", sorted(synthetic.GRIDS))
+def test_netcdf_round_trip(tmpdir, grid):
+    lons, lats, values = synthetic.GRIDS[grid]((6, 8))
+    path = synthetic.write_netcdf(str(tmpdir / f"{grid}.nc"),
+                                  lons, lats, values)
+    tilable = synthetic.read_netcdf(path)
+    assert tilable["values"].shape == (6, 8)
+    assert tilable["values"].dtype == np.float32
+    np.testing.assert_array_equal(tilable["longitude"], lons)
+    assert tilable["units"] == "K"
+
+
+def test_tile_containing():
+    assert suite.tile_containing(0, 0, 0) == (0, 0, 0)
+    assert suite.tile_containing(-179, -80, 2) == (2, 0, 0)
+    assert suite.tile_containing(179, 80, 2) == (2, 3, 3)
+
+
+def test_measure():
+    timings = suite.measure(lambda: None, repeat=2, min_seconds=0.)
+    assert set(timings) == {"best_s", "median_s", "number", "repeat"}
+    assert timings["best_s"] <= timings["median_s"]
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import pytest
+from forest_lite.benchmarks import replay
+from forest_lite.server import main, config
+from forest_lite.server.drivers.base import BaseDriver
+
+
+driver = BaseDriver()
+
+
+@driver.override("description")
+def description(settings):
+    return {"data_vars": {"air": {"dims": ["time", "latitude",
+                                           "longitude"]}}}
+
+
+@driver.override("points")
+def points(settings, data_var, dim_name, query=None):
+    return {"data": [0, 3600000, 7200000], "attrs": {}}
+
+
+@driver.override("data_tile")
+def data_tile(settings, data_var, z, x, y, query=None):
+    return {"data": {"tile_key": [[x, y, z]]}}
+
+
+@pytest.fixture
+def settings():
+    settings = config.Settings(datasets=[{
+        "label": "Replay",
+        "driver": {
+            "name": "forest_lite.test.test_benchmarks_replay:driver",
+            "settings": {}
+        }
+    }])
+    main.app.dependency_overrides[config.get_settings] = lambda: settings
+    yield settings
+    del main.app.dependency_overrides[config.get_settings]
+
+
+def test_viewport_tiles():
+    assert replay.viewport_tiles((128, 128), 0) == [(0, 0, 0)]
+    tiles = replay.viewport_tiles((128, 128), 3, viewport=(512, 512))
+    assert tiles == [(3, i, j) for i in (3, 4, 5) for j in (3, 4, 5)]
+
+
+def test_viewport_tiles_at_edge():
+    tiles = replay.viewport_tiles((0, 0), 2, viewport=(256, 256))
+    assert tiles == [(2, 0, 0)]
+
+
+@pytest.mark.parametrize("url,kind", [
+    ("/datasets", "datasets"),
+    ("/datasets/0", "description"),
+    ("/datasets/0/air/axis/time", "axis"),
+    ("/datasets/0/air/tiles/1/0/1?query=%7B%7D", "tile"),
+    ("/", "index"),
+])
+def test_request_kind(url, kind):
+    assert replay.request_kind(url) == kind
+
+
+def test_synthetic_session():
+    layer = replay.Layer(0, "air", {"time": [0, 1, 2]})
+    session = replay.synthetic_session(layer, steps=5, seed=1)
+    assert len(session) == 6
+    assert "/datasets/0/air/axis/time" in session[0]
+    for step in session[1:]:
+        assert all(replay.request_kind(url) == "tile" for url in step)
+
+
+def test_recorded_sessions(tmpdir):
+    path = str(tmpdir / "server.log")
+    record = {"method": "GET", "path": "/datasets/0",
+              "query_string": "a=1", "status": 200}
+    with open(path, "w") as stream:
+        stream.write("WARNING slow request: " + json.dumps(record) + "\n")
+        stream.write("unrelated line\n")
+    assert replay.recorded_sessions(path) == [[["/datasets/0?a=1"]]]
+
+
+def test_cache_ratios():
+    before = replay.cache_counts('forest_lite_cache_hits_total{cache="a"} 1\n'
+                                 'forest_lite_cache_misses_total{cache="a"} 1')
+    after = replay.cache_counts('forest_lite_cache_hits_total{cache="a"} 4\n'
+                                'forest_lite_cache_misses_total{cache="a"} 2')
+    assert replay.cache_ratios(before, after) == {"a": 0.75}
+
+
+def test_run_in_process(settings):
+    client = replay.InProcess(main.app)
+    summary = asyncio.run(replay.run(client, n_sessions=3, steps=4,
+                                     concurrency=2))
+    assert summary["total"]["errors"] == 0
+    assert summary["kinds"]["tile"]["requests"] > 0
+    assert summary["kinds"]["axis"]["requests"] == 3
+    assert "tile" in replay.report(summary)
@@ -63,3 +63,10 @@ def test_config_named_palette_reversed():
                           reverse=reverse).palette().colors
     expect = list(bokeh.palettes.all_palettes[name][number])[::-1]
     assert result == expect
+
+
+def test_config_dataset_by_uid():
+    config = Config(datasets=[{"label": "A"}, {"label": "B", "uid": 7}])
+    assert config.dataset(7).label == "B"
+    assert config.dataset(0).label == "A"
+    assert config.dataset(1) is None
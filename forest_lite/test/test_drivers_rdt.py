@@ -1,5 +1,8 @@
+import json
 import pytest
 import datetime as dt
+from fastapi.testclient import TestClient
+from forest_lite.server import config, main
 from forest_lite.server.drivers import rdt
 
 
@@ -9,3 +12,108 @@ def test_get_times():
     result = rdt.get_times(limit)
     expect = [dt.datetime(2020, 9, 4, 15, 0)]
     assert result == expect
+
+
+def polygon(x, y, size):
+    ring = [[x, y], [x + size, y], [x + size, y + size], [x, y]]
+    return {"type": "Feature",
+            "properties": {"x": x},
+            "geometry": {"type": "Polygon", "coordinates": [ring]}}
+
+
+COLLECTION = {
+    "type": "FeatureCollection",
+    "features": [polygon(0, 0, 1), polygon(10, 10, 0.01),
+                 polygon(-20, 5, 2)]
+}
+
+
+@pytest.fixture
+def directory(tmpdir):
+    path = rdt.get_path(dt.datetime(2020, 9, 4, 15, 0), str(tmpdir))
+    with open(path, "w") as stream:
+        json.dump(COLLECTION, stream)
+    return str(tmpdir)
+
+
+@pytest.fixture
+def collection():
+    return rdt.FeatureCollection(json.dumps(COLLECTION).encode())
+
+
+def test_select_bbox(collection):
+    assert list(collection.select(bbox=(-1, -1, 11, 11))) == [0, 1]
+
+
+def test_select_zoom_skips_small_cells(collection):
+    assert list(collection.select(zoom=4)) == [0, 2]
+
+
+def test_chunks_valid_json(collection, monkeypatch):
+    monkeypatch.setattr(rdt, "CHUNK_SIZE", 10)
+    chunks = list(collection.chunks([0, 2]))
+    actual = json.loads(b"".join(chunks))
+    assert len(chunks) > 1
+    assert actual == dict(COLLECTION, features=[COLLECTION["features"][0],
+                                                COLLECTION["features"][2]])
+
+
+def test_chunks_no_features(collection):
+    actual = json.loads(b"".join(collection.chunks([])))
+    assert actual == {"type": "FeatureCollection", "features": []}
+
+
+def test_load_parses_once(directory):
+    path = rdt.get_path(dt.datetime(2020, 9, 4, 15, 0), directory)
+    assert rdt.load(path) is rdt.load(path)
+
+
+def test_get_times_relists_changed_directory(directory):
+    assert rdt.get_times(1, directory) == [dt.datetime(2020, 9, 4, 15, 0)]
+    path = rdt.get_path(dt.datetime(2020, 9, 4, 15, 15), directory)
+    with open(path, "w") as stream:
+        json.dump(COLLECTION, stream)
+    assert rdt.get_times(1, directory) == [dt.datetime(2020, 9, 4, 15, 15)]
+
+
+@pytest.fixture
+def client(directory):
+    settings = config.Settings(datasets=[{
+        "label": "RDT",
+        "driver": {"name": "rdt", "settings": {"directory": directory}}
+    }])
+    main.app.dependency_overrides[config.get_settings] = lambda: settings
+    yield TestClient(main.app)
+    del main.app.dependency_overrides[config.get_settings]
+
+
+URL = "/datasets/0/times/1599231600000/geojson"
+
+
+def test_geojson_precompressed(client):
+    response = client.get(URL, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json() == COLLECTION
+
+
+def test_geojson_without_gzip_streams_file(client):
+    response = client.get(URL, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.json() == COLLECTION
+
+
+def test_geojson_gzip_refused(client):
+    response = client.get(URL, headers={"Accept-Encoding": "gzip;q=0"})
+    assert "content-encoding" not in response.headers
+    assert response.json() == COLLECTION
+
+
+def test_geojson_bbox(client):
+    response = client.get(URL, params={"bbox": "-25,0,0.5,10"})
+    features = response.json()["features"]
+    assert [feature["properties"]["x"] for feature in features] == [0, -20]
+
+
+def test_geojson_invalid_bbox(client):
+    response = client.get(URL, params={"bbox": "1,2,3"})
+    assert response.status_code == 422
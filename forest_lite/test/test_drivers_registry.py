@@ -0,0 +1,51 @@
+import pytest
+from unittest.mock import sentinel, Mock
+from forest_lite.server import drivers
+from forest_lite.server.drivers import (
+    Registry,
+    DriverError,
+    DriverNotFound,
+    BaseDriver,
+    find_driver)
+from forest_lite.server.lib.config import Config
+
+
+driver = BaseDriver()  # Used by import string test
+
+
+def test_find_driver_given_import_string():
+    assert find_driver(f"{__name__}:driver") is driver
+
+
+def test_find_driver_given_unknown_name_raises_driver_not_found():
+    with pytest.raises(DriverNotFound):
+        find_driver("not_a_driver")
+
+
+def test_find_driver_given_entry_point(monkeypatch):
+    entry_point = Mock()
+    entry_point.load.return_value = sentinel.driver
+    monkeypatch.setattr(drivers, "driver_entry_points",
+                        lambda: {"third_party": entry_point})
+    assert find_driver("third_party") is sentinel.driver
+
+
+def test_registry_resolves_name_once(monkeypatch):
+    find = Mock(return_value=sentinel.driver)
+    monkeypatch.setattr(drivers, "find_driver", find)
+    registry = Registry()
+    assert registry.get("name") is sentinel.driver
+    assert registry.get("name") is sentinel.driver
+    find.assert_called_once_with("name")
+
+
+def test_registry_load_reports_every_misconfigured_dataset():
+    settings = Config(datasets=[
+        {"label": "A", "driver": {"name": "not_a_driver"}},
+        {"label": "B", "driver": {"name": "xarray_h5netcdf"}},
+        {"label": "C", "driver": {"name": "also_not_a_driver"}},
+        {"label": "D"},
+    ])
+    with pytest.raises(DriverError) as excinfo:
+        Registry().load(settings)
+    assert list(excinfo.value.errors.keys()) == ["A", "C"]
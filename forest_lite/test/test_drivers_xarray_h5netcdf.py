@@ -1,4 +1,4 @@
-from forest_lite.test.helpers import sample_h5netcdf_dim0
+from forest_lite.test.helpers import sample_h5netcdf, sample_h5netcdf_dim0
 from forest_lite.server.drivers import xarray_h5netcdf
 import pytest
 
@@ -16,3 +16,10 @@ def test_dim0(tmpdir):
                                "pattern": path
                            })
     driver.data_tile(data_var, timestamp_ms, 0, 0, 0)
+
+
+def test_grid_spacing(tmpdir):
+    path = str(tmpdir / "sample.nc")
+    sample_h5netcdf(path)
+    settings = {"pattern": path}
+    assert xarray_h5netcdf.driver.grid_spacing(settings, "data") == 180.
@@ -0,0 +1,65 @@
+import gzip
+import os
+import pytest
+from forest_lite.server.lib import assets
+
+
+BODY = b"function main() {}\n" * 200
+
+
+@pytest.fixture
+def directory(tmpdir):
+    tmpdir.join("lite.min.js").write_binary(BODY)
+    tmpdir.join("tiny.css").write_binary(b"p {}")
+    tmpdir.mkdir("webfonts").join("font.woff2").write_binary(BODY)
+    return str(tmpdir)
+
+
+def test_hashed_name(directory):
+    digest = assets.content_hash(os.path.join(directory, "lite.min.js"))
+    assert len(digest) == assets.HASH_LENGTH
+    assert assets.hashed_name(directory, "lite.min.js") == (
+        f"lite.min.{digest}.js")
+
+
+def test_hashed_name_missing_file(directory):
+    assert assets.hashed_name(directory, "missing.js") == "missing.js"
+
+
+def test_hash_changes_with_content(directory):
+    before = assets.hashed_name(directory, "lite.min.js")
+    with open(os.path.join(directory, "lite.min.js"), "ab") as stream:
+        stream.write(b"// new build")
+    assert assets.hashed_name(directory, "lite.min.js") != before
+
+
+@pytest.mark.parametrize("path,expect", [
+    ("lite.min.0123456789ab.js", ("lite.min.js", "0123456789ab")),
+    ("css/all.0123456789ab.css", ("css/all.css", "0123456789ab")),
+    ("lite.min.js", ("lite.min.js", None)),
+    ("style.css", ("style.css", None)),
+])
+def test_split_hashed(path, expect):
+    assert assets.split_hashed(path) == expect
+
+
+def test_precompress(directory):
+    written = assets.precompress(directory, encodings=["gzip"])
+    path = os.path.join(directory, "lite.min.js")
+    assert written == [path + ".gz"]
+    with open(path + ".gz", "rb") as stream:
+        assert gzip.decompress(stream.read()) == BODY
+
+
+def test_precompress_skips_up_to_date_copies(directory):
+    assets.precompress(directory, encodings=["gzip"])
+    assert assets.precompress(directory, encodings=["gzip"]) == []
+
+
+def test_variant_ignores_stale_copy(directory):
+    assets.precompress(directory, encodings=["gzip"])
+    path = os.path.join(directory, "lite.min.js")
+    assert assets.variant(path, "gzip") is not None
+    stat = os.stat(path + ".gz")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert assets.variant(path, "gzip") is None
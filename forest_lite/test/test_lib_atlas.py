@@ -0,0 +1,103 @@
+import pytest
+import numpy as np
+import cartopy.crs
+import cartopy.feature
+import shapely.geometry
+from forest_lite.server.lib import atlas, geo
+
+
+@pytest.fixture
+def geometries():
+    return [
+        shapely.geometry.LineString([(0, 0), (5, 5)]),
+        shapely.geometry.LineString([(170, 10), (-170, 10)]),
+        shapely.geometry.LineString([(170, 10), (179, 15), (190, 20)]),
+        shapely.geometry.MultiLineString([[(-50, -50), (-40, -40)],
+                                          [(20, 20), (30, 25)]]),
+        shapely.geometry.Polygon([(-10, -10), (10, -10), (10, 10)]),
+        shapely.geometry.LineString([(12, 2), (20, 10)]),
+    ]
+
+
+@pytest.mark.parametrize("extent", [
+    None,
+    (-180, 180, -90, 90),
+    (0, 10, 0, 10),
+    (11, 12, 2.5, 3),  # Bounding box overlaps, line does not
+    (100, 110, 0, 10),
+])
+def test_feature_index_matches_intersecting_geometries(geometries, extent):
+    feature = cartopy.feature.ShapelyFeature(geometries,
+                                             cartopy.crs.PlateCarree())
+    expect = atlas.multiline(feature, extent)
+    actual = atlas.FeatureIndex(geometries).query(extent)
+    assert len(actual["xs"]) == len(expect["xs"])
+    for key in ("xs", "ys"):
+        for a, e in zip(actual[key], expect[key]):
+            np.testing.assert_allclose(a, e)
+
+
+def test_feature_index_skips_empty_geometries():
+    index = atlas.FeatureIndex([None, shapely.geometry.LineString()])
+    assert len(index) == 0
+    assert index.query((0, 1, 0, 1)) == {"xs": [], "ys": []}
+
+
+@pytest.mark.parametrize("zoom,expect", [
+    (0, "110m"),
+    (2, "110m"),
+    (3, "50m"),
+    (5, "50m"),
+    (6, "10m"),
+    (12, "10m"),
+])
+def test_zoom_scale(zoom, expect):
+    assert atlas.zoom_scale(zoom) == expect
+
+
+def test_clip_lines():
+    xs = [np.array([-5., 5.]), np.array([20., 30.]), np.array([1., 2.])]
+    ys = [np.array([0., 0.]), np.array([0., 0.]), np.array([1., 1.])]
+    result = atlas.clip_lines(xs, ys, (0, 10), (-10, 10), 0.1)
+    np.testing.assert_allclose(result["xs"][0], [0, 5])
+    np.testing.assert_allclose(result["xs"][1], [1, 2])
+    assert len(result["xs"]) == 2
+
+
+def test_clip_lines_simplifies_to_tolerance():
+    x = np.linspace(0, 10, 101)
+    y = np.where(np.arange(101) % 2 == 0, 0., 0.01)
+    result = atlas.clip_lines([x], [y], (0, 10), (-1, 1), 0.1)
+    np.testing.assert_allclose(result["xs"][0], [0, 10])
+
+
+def test_clip_lines_drops_non_finite_points():
+    xs = [np.array([0., 1., np.inf])]
+    ys = [np.array([0., 1., 2.])]
+    result = atlas.clip_lines(xs, ys, (-5, 5), (-5, 5), 0.01)
+    np.testing.assert_allclose(result["xs"][0], [0, 1])
+
+
+def test_plate_carree_inverts_web_mercator():
+    lons, lats = np.array([-170., 0., 45.]), np.array([-80., 0., 60.])
+    x, y = geo.web_mercator(lons, lats)
+    actual_lons, actual_lats = atlas.plate_carree(x, y)
+    np.testing.assert_allclose(actual_lons, lons)
+    np.testing.assert_allclose(actual_lats, lats)
+
+
+def test_feature_tile(monkeypatch, geometries):
+    scales = []
+
+    def feature_index(category, name, scale):
+        scales.append(scale)
+        return atlas.FeatureIndex(geometries)
+
+    monkeypatch.setattr(atlas, "feature_index", feature_index)
+    atlas.feature_tile.cache_clear()
+    world = atlas.feature_tile("physical", "coastline", (0, 0, 0))
+    north_east = atlas.feature_tile("physical", "coastline", (7, 64, 64))
+    atlas.feature_tile.cache_clear()
+    assert scales == ["110m", "10m"]
+    assert len(world["xs"]) == 7
+    assert len(north_east["xs"]) == 2  # Line from origin and triangle edge
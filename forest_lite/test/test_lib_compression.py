@@ -0,0 +1,70 @@
+import gzip
+import pytest
+from forest_lite.server.lib import compression
+
+
+BODY = b'{"values": [' + b"1.0, " * 1000 + b"1.0]}"
+
+
+@pytest.mark.parametrize("header,expect", [
+    ("gzip, deflate", {"gzip": 1., "deflate": 1.}),
+    ("gzip;q=0.5, br", {"gzip": 0.5, "br": 1.}),
+    ("GZIP; q=0", {"gzip": 0.}),
+    ("", {}),
+])
+def test_parse_accept(header, expect):
+    assert compression.parse_accept(header) == expect
+
+
+@pytest.mark.parametrize("header,expect", [
+    (None, None),
+    ("identity", None),
+    ("gzip, deflate", "gzip"),
+    ("gzip, br", "br"),
+    ("gzip, br, zstd", "zstd"),
+    ("gzip, br;q=0.5", "gzip"),
+    ("*", "zstd"),
+    ("*, zstd;q=0", "br"),
+])
+def test_negotiate(header, expect):
+    encodings = ("zstd", "br", "gzip")
+    assert compression.negotiate(header, encodings) == expect
+
+
+def test_available_has_gzip():
+    assert "gzip" in compression.available()
+
+
+def test_compress_gzip():
+    body = compression.compress(BODY, "gzip")
+    assert len(body) < len(BODY)
+    assert gzip.decompress(body) == BODY
+
+
+def test_compressor_gzip_stream():
+    compressor = compression.Compressor("gzip")
+    chunks = [compressor.compress(BODY[:100]),
+              compressor.compress(BODY[100:]),
+              compressor.finish()]
+    assert gzip.decompress(b"".join(chunks)) == BODY
+
+
+def test_compress_br():
+    brotli = pytest.importorskip("brotli")
+    assert brotli.decompress(compression.compress(BODY, "br")) == BODY
+
+
+def test_compress_zstd():
+    zstandard = pytest.importorskip("zstandard")
+    body = compression.compress(BODY, "zstd")
+    assert zstandard.ZstdDecompressor().decompress(body) == BODY
+
+
+def test_compress_unknown():
+    with pytest.raises(ValueError):
+        compression.compress(BODY, "lzma")
+
+
+def test_headers():
+    assert compression.headers(None) == {}
+    assert compression.headers("br")["Content-Encoding"] == "br"
@@ -0,0 +1,63 @@
+import pytest
+import numpy as np
+from forest_lite.server.lib import data, geo
+
+
+def cut_line_by_line(lines, x):
+    """Reference implementation, one line at a time"""
+    for xs, ys in lines:
+        xs, ys = np.asarray(xs), np.asarray(ys)
+        if (np.min(xs) < x) and (np.max(xs) > x):
+            pts = xs < x
+            yield xs[pts], ys[pts]
+            yield xs[~pts], ys[~pts]
+        else:
+            yield xs, ys
+
+
+@pytest.fixture
+def lines():
+    return [
+        ([170., 175., 185., 190.], [0., 1., 2., 3.]),
+        ([0., 1.], [5., 6.]),
+        ([185., 175., 186.], [1., 2., 3.]),  # Crosses twice
+        ([180., 181.], [0., 0.]),  # Touches the cut
+        ([179.], [0.]),
+    ]
+
+
+def test_cut_matches_line_by_line(lines):
+    actual = data.cut(lines, 180)
+    expect = list(cut_line_by_line(lines, 180))
+    assert len(actual) == len(expect)
+    for (ax, ay), (ex, ey) in zip(actual, expect):
+        np.testing.assert_array_equal(ax, ex)
+        np.testing.assert_array_equal(ay, ey)
+
+
+def test_cut_flat_parents(lines):
+    x, y, sizes = data.flatten(lines)
+    _, _, sizes, parents = data.cut_flat(x, y, sizes, 180)
+    np.testing.assert_array_equal(sizes, [2, 2, 2, 1, 2, 2, 1])
+    np.testing.assert_array_equal(parents, [0, 0, 1, 2, 2, 3, 4])
+
+
+def test_cut_keeps_empty_lines():
+    result = data.cut([([], []), ([1., 2.], [3., 4.])], 180)
+    assert [len(xs) for xs, _ in result] == [0, 2]
+
+
+def test_cut_no_lines():
+    assert data.cut([], 180) == []
+
+
+def test_xs_ys_matches_line_by_line(lines):
+    actual = data.xs_ys(lines)
+    for i, (lons, lats) in enumerate(lines):
+        x, y = geo.web_mercator(lons, lats)
+        np.testing.assert_allclose(actual["xs"][i], x)
+        np.testing.assert_allclose(actual["ys"][i], y)
+
+
+def test_xs_ys_no_lines():
+    assert data.xs_ys([]) == {"xs": [], "ys": []}
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+from forest_lite.server.lib import metatile
+
+
+@pytest.mark.parametrize("zxy,size,expect", [
+    ((3, 5, 2), 4, ((1, 1, 0), 4)),
+    ((3, 5, 2), 2, ((2, 2, 1), 2)),
+    ((1, 1, 0), 4, ((0, 0, 0), 2)),
+    ((0, 0, 0), 4, ((0, 0, 0), 1)),
+])
+def test_block(zxy, size, expect):
+    meta, n, tiles = metatile.block(zxy, size)
+    assert (meta, n) == expect
+    assert len(tiles) == n ** 2
+    assert zxy in tiles
+
+
+def test_block_tiles_in_order():
+    _, _, tiles = metatile.block((1, 1, 0), 2)
+    assert tiles == [(1, 0, 0), (1, 1, 0), (1, 0, 1), (1, 1, 1)]
+
+
+def test_split():
+    obj = {"data": {"image": [np.arange(16.).reshape(4, 4)], "level": [1],
+                    "units": ["K"], "tile_key": [[0, 1, 1]]}}
+    actual = metatile.split(obj, 2, (2, 1, 2))["data"]
+    np.testing.assert_array_equal(actual["image"][0], [[2, 3], [6, 7]])
+    assert actual["units"] == ["K"]
+    assert actual["level"] == [2]
+    assert actual["tile_key"] == [[1, 2, 2]]
@@ -0,0 +1,82 @@
+from functools import lru_cache
+import pytest
+from forest_lite.server.lib import metrics
+
+
+@pytest.fixture
+def registry():
+    return metrics.Registry()
+
+
+def test_counter_render(registry):
+    counter = metrics.Counter("requests_total", "Requests", ["route"],
+                              registry=registry)
+    counter.labels(route="/a").inc()
+    counter.labels(route="/a").inc(2)
+    assert registry.render() == "\n".join([
+        "# HELP requests_total Requests",
+        "# TYPE requests_total counter",
+        'requests_total{route="/a"} 3',
+        ""
+    ])
+
+
+def test_gauge_set_function(registry):
+    gauge = metrics.Gauge("depth", "Queue depth", registry=registry)
+    gauge.set_function(lambda: 7)
+    assert "depth 7" in registry.render().splitlines()
+
+
+def test_gauge_track_inprogress(registry):
+    gauge = metrics.Gauge("in_flight", "In flight", registry=registry)
+    with gauge.track_inprogress():
+        assert "in_flight 1" in registry.render().splitlines()
+    assert "in_flight 0" in registry.render().splitlines()
+
+
+def test_histogram_cumulative_buckets(registry):
+    histogram = metrics.Histogram("latency_seconds", "Latency",
+                                  buckets=(0.1, 1.), registry=registry)
+    for value in (0.05, 0.1, 0.5, 2.):
+        histogram.observe(value)
+    lines = registry.render().splitlines()
+    assert lines[2:] == [
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1.0"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 2.65",
+        "latency_seconds_count 4",
+    ]
+
+
+def test_metric_with_labels_requires_labels(registry):
+    counter = metrics.Counter("total", "Total", ["route"], registry=registry)
+    with pytest.raises(ValueError):
+        counter.inc()
+
+
+def test_register_duplicate_name(registry):
+    metrics.Counter("total", "Total", registry=registry)
+    with pytest.raises(ValueError):
+        metrics.Counter("total", "Total", registry=registry)
+
+
+def test_label_values_escaped():
+    assert (metrics.sample("x", {"path": 'a"b\\c\n'}, 1) ==
+            'x{path="a\\"b\\\\c\\n"} 1')
+
+
+def test_track_cache(registry):
+    @metrics.track_cache("squares", registry=registry)
+    @lru_cache(maxsize=2)
+    def square(x):
+        return x * x
+
+    for x in (1, 1, 2, 3):
+        square(x)
+    lines = registry.render().splitlines()
+    assert 'forest_lite_cache_hits_total{cache="squares"} 1' in lines
+    assert 'forest_lite_cache_misses_total{cache="squares"} 3' in lines
+    assert 'forest_lite_cache_evictions_total{cache="squares"} 1' in lines
+    assert 'forest_lite_cache_entries{cache="squares"} 2' in lines
+    assert square.cache_clear is not None  # Still the lru_cache wrapper
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from forest_lite.server.lib import overzoom
+from forest_lite.server.lib.config import Dataset
+
+
+@pytest.mark.parametrize("spacing,tile_size,expect", [
+    (None, 256, None),
+    (0., 256, None),
+    (360 / 256, 256, 0),
+    (10., 256, 0),
+    (0.25, 256, 3),
+    (0.25, 512, 2),
+    (0.01, 256, 8),
+])
+def test_native_zoom(spacing, tile_size, expect):
+    assert overzoom.native_zoom(spacing, tile_size) == expect
+
+
+def test_dataset_zoom_explicit():
+    dataset = Dataset(label="Model", max_zoom=4)
+    assert overzoom.dataset_zoom(dataset, "air") == 4
+
+
+def test_dataset_zoom_unknown_spacing():
+    dataset = Dataset(label="Model", driver={"name": "rdt"})
+    assert overzoom.dataset_zoom(dataset, "air") is None
+
+
+def test_tile_kwargs():
+    assert overzoom.tile_kwargs(Dataset(label="Model")) == {}
+    dataset = Dataset(label="Model", tile_size=512)
+    assert overzoom.tile_kwargs(dataset) == {"tile_size": 512}
+
+
+def test_ancestor():
+    assert overzoom.ancestor((5, 21, 10), 3) == (3, 5, 2)
+    assert overzoom.ancestor((3, 5, 2), 3) == (3, 5, 2)
+
+
+def test_upsample():
+    obj = {"data": {"image": [np.arange(16.).reshape(4, 4)],
+                    "level": [1], "tile_key": [[0, 1, 1]]}}
+    actual = overzoom.upsample(obj, (1, 0, 1), (2, 1, 3))["data"]
+    np.testing.assert_array_equal(actual["image"][0], [[10, 10, 11, 11],
+                                                       [10, 10, 11, 11],
+                                                       [14, 14, 15, 15],
+                                                       [14, 14, 15, 15]])
+    assert actual["level"] == [2]
+    assert actual["tile_key"] == [[1, 3, 2]]
+
+
+def test_upsample_below_one_pixel():
+    obj = {"image": [np.array([[1., 2.], [3., 4.]])]}
+    actual = overzoom.upsample(obj, (0, 0, 0), (3, 7, 0))
+    np.testing.assert_array_equal(actual["image"][0], [[2, 2], [2, 2]])
+
+
+def test_upsample_keeps_mask():
+    image = np.ma.masked_invalid([[np.nan, 1.], [2., 3.]])
+    actual = overzoom.upsample({"image": [image]}, (0, 0, 0), (1, 0, 0))
+    assert actual["image"][0].mask.all()
+
+
+def test_decode():
+    actual = overzoom.decode({"data": {"image": [[["NaN", 1.0]]]}})
+    image = actual["data"]["image"][0]
+    assert image.mask.tolist() == [[True, False]]
+    assert image[0, 1] == 1.
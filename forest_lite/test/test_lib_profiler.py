@@ -0,0 +1,75 @@
+import contextvars
+import threading
+import time
+import pytest
+from forest_lite.server.lib import profiler
+
+
+def spin(stop):
+    while not stop.is_set():
+        sum(range(100))
+
+
+@pytest.fixture
+def busy_thread():
+    stop = threading.Event()
+    thread = threading.Thread(target=spin, args=(stop,), name="busy")
+    thread.start()
+    yield thread
+    stop.set()
+    thread.join()
+
+
+def test_sampler_collects_busy_thread(busy_thread):
+    with profiler.Sampler(interval=0.001) as sampler:
+        time.sleep(0.05)
+    assert sampler.samples > 0
+    stacks = [line.rsplit(" ", 1)[0]
+              for line in sampler.collapsed().splitlines()]
+    assert any(stack.startswith("busy;") and "spin (" in stack
+               for stack in stacks)
+
+
+def test_sampler_selected_threads(busy_thread):
+    sampler = profiler.Sampler(interval=0.001, thread_ids={})
+    sampler.add_thread(threading.get_ident())
+    sampler.sample()
+    assert not any(line.startswith("busy;")
+                   for line in sampler.collapsed().splitlines())
+
+
+def test_collapsed_format():
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait, name="waiting")
+    thread.start()
+    sampler = profiler.Sampler(thread_ids={thread.ident: 1})
+    sampler.sample()
+    sampler.sample()
+    stop.set()
+    thread.join()
+    line, = sampler.collapsed().splitlines()
+    stack, count = line.rsplit(" ", 1)
+    assert count == "2"
+    assert stack.startswith("waiting;")
+    assert stack.split(";")[-1].startswith("wait (threading.py:")
+
+
+def test_attach_outside_profile_is_noop():
+    with profiler.attach():
+        pass
+
+
+def test_request_profile_attach_thread():
+    seen = {}
+
+    def work():
+        with profiler.attach():
+            seen["ids"] = set(sampler.thread_ids)
+
+    with profiler.request_profile(interval=0.001) as sampler:
+        context = contextvars.copy_context()
+        thread = threading.Thread(target=context.run, args=(work,))
+        thread.start()
+        thread.join()
+    assert seen["ids"] == {threading.get_ident(), thread.ident}
+    assert sampler.thread_ids == {threading.get_ident(): 1}
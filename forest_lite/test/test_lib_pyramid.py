@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from forest_lite.server.lib import pyramid
+
+
+def test_children():
+    assert pyramid.children((1, 1, 0)) == [
+        (2, 2, 0), (2, 3, 0), (2, 2, 1), (2, 3, 1)]
+
+
+def test_mosaic():
+    images = [np.full((1, 1), i) for i in range(4)]
+    actual = pyramid.mosaic(images)
+    np.testing.assert_array_equal(actual, [[0, 1], [2, 3]])
+
+
+def test_reduce_image_mean_ignores_masked_pixels():
+    image = np.ma.masked_invalid([[np.nan, 1., np.nan, np.nan],
+                                  [3., 5., np.nan, np.nan]])
+    actual = pyramid.reduce_image(image, "mean")
+    assert actual[0, 0] == 3.
+    assert actual.mask.tolist() == [[False, True]]
+
+
+def test_reduce_image_nearest():
+    image = np.arange(16.).reshape(4, 4)
+    actual = pyramid.reduce_image(image, "nearest")
+    np.testing.assert_array_equal(actual, [[0, 2], [8, 10]])
+
+
+def test_reduce_image_unknown_method():
+    with pytest.raises(ValueError):
+        pyramid.reduce_image(np.zeros((2, 2)), "median")
+
+
+def test_reduce():
+    tiles = [{"data": {"image": [np.full((2, 2), float(i))],
+                       "units": ["K"], "level": [2],
+                       "tile_key": [list(zxy[1:]) + [2]]}}
+             for i, zxy in enumerate(pyramid.children((1, 0, 1)))]
+    actual = pyramid.reduce(tiles, (1, 0, 1))["data"]
+    np.testing.assert_array_equal(actual["image"][0], [[0, 1], [2, 3]])
+    assert actual["units"] == ["K"]
+    assert actual["level"] == [1]
+    assert actual["tile_key"] == [[0, 1, 1]]
+
+
+def test_reduce_without_images():
+    tiles = [{"data": {"tile_key": [[0, 0, 1]]}}] * 4
+    assert pyramid.reduce(tiles, (0, 0, 0)) is None
@@ -0,0 +1,68 @@
+import datetime as dt
+import json
+import pytest
+import numpy as np
+from bokeh.core.json_encoder import serialize_json as bokeh_serialize_json
+from forest_lite.server.lib import serialize
+from forest_lite.server.lib.serialize import serialize_json
+
+
+@pytest.mark.parametrize("obj", [
+    {"b": 1, "a": [None, True, False, "text", 1.5]},
+    {"nested": {"z": [], "y": {}}, "escape": 'é"\\\n'},
+    [1e16, 1e-5, -0.0, 0.1 + 0.2, 12345678901234567890.0],
+    np.array([[1.5, np.nan], [np.inf, -np.inf]]),
+    np.ma.masked_array([1., 2., 3.], mask=[0, 1, 0]),
+    np.ma.masked_array(np.zeros((2, 2)), mask=True),
+    [np.float64(0.1), np.float32(0.1), np.int64(3), np.bool_(True)],
+    np.arange(3),
+    np.array([True, False]),
+    np.array(["a", "b"]),
+    np.zeros((2, 0)),
+    np.array(2.5),
+    [dt.datetime(2021, 1, 1), dt.date(2021, 1, 1), dt.timedelta(seconds=1),
+     dt.time(1, 2)],
+    [np.datetime64("2021-01-01T00:00"), np.timedelta64(1, "s")],
+    np.array(["2021-01-01T00:00"], dtype="datetime64[ns]"),
+    np.array([dt.datetime(2021, 1, 1)], dtype=object),
+    np.array([None, 1.0, "x"], dtype=object),
+    [np.linspace(0, 1, 3), np.array([]), np.array([np.nan, 2.])],
+])
+def test_serialize_json_matches_bokeh(obj):
+    assert serialize_json(obj) == bokeh_serialize_json(obj).encode()
+
+
+def test_serialize_json_repeated_values_matches_bokeh():
+    values = np.repeat(np.arange(16.).reshape(4, 4), 64, axis=0)
+    values = np.repeat(values, 64, axis=1)
+    values[:10] = np.nan
+    values[10, :5] = -0.0
+    values[11, :5] = -np.inf
+    obj = {"image": [np.ma.masked_invalid(values)]}
+    assert serialize.DEDUPE_MIN_SIZE <= values.size
+    assert serialize_json(obj) == bokeh_serialize_json(obj).encode()
+
+
+@pytest.mark.parametrize("values", [
+    np.array([0.1, 1 / 3, 1e10, -0.0, 3.4028235e38], dtype="f"),
+    np.repeat(np.array([0.1, np.nan, 2.5], dtype="f"), 1024),
+])
+def test_serialize_json_float32_round_trip(values):
+    result = json.loads(serialize_json(values))
+    actual = np.array([np.nan if x == "NaN" else x for x in result],
+                      dtype="f")
+    np.testing.assert_array_equal(actual, values)
+
+
+def test_serialize_json_float32_shortest_digits():
+    assert serialize_json(np.array([0.1], dtype="f")) == b"[0.1]"
+
+
+def test_serialize_json_masked_integers():
+    values = np.ma.masked_array([1, 2, 3], mask=[0, 1, 0])
+    assert serialize_json(values) == b'[1.0,"NaN",3.0]'
+
+
+def test_serialize_json_unsupported_type():
+    with pytest.raises(TypeError):
+        serialize_json(object())
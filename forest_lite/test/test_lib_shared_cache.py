@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+import numpy as np
+import pytest
+from forest_lite.server.lib import shared_cache
+
+
+@pytest.fixture
+def cache(tmpdir):
+    return shared_cache.SharedCache(str(tmpdir))
+
+
+def test_write_read_round_trip(tmpdir):
+    path = str(tmpdir / "value.entry")
+    value = {
+        "values": np.arange(12, dtype="f").reshape(3, 4),
+        "image": np.ma.masked_array([1., 2., 3.], mask=[0, 1, 0],
+                                    fill_value=-1.),
+        "units": "K",
+        "x": [0.],
+    }
+    shared_cache.write(path, value)
+    result = shared_cache.read(path)
+    np.testing.assert_array_equal(result["values"], value["values"])
+    np.testing.assert_array_equal(result["image"].mask, [0, 1, 0])
+    assert result["image"].fill_value == -1.
+    assert result["units"] == "K"
+    assert result["x"] == [0.]
+
+
+def test_read_maps_arrays(tmpdir):
+    path = str(tmpdir / "value.entry")
+    shared_cache.write(path, np.zeros(1000))
+    array = shared_cache.read(path)
+    assert not array.flags.writeable
+    assert array.ctypes.data % shared_cache.ALIGN == 0
+
+
+def test_get_or_compute(cache):
+    calls = []
+
+    def fn():
+        calls.append(1)
+        return np.ones(3)
+
+    first = cache.get_or_compute("key", fn)
+    second = cache.get_or_compute("key", fn)
+    np.testing.assert_array_equal(first, second)
+    assert len(calls) == 1
+    info = cache.cache_info()
+    assert (info.hits, info.misses, info.currsize) == (1, 1, 1)
+
+
+def test_other_keys_computed_alongside(cache):
+    started = threading.Event()
+    finished = threading.Event()
+
+    def slow():
+        started.set()
+        assert finished.wait(timeout=5)
+        return "slow"
+
+    thread = threading.Thread(target=cache.get_or_compute,
+                              args=("slow", slow))
+    thread.start()
+    assert started.wait(timeout=5)
+    assert cache.get_or_compute("fast", lambda: "fast") == "fast"
+    finished.set()
+    thread.join()
+    assert cache.get_or_compute("slow", lambda: "missing") == "slow"
+    assert os.listdir(os.path.join(cache.directory, "locks")) == []
+
+
+def test_same_key_computed_once(cache):
+    calls = []
+
+    def fn():
+        calls.append(1)
+        time.sleep(0.05)
+        return "value"
+
+    threads = [threading.Thread(target=cache.get_or_compute,
+                                args=("key", fn)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+
+
+def test_other_process_reads_entry(tmpdir, cache):
+    cache.get_or_compute("key", lambda: "value")
+    other = shared_cache.SharedCache(str(tmpdir))
+    assert other.get_or_compute("key", lambda: "missing") == "value"
+
+
+def test_unreadable_entry_is_recomputed(cache):
+    with open(cache.path("key"), "wb") as stream:
+        stream.write(b"garbage")
+    assert cache.get_or_compute("key", lambda: 42) == 42
+
+
+def test_prune_removes_oldest(tmpdir):
+    cache = shared_cache.SharedCache(str(tmpdir), max_bytes=10000)
+    for i in range(4):
+        cache.get_or_compute(f"key-{i}", lambda: np.zeros(500))
+        path = cache.path(f"key-{i}")
+        os.utime(path, (i, i))
+    cache.prune()
+    assert not os.path.exists(cache.path("key-0"))
+    assert os.path.exists(cache.path("key-3"))
+    assert cache.cache_info().evictions > 0
+
+
+def test_memoize_disabled(monkeypatch):
+    monkeypatch.delenv(shared_cache.ENV_DIRECTORY, raising=False)
+    calls = []
+
+    @shared_cache.memoize("test")
+    def fn(x):
+        calls.append(x)
+        return x
+
+    assert fn(1) == fn(1) == 1
+    assert calls == [1, 1]
+
+
+def test_memoize_enabled(monkeypatch, tmpdir):
+    monkeypatch.setenv(shared_cache.ENV_DIRECTORY, str(tmpdir))
+    calls = []
+
+    @shared_cache.memoize("test")
+    def fn(x, y=None):
+        calls.append(x)
+        return x
+
+    assert fn(1, y=2) == fn(1, y=2) == 1
+    assert calls == [1]
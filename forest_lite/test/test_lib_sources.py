@@ -0,0 +1,133 @@
+import os
+import pytest
+from forest_lite.server.lib import sources
+
+
+@pytest.fixture
+def path(tmpdir):
+    path = str(tmpdir.join("file.nc"))
+    with open(path, "w") as stream:
+        stream.write("run 1")
+    return path
+
+
+@pytest.fixture
+def reader():
+    calls = []
+
+    @sources.file_cache()
+    def read(source, variable):
+        calls.append((source, variable))
+        with open(source.path) as stream:
+            return stream.read()
+
+    read.calls = calls
+    return read
+
+
+def rewrite(path, text):
+    stat = os.stat(path)
+    with open(path, "w") as stream:
+        stream.write(text)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def test_identify(path):
+    identity = sources.identify(path)
+    assert identity.path == path
+    assert identity.size == 5
+    assert identity.inode == os.stat(path).st_ino
+
+
+def test_identities_skips_missing_files(path):
+    result = sources.identities([path, path + ".missing"])
+    assert [identity.path for identity in result] == [path]
+
+
+def test_file_cache_hit(reader, path):
+    assert reader(path, "air") == reader(path, "air") == "run 1"
+    assert len(reader.calls) == 1
+    assert reader.cache_info().hits == 1
+
+
+def test_file_cache_passes_identity(reader, path):
+    reader(path, "air")
+    source, _ = reader.calls[0]
+    assert source == sources.identify(path)
+
+
+def test_file_cache_misses_after_rewrite(reader, path):
+    reader(path, "air")
+    reader(path, "rain")
+    rewrite(path, "run 2")
+    assert reader(path, "air") == "run 2"
+    assert reader.cache_info().currsize == 1  # Stale entries dropped
+
+
+def test_file_cache_skips_result_of_stale_call(path):
+    @sources.file_cache()
+    def read(source):
+        if source.size == 5:  # Rewritten and read again meanwhile
+            rewrite(path, "run 2.")
+            assert read(path) == "run 2."
+            return "stale"
+        with open(source.path) as stream:
+            return stream.read()
+
+    assert read(path) == "stale"
+    assert read(path) == "run 2."
+    assert read.cache_info().hits == 1
+    assert read.cache_info().currsize == 1
+
+
+def test_file_cache_misses_after_replace(reader, path, tmpdir):
+    reader(path, "air")
+    tmp = str(tmpdir.join("tmp.nc"))
+    with open(tmp, "w") as stream:
+        stream.write("run 2")
+    os.replace(tmp, path)
+    assert reader(path, "air") == "run 2"
+
+
+def test_file_cache_maxsize(path):
+    @sources.file_cache(maxsize=2)
+    def read(source, i):
+        return i
+
+    for i in range(3):
+        read(path, i)
+    info = read.cache_info()
+    assert (info.currsize, info.evictions) == (2, 1)
+
+
+def test_file_cache_clear(reader, path):
+    reader(path, "air")
+    reader.cache_clear()
+    assert reader.cache_info() == (0, 0, 128, 0, 0)
+
+
+def test_update_catalog_drops_files_no_longer_listed(reader, path, tmpdir):
+    other = str(tmpdir.join("other.nc"))
+    with open(other, "w") as stream:
+        stream.write("run 2")
+    pattern = str(tmpdir.join("*.nc"))
+    sources.update_catalog(pattern, [path, other])
+    reader(path, "air")
+    reader(other, "air")
+    assert sources.update_catalog(pattern, [other]) == {path}
+    assert reader.cache_info().currsize == 1
+    reader(other, "air")
+    assert reader.cache_info().hits == 1
+
+
+def test_list_files_relisted_when_directory_changes(tmpdir):
+    pattern = str(tmpdir.join("*.nc"))
+    tmpdir.join("a.nc").write("run 1")
+    assert sources.list_files(pattern) == (str(tmpdir.join("a.nc")),)
+    tmpdir.join("b.nc").write("run 2")
+    os.utime(str(tmpdir), ns=(1, 1))  # Changed directory
+    assert len(sources.list_files(pattern)) == 2
+
+
+def test_list_files_missing_directory(tmpdir):
+    assert sources.list_files(str(tmpdir.join("missing", "*.nc"))) == ()
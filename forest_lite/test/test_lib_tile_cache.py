@@ -0,0 +1,163 @@
+import http.server
+import os
+import threading
+import pytest
+from forest_lite.server.lib import tile_cache
+from forest_lite.server.lib.config import TileCache
+
+
+class StandIn(http.server.BaseHTTPRequestHandler):
+    """Minimal remote tile store, GET and PUT /tiles/{key}"""
+    store = {}
+
+    def do_GET(self):
+        value = self.store.get(self.path)
+        if value is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(value)))
+        self.end_headers()
+        self.wfile.write(value)
+
+    def do_PUT(self):
+        size = int(self.headers["Content-Length"])
+        self.store[self.path] = self.rfile.read(size)
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    StandIn.store = {}
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}/tiles"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_memory_tier_evicts_least_recently_used():
+    tier = tile_cache.MemoryTier(max_bytes=10)
+    tier.set("a", b"aaaa")
+    tier.set("b", b"bbbb")
+    tier.get("a")
+    tier.set("c", b"cccc")
+    assert tier.get("b") is None
+    assert tier.get("a") == b"aaaa"
+    assert tier.get("c") == b"cccc"
+    assert tier.size == 8
+    assert tier.cache_info().evictions == 1
+
+
+def test_memory_tier_skips_oversized_values():
+    tier = tile_cache.MemoryTier(max_bytes=2)
+    tier.set("a", b"aaaa")
+    assert tier.get("a") is None
+
+
+def test_disk_tier_survives_restart(tmpdir):
+    tier = tile_cache.DiskTier(str(tmpdir), max_bytes=1000)
+    tier.set("a", b"tile")
+    tier = tile_cache.DiskTier(str(tmpdir), max_bytes=1000)
+    assert tier.size == 4
+    assert tier.get("a") == b"tile"
+
+
+def test_disk_tier_overwrite_keeps_size(tmpdir):
+    tier = tile_cache.DiskTier(str(tmpdir), max_bytes=1000)
+    tier.set("a", b"tile")
+    tier.set("a", b"longer tile")
+    assert tier.size == 11
+
+
+def test_disk_tier_prunes_least_recently_used(tmpdir):
+    tier = tile_cache.DiskTier(str(tmpdir), max_bytes=25)
+    for i, key in enumerate("abc"):
+        tier.set(key, b"0123456789")
+        os.utime(tier.path(key), (i, i))
+    assert not os.path.exists(tier.path("a"))
+    assert tier.get("b") is not None
+    assert tier.get("c") is not None
+    assert tier.cache_info().evictions == 1
+
+
+def test_http_tier(server):
+    tier = tile_cache.HTTPTier(server)
+    assert tier.get("a") is None
+    tier.set("a", b"tile")
+    assert tier.get("a") == b"tile"
+    assert tier.cache_info()[:2] == (1, 1)
+
+
+def test_http_tier_unavailable():
+    tier = tile_cache.HTTPTier("http://127.0.0.1:9/tiles", timeout=0.1)
+    assert tier.get("a") is None
+    assert not tier.available()
+    tier.set("a", b"tile")  # Skipped until retry_seconds pass
+
+
+def test_tiered_cache_promotes_hits(tmpdir, server):
+    memory = tile_cache.MemoryTier(1000)
+    disk = tile_cache.DiskTier(str(tmpdir), 1000)
+    remote = tile_cache.HTTPTier(server)
+    cache = tile_cache.TieredCache([memory, disk, remote])
+    remote.set("a", b"tile")
+    assert cache.get("a", stop=1) is None
+    assert cache.get("a", start=1) == b"tile"
+    assert disk.get("a") == b"tile"
+    assert memory.get("a") == b"tile"
+
+
+def test_tiered_cache_set():
+    tiers = [tile_cache.MemoryTier(1000), tile_cache.MemoryTier(1000)]
+    cache = tile_cache.TieredCache(tiers)
+    cache.set("a", b"tile", stop=1)
+    assert tiers[1].get("a") is None
+    cache.set("a", b"tile", start=1)
+    assert tiers[1].get("a") == b"tile"
+
+
+def test_get_cache(tmpdir, server):
+    assert tile_cache.get_cache(TileCache()) is None
+    settings = TileCache(enabled=True, disk_directory=str(tmpdir),
+                         remote={"name": "http",
+                                 "settings": {"url": server}})
+    cache = tile_cache.get_cache(settings)
+    assert [tier.name for tier in cache.tiers] == ["memory", "disk",
+                                                   "remote"]
+    assert tile_cache.get_cache(settings) is cache
+    assert cache.local == 2
+
+
+def test_get_cache_ignores_deadline(tmpdir):
+    settings = TileCache(enabled=True, disk_directory=str(tmpdir))
+    cache = tile_cache.get_cache(settings)
+    reloaded = TileCache(enabled=True, disk_directory=str(tmpdir),
+                         deadline_seconds=0.5)
+    assert tile_cache.get_cache(reloaded) is cache
+
+
+def test_tile_key():
+    from forest_lite.server.lib.config import Driver
+    driver = Driver(name="d", settings={"pattern": "*.nc"})
+    key = tile_cache.tile_key(driver, "air", (0, 0, 0))
+    assert key == tile_cache.tile_key(driver, "air", (0, 0, 0))
+    assert key != tile_cache.tile_key(driver, "air", (1, 0, 0))
+    assert key != tile_cache.tile_key(driver, "air", (0, 0, 0), '{"t": 1}')
+
+
+def test_tile_key_ignores_query_formatting():
+    from forest_lite.server.lib.config import Driver
+    driver = Driver(name="d")
+    key = tile_cache.tile_key(driver, "air", (0, 0, 0),
+                              '{"start_time":1.0,"time":2.5}')
+    assert key == tile_cache.tile_key(driver, "air", (0, 0, 0),
+                                      '{"time": 2.5, "start_time": 1}')
+    assert key != tile_cache.tile_key(driver, "air", (0, 0, 0),
+                                      '{"time": 2.5, "start_time": 2}')
@@ -0,0 +1,46 @@
+import asyncio
+from forest_lite.server.lib import tracing, workers
+
+
+def test_span_outside_trace_is_ignored():
+    with tracing.span("read"):
+        pass
+    assert tracing.current() is None
+
+
+def test_spans_summed_by_name():
+    trace, token = tracing.start()
+    try:
+        with tracing.span("read"):
+            pass
+        with tracing.span("regrid"):
+            pass
+        with tracing.span("read"):
+            pass
+    finally:
+        tracing.stop(token)
+    assert list(trace.totals()) == ["read", "regrid"]
+    assert [record["name"] for record in trace.records()] == [
+        "read", "regrid", "read"]
+    header = trace.server_timing()
+    assert header.startswith("read;dur=")
+    assert ", regrid;dur=" in header
+    assert ", total;dur=" in header
+    assert tracing.current() is None
+
+
+def test_spans_recorded_in_worker_threads():
+    def read():
+        with tracing.span("read"):
+            pass
+
+    async def request():
+        trace, token = tracing.start()
+        try:
+            await workers.WorkerPool(max_workers=1).run(read)
+        finally:
+            tracing.stop(token)
+        return trace
+
+    trace = asyncio.run(request())
+    assert list(trace.totals()) == ["queue", "read"]
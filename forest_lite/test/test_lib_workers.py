@@ -0,0 +1,86 @@
+import asyncio
+import threading
+import time
+from forest_lite.server.lib import workers
+
+
+class Client:
+    """Request stand-in that disconnects after a delay"""
+    def __init__(self, seconds):
+        self.gone = time.monotonic() + seconds
+
+    async def is_disconnected(self):
+        return time.monotonic() > self.gone
+
+
+def test_checkpoint_outside_request():
+    workers.checkpoint()
+
+
+def test_until_disconnected_returns_result():
+    async def work():
+        return "tile"
+
+    actual = asyncio.run(workers.until_disconnected(Client(60), work()))
+    assert actual == "tile"
+
+
+def test_disconnect_stops_running_call_at_checkpoint():
+    pool = workers.WorkerPool(max_workers=1)
+    finished = threading.Event()
+    steps = []
+
+    def render():
+        for step in range(50):
+            workers.checkpoint()
+            steps.append(step)
+            time.sleep(0.01)
+        finished.set()
+
+    async def request():
+        return await workers.until_disconnected(
+            Client(0.05), pool.run(render), interval=0.01)
+
+    assert asyncio.run(request()) is None
+    time.sleep(0.05)
+    assert not finished.is_set()
+    assert len(steps) < 50
+
+
+def test_disconnect_drops_queued_calls():
+    pool = workers.WorkerPool(max_workers=1)
+    calls = []
+
+    async def request():
+        busy = asyncio.ensure_future(pool.run(time.sleep, 0.1))
+        await asyncio.sleep(0)
+        result = await workers.until_disconnected(
+            Client(0.02), pool.run(calls.append, 1), interval=0.01)
+        await busy
+        return result
+
+    assert asyncio.run(request()) is None
+    assert calls == []
+    assert pool.queued == 0
+
+
+def test_shared_work_ignores_disconnect():
+    pool = workers.WorkerPool(max_workers=1)
+    tasks = []
+
+    def render():
+        time.sleep(0.05)
+        workers.checkpoint()
+        return "tile"
+
+    async def wait_for_shared():
+        task = asyncio.ensure_future(workers.shared(pool.run(render)))
+        tasks.append(task)
+        return await asyncio.shield(task)
+
+    async def request():
+        actual = await workers.until_disconnected(
+            Client(0.01), wait_for_shared(), interval=0.01)
+        return actual, await tasks[0]
+
+    assert asyncio.run(request()) == (None, "tile")
@@ -0,0 +1,145 @@
+import gzip
+import logging
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+from starlette.responses import StreamingResponse
+from forest_lite.server.lib import tracing
+from forest_lite.server.middleware import (CompressionMiddleware,
+                                           TimingMiddleware)
+
+
+def make_app(slow_seconds=None):
+    app = FastAPI()
+
+    @app.get("/tiles/{Z}")
+    async def tile(Z: int):
+        with tracing.span("regrid"):
+            pass
+        with tracing.span("serialize"):
+            pass
+        return {"Z": Z}
+
+    app.add_middleware(TimingMiddleware, slow_seconds=slow_seconds)
+    return app
+
+
+def test_server_timing_header():
+    client = TestClient(make_app())
+    response = client.get("/tiles/3")
+    header = response.headers["server-timing"]
+    names = [item.split(";")[0] for item in header.split(", ")]
+    assert names == ["regrid", "serialize", "total"]
+
+
+def test_slow_request_log(caplog):
+    client = TestClient(make_app(slow_seconds=0))
+    with caplog.at_level(logging.WARNING,
+                         logger="forest_lite.server.middleware"):
+        client.get("/tiles/3?query=%7B%7D")
+    message, = [record.getMessage() for record in caplog.records]
+    assert message.startswith("slow request: ")
+    assert '"path": "/tiles/3"' in message
+    assert '"query_string": "query=%7B%7D"' in message
+    assert '"path_params": {"Z": "3"}' in message
+    assert '"name": "regrid"' in message
+
+
+def test_fast_request_not_logged(caplog):
+    client = TestClient(make_app(slow_seconds=60))
+    with caplog.at_level(logging.WARNING,
+                         logger="forest_lite.server.middleware"):
+        client.get("/tiles/3")
+    assert caplog.records == []
+
+
+LARGE = "x" * 2000
+
+
+def make_compressed_app(**kwargs):
+    app = FastAPI()
+
+    @app.get("/small")
+    async def small():
+        return Response(content="small", media_type="text/plain")
+
+    @app.get("/large")
+    async def large():
+        return Response(content=LARGE, media_type="text/plain")
+
+    @app.get("/encoded")
+    async def encoded():
+        return Response(content=gzip.compress(LARGE.encode()),
+                        media_type="text/plain",
+                        headers={"Content-Encoding": "gzip"})
+
+    @app.get("/image")
+    async def image():
+        return Response(content=LARGE, media_type="image/png")
+
+    @app.get("/stream")
+    async def stream():
+        return StreamingResponse(iter([LARGE[:10], LARGE[10:]]),
+                                 media_type="application/json")
+
+    app.add_middleware(CompressionMiddleware, **kwargs)
+    return app
+
+
+@pytest.fixture
+def compressed_client():
+    return TestClient(make_compressed_app())
+
+
+GZIP = {"Accept-Encoding": "gzip"}
+
+
+def test_compression_large(compressed_client):
+    response = compressed_client.get("/large", headers=GZIP)
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.text == LARGE
+
+
+def test_compression_skips_small(compressed_client):
+    response = compressed_client.get("/small", headers=GZIP)
+    assert "content-encoding" not in response.headers
+    assert response.text == "small"
+
+
+def test_compression_skips_encoded(compressed_client):
+    response = compressed_client.get("/encoded", headers=GZIP)
+    assert response.text == LARGE
+
+
+def test_compression_skips_images(compressed_client):
+    response = compressed_client.get("/image", headers=GZIP)
+    assert "content-encoding" not in response.headers
+
+
+def test_compression_identity(compressed_client):
+    response = compressed_client.get("/large",
+                                     headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+
+
+def test_compression_stream(compressed_client):
+    response = compressed_client.get("/stream", headers=GZIP)
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text == LARGE
+
+
+def test_compression_reuses_compressed_bodies(compressed_client):
+    compressed_client.get("/large", headers=GZIP)
+    compressed_client.get("/large", headers=GZIP)
+    middleware = compressed_client.app.middleware_stack.app
+    assert middleware.cache.hits == 1
+
+
+def test_compression_route_levels():
+    middleware = CompressionMiddleware(None, route_levels={
+        "/static": {"gzip": 9}, "/static/js": {"gzip": 1}})
+    assert middleware.level("/static/js/app.js", "gzip") == 1
+    assert middleware.level("/static/app.css", "gzip") == 9
+    assert middleware.level("/datasets", "gzip") == 6
@@ -0,0 +1,177 @@
+import json
+import threading
+import time
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from forest_lite.server import main, prewarm
+from forest_lite.server.drivers.base import BaseDriver
+from forest_lite.server.lib import shared_cache, tile_cache
+from forest_lite.server.lib.config import Config
+
+
+driver = BaseDriver()
+calls = []
+
+
+@driver.override("description")
+def description(settings):
+    return {"data_vars": {"air": {"dims": ["start_time", "time",
+                                           "latitude", "longitude"]}}}
+
+
+@driver.override("points")
+def points(settings, data_var, dim_name, query=None):
+    data = {"start_time": [1.0, 2.0], "time": [10, 20, 30, 40]}[dim_name]
+    return {"data_var": data_var, "dim_name": dim_name, "data": data}
+
+
+@driver.override("data_tile")
+def data_tile(settings, data_var, z, x, y, query=None):
+    """Data only in the first tile of each zoom level"""
+    calls.append((z, x, y, query))
+    value = 1. if (x, y) == (0, 0) else np.nan
+    return {"data": {"image": [np.full((2, 2), value)]}}
+
+
+@pytest.fixture
+def settings(tmpdir):
+    calls.clear()
+    tmpdir.join("run_1.nc").write("run 1")
+    return Config(
+        tile_cache={"enabled": True},
+        prewarm={"enabled": True, "max_zoom": 2, "times": 2,
+                 "tiles_per_second": None},
+        datasets=[{
+            "label": "Model",
+            "driver": {
+                "name": "forest_lite.test.test_prewarm:driver",
+                "settings": {"pattern": str(tmpdir.join("*.nc"))}
+            }
+        }])
+
+
+@pytest.fixture
+def job(settings):
+    return prewarm.Job(lambda: settings, pool=None,
+                       progress=prewarm.Progress())
+
+
+def test_children():
+    assert prewarm.children((1, 1, 0)) == [
+        (2, 2, 0), (2, 3, 0), (2, 2, 1), (2, 3, 1)]
+
+
+def test_pyramid_size():
+    assert prewarm.pyramid_size(0, 5) == 1365
+    assert prewarm.pyramid_size(3, 3) == 1
+
+
+@pytest.mark.parametrize("obj,expect", [
+    ({"data": {"image": [np.full((2, 2), np.nan)]}}, False),
+    ({"data": {"image": [np.ma.masked_all((2, 2))]}}, False),
+    ({"image": [np.array([[np.nan, 1.]])]}, True),
+    ({"data": {}}, True),
+    ({"data": {"image": [[["NaN", "NaN"]]]}}, False),
+    ({"data": {"image": [[["NaN", 1.0]]]}}, True),
+])
+def test_has_data(obj, expect):
+    assert prewarm.has_data(obj) == expect
+
+
+def test_query_string_matches_json_stringify():
+    actual = prewarm.query_string({"start_time": 1.0, "time": 1.5,
+                                   "level": "surface"})
+    assert actual == '{"start_time":1,"time":1.5,"level":"surface"}'
+
+
+def test_query_string_without_dims():
+    assert prewarm.query_string({}) is None
+
+
+def test_queries_latest_run_first_times():
+    actual = prewarm.queries(driver, {}, "air",
+                             ["start_time", "time", "latitude"], times=2)
+    assert [json.loads(query) for query in actual] == [
+        {"start_time": 2, "time": 10},
+        {"start_time": 2, "time": 20}]
+
+
+def test_poll_reports_changed_datasets(job, settings, tmpdir):
+    assert len(job.poll(settings)) == 1
+    assert len(job.poll(settings)) == 0
+    tmpdir.join("run_2.nc").write("run 2")
+    assert len(job.poll(settings)) == 1
+
+
+def test_warm_fills_tile_cache(job, settings):
+    job.run_once()
+    dataset = settings.datasets[0]
+    cache = tile_cache.get_cache(settings.tile_cache)
+    for _, _, _, query in calls:
+        key = tile_cache.dataset_key(dataset, "air", (0, 0, 0), query)
+        assert cache.get(key) is not None
+
+
+def test_warm_skips_children_of_empty_tiles(job, settings):
+    job.run_once()
+    tiles = sorted({(z, x, y) for z, x, y, _ in calls})
+    assert tiles == [(0, 0, 0),
+                     (1, 0, 0), (1, 0, 1), (1, 1, 0), (1, 1, 1),
+                     (2, 0, 0), (2, 0, 1), (2, 1, 0), (2, 1, 1)]
+    actual = job.progress.dict()["datasets"]["Model"]
+    assert actual["state"] == "warm"
+    assert actual["total"] == actual["completed"] == 2 * 21
+
+
+def test_warm_hits_cache_on_second_run(job, settings):
+    job.run_once()
+    job._seen.clear()
+    calls.clear()
+    job.run_once()
+    assert calls == []
+
+
+class Busy:
+    queued = 1
+
+
+def test_throttle_waits_for_queued_requests():
+    pool = Busy()
+    throttle = prewarm.Throttle(pool=pool)
+    threading.Timer(0.1, setattr, (pool, "queued", 0)).start()
+    start = time.monotonic()
+    throttle.wait()
+    assert time.monotonic() - start >= 0.1
+
+
+def test_throttle_rate():
+    throttle = prewarm.Throttle(rate=100)
+    start = time.monotonic()
+    for _ in range(5):
+        throttle.wait()
+    assert time.monotonic() - start >= 0.04
+
+
+def test_prewarm_endpoint():
+    response = TestClient(main.app).get("/prewarm")
+    assert response.status_code == 200
+    assert "datasets" in response.json()
+
+
+def test_claim_once_per_shared_directory(tmpdir, monkeypatch):
+    monkeypatch.setattr(prewarm, "_claim", None)
+    assert prewarm.claim(str(tmpdir))
+    assert prewarm.claim(str(tmpdir))
+    first = prewarm._claim
+    monkeypatch.setattr(prewarm, "_claim", None)  # Another process
+    assert not prewarm.claim(str(tmpdir))
+    first.close()
+
+
+def test_start_elsewhere(tmpdir, monkeypatch, settings):
+    monkeypatch.setenv(shared_cache.ENV_DIRECTORY, str(tmpdir))
+    monkeypatch.setattr(prewarm, "claim", lambda directory: False)
+    monkeypatch.setattr(prewarm, "progress", prewarm.Progress())
+    assert prewarm.start(lambda: settings) is None
+    assert prewarm.progress.state == "elsewhere"
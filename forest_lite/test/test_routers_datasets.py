@@ -0,0 +1,347 @@
+import asyncio
+import time
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from forest_lite.server import main, config
+from forest_lite.server.routers import datasets
+from forest_lite.server.drivers.base import BaseDriver
+from forest_lite.server.lib import compression, overzoom, workers
+
+
+client = TestClient(main.app)
+
+driver = BaseDriver()
+calls = []
+
+
+@driver.override("data_tile")
+def data_tile(settings, data_var, z, x, y, query=None, tile_size=256):
+    calls.append((data_var, z, x, y, query))
+    if data_var == "broken":
+        return {"errors": [{"message": "broken"}]}
+    if data_var == "slow":
+        time.sleep(0.2)
+        data_var = "image"
+    if data_var == "image":
+        size = tile_size // 128
+        image = np.arange(1., size ** 2 + 1).reshape(size, size)
+        return {"data": {"image": [image], "level": [z],
+                         "tile_key": [[x, y, z]]}}
+    return {"data": {"tile_key": [[x, y, z]]}}
+
+
+fixed_size_driver = BaseDriver()
+
+
+@fixed_size_driver.override("data_tile")
+def fixed_size_data_tile(settings, data_var, z, x, y, query=None):
+    return data_tile(settings, data_var, z, x, y, query=query)
+
+
+spacing_driver = BaseDriver()
+spacing_driver.override("data_tile")(data_tile)
+
+
+@spacing_driver.override("grid_spacing")
+def grid_spacing(settings, data_var, query=None):
+    calls.append(("grid_spacing", data_var))
+    return 180 / 256  # Native zoom 1
+
+
+old_geojson_driver = BaseDriver()
+
+
+@old_geojson_driver.override("get_geojson")
+def get_geojson(settings, timestamp_ms):
+    return b'{"type":"FeatureCollection","features":[]}'
+
+
+@pytest.fixture
+def driver_name():
+    return "driver"
+
+
+@pytest.fixture
+def max_zoom():
+    return None
+
+
+@pytest.fixture
+def reduction():
+    return None
+
+
+@pytest.fixture
+def metatile():
+    return 1
+
+
+@pytest.fixture
+def deadline():
+    return None
+
+
+@pytest.fixture
+def tile_cache(tmpdir, driver_name, max_zoom, reduction, metatile,
+               deadline):
+    calls.clear()
+    overzoom.ancestors.clear()
+    datasets.metatiles.clear()
+    datasets.native_zooms.clear()
+    tmpdir.join("data.nc").write("run 1")
+    settings = config.Settings(
+        tile_cache={"enabled": True,
+                    "disk_directory": str(tmpdir.join("tiles")),
+                    "deadline_seconds": deadline},
+        datasets=[{
+            "label": "Tiles",
+            "max_zoom": max_zoom,
+            "reduction": reduction,
+            "metatile": metatile,
+            "driver": {
+                "name": ("forest_lite.test.test_routers_datasets:"
+                         + driver_name),
+                "settings": {"pattern": str(tmpdir.join("*.nc"))}
+            }
+        }])
+    main.app.dependency_overrides[config.get_settings] = lambda: settings
+    yield tmpdir
+    del main.app.dependency_overrides[config.get_settings]
+
+
+def test_tile_cache_serves_repeat_requests(tile_cache):
+    first = client.get("/datasets/0/air/tiles/1/0/1")
+    second = client.get("/datasets/0/air/tiles/1/0/1")
+    assert first.json() == second.json() == {
+        "data": {"tile_key": [[0, 1, 1]]}}
+    assert calls == [("air", 1, 0, 1, None)]
+
+
+def test_tile_cache_writes_disk_tier(tile_cache):
+    client.get("/datasets/0/air/tiles/1/0/1")
+    tiles = tile_cache.join("tiles")
+    for _ in range(100):
+        if len(tiles.listdir("*.tile")) > 0:
+            break
+        time.sleep(0.01)
+    assert len(tiles.listdir("*.tile")) == 1
+
+
+def test_tile_cache_skips_errors(tile_cache):
+    client.get("/datasets/0/broken/tiles/1/0/1")
+    client.get("/datasets/0/broken/tiles/1/0/1")
+    assert len(calls) == 2
+
+
+def test_tile_cache_misses_after_source_file_changes(tile_cache):
+    client.get("/datasets/0/air/tiles/1/0/1")
+    tile_cache.join("data.nc").write("run 2, rewritten in place")
+    client.get("/datasets/0/air/tiles/1/0/1")
+    assert len(calls) == 2
+
+
+def test_tile_cache_misses_after_new_file_arrives(tile_cache):
+    client.get("/datasets/0/air/tiles/1/0/1")
+    tile_cache.join("later.nc").write("run 2")
+    client.get("/datasets/0/air/tiles/1/0/1")
+    assert len(calls) == 2
+
+
+def test_tile_cache_stores_compressed_copy(tile_cache, monkeypatch):
+    monkeypatch.setattr(compression, "MINIMUM_SIZE", 0)
+    headers = {"Accept-Encoding": "gzip"}
+    first = client.get("/datasets/0/air/tiles/1/0/1", headers=headers)
+    assert first.json() == {"data": {"tile_key": [[0, 1, 1]]}}
+    for _ in range(100):  # Compressed in the background
+        second = client.get("/datasets/0/air/tiles/1/0/1", headers=headers)
+        if "content-encoding" in second.headers:
+            break
+        time.sleep(0.01)
+    assert second.headers["content-encoding"] == "gzip"
+    assert second.json() == {"data": {"tile_key": [[0, 1, 1]]}}
+    assert len(calls) == 1
+
+
+def test_small_tiles_not_compressed(tile_cache, monkeypatch):
+    spawned = []
+    monkeypatch.setattr(workers.pool, "spawn",
+                        lambda fn, *args, **kwargs: spawned.append(fn))
+    headers = {"Accept-Encoding": "gzip"}
+    client.get("/datasets/0/air/tiles/1/0/1", headers=headers)
+    client.get("/datasets/0/air/tiles/1/0/1", headers=headers)
+    assert datasets.encode not in spawned
+
+
+@pytest.mark.parametrize("max_zoom", [1])
+def test_overzoom_tiles_cut_from_ancestor(tile_cache):
+    north_east = client.get("/datasets/0/image/tiles/2/1/3").json()
+    south_west = client.get("/datasets/0/image/tiles/2/0/2").json()
+    assert north_east["data"]["image"] == [[[4., 4.], [4., 4.]]]
+    assert north_east["data"]["tile_key"] == [[1, 3, 2]]
+    assert north_east["data"]["level"] == [2]
+    assert south_west["data"]["image"] == [[[1., 1.], [1., 1.]]]
+    assert calls == [("image", 1, 0, 1, None)]
+
+
+@pytest.mark.parametrize("max_zoom", [1])
+def test_native_zoom_tiles_rendered_from_source(tile_cache):
+    client.get("/datasets/0/image/tiles/1/0/1")
+    client.get("/datasets/0/image/tiles/0/0/0")
+    assert calls == [("image", 1, 0, 1, None), ("image", 0, 0, 0, None)]
+
+
+@pytest.mark.parametrize("max_zoom", [1])
+def test_max_zoom_skips_driver_spacing(tile_cache, monkeypatch):
+    def dataset_zoom(*args, **kwargs):
+        raise AssertionError("grid spacing looked up")
+    monkeypatch.setattr(overzoom, "dataset_zoom", dataset_zoom)
+    response = client.get("/datasets/0/image/tiles/2/1/3")
+    assert response.status_code == 200
+    assert calls == [("image", 1, 0, 1, None)]
+
+
+def test_default_grid_spacing_not_asked(tile_cache, monkeypatch):
+    def dataset_zoom(*args, **kwargs):
+        raise AssertionError("grid spacing looked up")
+    monkeypatch.setattr(overzoom, "dataset_zoom", dataset_zoom)
+    response = client.get("/datasets/0/air/tiles/2/1/3")
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("driver_name", ["spacing_driver"])
+def test_grid_spacing_asked_once(tile_cache):
+    client.get("/datasets/0/image/tiles/2/1/3")
+    client.get("/datasets/0/image/tiles/2/0/2")
+    assert calls == [("grid_spacing", "image"), ("image", 1, 0, 1, None)]
+
+
+@pytest.mark.parametrize("reduction", ["mean"])
+def test_reduction_from_cached_children(tile_cache):
+    for x, y in [(0, 2), (1, 2), (0, 3), (1, 3)]:
+        client.get(f"/datasets/0/image/tiles/2/{x}/{y}")
+    calls.clear()
+    actual = client.get("/datasets/0/image/tiles/1/0/1").json()
+    assert actual["data"]["image"] == [[[2.5, 2.5], [2.5, 2.5]]]
+    assert actual["data"]["tile_key"] == [[0, 1, 1]]
+    assert calls == []
+
+
+@pytest.mark.parametrize("reduction", ["mean"])
+def test_reduction_falls_back_to_source(tile_cache):
+    for x, y in [(0, 2), (1, 2), (0, 3)]:
+        client.get(f"/datasets/0/image/tiles/2/{x}/{y}")
+    calls.clear()
+    client.get("/datasets/0/image/tiles/1/0/1")
+    assert calls == [("image", 1, 0, 1, None)]
+
+
+@pytest.mark.parametrize("max_zoom", [1])
+@pytest.mark.parametrize("reduction", ["mean"])
+def test_reduction_skipped_at_native_zoom(tile_cache, monkeypatch):
+    async def reduced_tile(*args):
+        raise AssertionError("children looked up")
+    monkeypatch.setattr(datasets, "reduced_tile", reduced_tile)
+    client.get("/datasets/0/image/tiles/1/0/1")
+    assert calls == [("image", 1, 0, 1, None)]
+
+
+@pytest.mark.parametrize("metatile", [2])
+def test_metatile_renders_block_once(tile_cache):
+    north_east = client.get("/datasets/0/image/tiles/2/1/3").json()
+    assert north_east["data"]["image"] == [[[11., 12.], [15., 16.]]]
+    assert north_east["data"]["tile_key"] == [[1, 3, 2]]
+    datasets.metatiles.clear()
+    south_west = client.get("/datasets/0/image/tiles/2/0/2").json()
+    assert south_west["data"]["image"] == [[[1., 2.], [5., 6.]]]
+    assert calls == [("image", 1, 0, 1, None)]
+
+
+@pytest.mark.parametrize("metatile", [2])
+def test_metatile_errors_fall_back_to_single_tile(tile_cache):
+    client.get("/datasets/0/broken/tiles/2/1/3")
+    assert calls == [("broken", 1, 0, 1, None), ("broken", 2, 1, 3, None)]
+
+
+@pytest.mark.parametrize("metatile", [2])
+@pytest.mark.parametrize("driver_name", ["fixed_size_driver"])
+def test_metatile_needs_tile_size_keyword(tile_cache):
+    response = client.get("/datasets/0/image/tiles/2/1/3")
+    assert response.status_code == 200
+    assert response.json()["data"]["image"] == [[[1., 2.], [3., 4.]]]
+    assert calls == [("image", 2, 1, 3, None)]
+
+
+@pytest.mark.parametrize("deadline", [0.05])
+def test_provisional_tile_from_cached_ancestor(tile_cache):
+    client.get("/datasets/0/slow/tiles/1/0/1")
+    response = client.get("/datasets/0/slow/tiles/2/1/3")
+    assert response.headers["x-tile-provisional"] == "true"
+    assert response.headers["cache-control"] == "no-store"
+    assert response.json()["data"]["image"] == [[[4., 4.], [4., 4.]]]
+    for _ in range(20):
+        response = client.get("/datasets/0/slow/tiles/2/1/3")
+        if "x-tile-provisional" not in response.headers:
+            break
+        time.sleep(0.05)
+    assert response.json()["data"]["image"] == [[[1., 2.], [3., 4.]]]
+    assert calls == [("slow", 1, 0, 1, None), ("slow", 2, 1, 3, None)]
+
+
+@pytest.mark.parametrize("deadline", [0.05])
+def test_deadline_counts_from_arrival(tile_cache, monkeypatch):
+    client.get("/datasets/0/slow/tiles/1/0/1")
+
+    async def dataset_zoom(*args):
+        await asyncio.sleep(0.05)  # e.g. queued behind other requests
+        return None
+
+    timeouts = []
+    wait = asyncio.wait
+
+    def record(*args, timeout=None, **kwargs):
+        timeouts.append(timeout)
+        return wait(*args, timeout=timeout, **kwargs)
+
+    monkeypatch.setattr(datasets, "dataset_zoom", dataset_zoom)
+    monkeypatch.setattr(asyncio, "wait", record)
+    response = client.get("/datasets/0/slow/tiles/2/1/3")
+    assert response.headers["x-tile-provisional"] == "true"
+    assert 0. in timeouts
+
+
+@pytest.mark.parametrize("deadline", [0.05])
+def test_deadline_waits_without_cached_ancestor(tile_cache):
+    response = client.get("/datasets/0/slow/tiles/2/1/3")
+    assert "x-tile-provisional" not in response.headers
+    assert response.json()["data"]["image"] == [[[1., 2.], [3., 4.]]]
+
+
+def test_tile_request_stops_when_client_disconnects(tile_cache):
+    """Client gone after 50ms while the driver takes 200ms"""
+    messages = []
+    gone = time.monotonic() + 0.05
+    scope = {"type": "http", "method": "GET", "scheme": "http",
+             "http_version": "1.1", "root_path": "", "query_string": b"",
+             "path": "/datasets/0/slow/tiles/2/1/3", "headers": [],
+             "server": ("testserver", 80), "client": ("testclient", 50000)}
+
+    async def receive():
+        while time.monotonic() < gone:
+            await asyncio.sleep(0.01)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+
+    start = time.monotonic()
+    asyncio.run(main.app(scope, receive, send))
+    assert time.monotonic() - start < 0.2
+    assert messages[0]["status"] == datasets.CLIENT_CLOSED_REQUEST
+
+
+@pytest.mark.parametrize("driver_name", ["old_geojson_driver"])
+def test_geojson_driver_without_filters(tile_cache):
+    response = client.get("/datasets/0/times/0/geojson")
+    assert response.status_code == 200
+    assert response.json()["features"] == []
@@ -0,0 +1,39 @@
+from fastapi.testclient import TestClient
+from forest_lite.server import main, config
+from forest_lite.server.drivers.base import BaseDriver
+
+
+client = TestClient(main.app)
+
+driver = BaseDriver()
+
+
+@driver.override("description")
+def description(settings):
+    return {"data_vars": {}}
+
+
+def test_metrics_endpoint():
+    settings = config.Settings(datasets=[{
+        "label": "Metrics",
+        "driver": {
+            "name": "forest_lite.test.test_routers_metrics:driver",
+            "settings": {}
+        }
+    }])
+    main.app.dependency_overrides[config.get_settings] = lambda: settings
+    client.get("/datasets/0")
+    response = client.get("/metrics")
+    del main.app.dependency_overrides[config.get_settings]
+    assert response.headers["content-type"].startswith("text/plain")
+    lines = response.text.splitlines()
+    assert any(line.startswith(
+        'forest_lite_requests_total{route="/datasets/{dataset_id}",'
+        'dataset="0",status="200"}')
+        for line in lines)
+    assert any(line.startswith(
+        'forest_lite_driver_duration_seconds_count{driver="forest_lite'
+        '.test.test_routers_metrics:driver",method="description"}')
+        for line in lines)
+    assert "forest_lite_requests_in_flight 1" in lines  # /metrics itself
+    assert "forest_lite_worker_queue_depth 0" in lines
@@ -53,3 +53,23 @@ def test_coastlines_intersecting_geometries():
     response = client.get(url)
     result = response.json()
     assert len(result["xs"]) == 2
+
+
+def test_natural_earth_feature_tile(monkeypatch):
+    import shapely.geometry
+    from forest_lite.server.lib import atlas as lib_atlas
+    line = shapely.geometry.LineString([(0, 0), (90, 45)])
+    monkeypatch.setattr(lib_atlas, "feature_index",
+                        lambda *args: lib_atlas.FeatureIndex([line]))
+    lib_atlas.feature_tile.cache_clear()
+    response = client.get("/natural_earth_feature/physical/coastline/tiles/1/1/1")
+    lib_atlas.feature_tile.cache_clear()
+    result = response.json()
+    assert len(result["xs"]) == 1
+    assert len(result["xs"][0]) == 2
+
+
+@pytest.mark.parametrize("zxy", ["0/1/0", "1/0/2", "-1/0/0"])
+def test_natural_earth_feature_tile_out_of_range(zxy):
+    response = client.get(f"/natural_earth_feature/physical/coastline/tiles/{zxy}")
+    assert response.status_code == 404
@@ -0,0 +1,52 @@
+import pytest
+from fastapi.testclient import TestClient
+from forest_lite.server import main, config
+
+
+client = TestClient(main.app)
+
+
+@pytest.fixture
+def settings():
+    settings = config.Settings(profiling={"enabled": True,
+                                          "token": "secret",
+                                          "interval": 0.001})
+    main.app.dependency_overrides[config.get_settings] = lambda: settings
+    yield settings
+    del main.app.dependency_overrides[config.get_settings]
+
+
+def test_profile_disabled_by_default():
+    settings = config.Settings()
+    main.app.dependency_overrides[config.get_settings] = lambda: settings
+    response = client.get("/profile", params={"seconds": 0})
+    del main.app.dependency_overrides[config.get_settings]
+    assert response.status_code == 404
+
+
+def test_profile_requires_token(settings):
+    response = client.get("/profile", params={"seconds": 0,
+                                              "token": "wrong"})
+    assert response.status_code == 403
+
+
+def test_profile_window(settings):
+    response = client.get("/profile", params={"seconds": 0.02},
+                          headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert int(response.headers["x-profile-samples"]) > 0
+
+
+def test_profile_request(settings):
+    response = client.get("/profile/request",
+                          params={"path": "/viewport", "token": "secret"})
+    assert response.status_code == 200
+    assert response.headers["x-profiled-status"] == "200"
+
+
+def test_profile_request_rejects_profile_path(settings):
+    response = client.get("/profile/request",
+                          params={"path": "/profile?seconds=1",
+                                  "token": "secret"})
+    assert response.status_code == 422
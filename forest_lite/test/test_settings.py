@@ -37,3 +37,70 @@ def test_datasets_endpoint():
              "view": "tiled_image"},
         ]
     }
+
+
+def write_config(path, labels, mtime_ns):
+    import os
+    with open(path, "w") as stream:
+        yaml.dump({"datasets": [{"label": label} for label in labels]},
+                  stream)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_config_file_parsed_once(tmpdir):
+    path = str(tmpdir / "config.yaml")
+    write_config(path, ["Foo"], 10**9)
+    get_settings = config.ConfigFile(path)
+    assert get_settings() is get_settings()
+
+
+def test_config_file_reuses_parsed_settings(tmpdir, monkeypatch):
+    import os
+    path = str(tmpdir / "config.yaml")
+    write_config(path, ["Foo"], 10**9)
+    settings = config.load(path)
+    get_settings = config.ConfigFile(path)
+    get_settings.reload(os.stat(path).st_mtime_ns, parsed=settings)
+    monkeypatch.setattr(config, "load", None)  # Not parsed again
+    assert get_settings() is settings
+
+
+def test_config_file_reloaded_on_mtime_change(tmpdir):
+    path = str(tmpdir / "config.yaml")
+    write_config(path, ["Foo"], 10**9)
+    get_settings = config.ConfigFile(path)
+    assert [d.label for d in get_settings().datasets] == ["Foo"]
+    write_config(path, ["Foo", "Bar"], 2 * 10**9)
+    assert [d.label for d in get_settings().datasets] == ["Foo", "Bar"]
+
+
+def test_config_file_keeps_previous_settings_on_bad_reload(tmpdir):
+    import os
+    path = str(tmpdir / "config.yaml")
+    write_config(path, ["Foo"], 10**9)
+    get_settings = config.ConfigFile(path)
+    settings = get_settings()
+    with open(path, "w") as stream:
+        stream.write("datasets: [{label: ")
+    os.utime(path, ns=(2 * 10**9, 2 * 10**9))
+    assert get_settings() is settings
+
+
+def test_config_file_bad_reload_parsed_once(tmpdir, monkeypatch):
+    import os
+    path = str(tmpdir / "config.yaml")
+    write_config(path, ["Foo"], 10**9)
+    get_settings = config.ConfigFile(path)
+    settings = get_settings()
+    with open(path, "w") as stream:
+        stream.write("datasets: [{label: ")
+    os.utime(path, ns=(2 * 10**9, 2 * 10**9))
+    calls = []
+    load = config.load
+    monkeypatch.setattr(config, "load",
+                        lambda path: calls.append(path) or load(path))
+    assert get_settings() is settings
+    assert get_settings() is settings
+    assert len(calls) == 1
+    write_config(path, ["Foo", "Bar"], 3 * 10**9)
+    assert [d.label for d in get_settings().datasets] == ["Foo", "Bar"]
@@ -0,0 +1,30 @@
+import subprocess
+import sys
+from forest_lite.server.startup import Profile, HEAVY_MODULES
+
+
+def test_profile_measure():
+    profile = Profile()
+    with profile.measure("step"):
+        pass
+    label, seconds = profile.records[0]
+    assert label == "step"
+    assert seconds >= 0
+
+
+def test_profile_report():
+    profile = Profile()
+    profile.records = [("a", 0.001), ("bb", 0.002)]
+    lines = profile.report().splitlines()
+    assert lines[0].split() == ["a", "1.0", "ms"]
+    assert lines[1].split() == ["bb", "2.0", "ms"]
+    assert lines[2].split() == ["total", "3.0", "ms"]
+
+
+def test_server_import_does_not_load_heavy_modules():
+    script = ("import sys, json, forest_lite.server.main;"
+              f"print(json.dumps([m for m in {HEAVY_MODULES!r}"
+              " if m in sys.modules]))")
+    result = subprocess.run([sys.executable, "-c", script],
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
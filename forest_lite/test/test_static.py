@@ -0,0 +1,78 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from forest_lite.server import main
+from forest_lite.server.lib import assets
+from forest_lite.server.static import IMMUTABLE, StaticAssets
+
+
+BODY = b"function main() {}\n" * 200
+
+
+@pytest.fixture
+def static(tmpdir):
+    tmpdir.join("lite.min.js").write_binary(BODY)
+    assets.precompress(str(tmpdir), encodings=["gzip"])
+    return StaticAssets(directory=str(tmpdir))
+
+
+@pytest.fixture
+def client(static):
+    app = FastAPI()
+    app.mount("/static", static)
+    return TestClient(app)
+
+
+def test_hashed_name_is_immutable(client, static):
+    response = client.get(f"/static/{static.url('lite.min.js')}")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == IMMUTABLE
+    assert response.content == BODY
+
+
+def test_plain_name_is_revalidated(client):
+    response = client.get("/static/lite.min.js")
+    assert response.headers["cache-control"] == "no-cache"
+
+
+def test_other_build_serves_current_file(client):
+    response = client.get("/static/lite.min.0123456789ab.js")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "no-cache"
+    assert response.content == BODY
+
+
+def test_missing_hashed_name_not_found(client):
+    response = client.get("/static/missing.0123456789ab.js")
+    assert response.status_code == 404
+
+
+def test_precompressed_copy(client):
+    response = client.get("/static/lite.min.js",
+                          headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "javascript" in response.headers["content-type"]
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.content == BODY
+
+
+def test_identity(client):
+    response = client.get("/static/lite.min.js",
+                          headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.content == BODY
+
+
+def test_not_modified(client):
+    headers = {"Accept-Encoding": "gzip"}
+    response = client.get("/static/lite.min.js", headers=headers)
+    headers["If-None-Match"] = response.headers["etag"]
+    response = client.get("/static/lite.min.js", headers=headers)
+    assert response.status_code == 304
+
+
+def test_index_links_hashed_names():
+    response = TestClient(main.app).get("/")
+    assert main.static.url("style.css") in response.text
+    assert main.static.url("style.css") != "style.css"
@@ -0,0 +1,79 @@
+import pytest
+from fastapi.testclient import TestClient
+from forest_lite.server import main, warmup
+from forest_lite.server.lib.config import Config
+from forest_lite.test.helpers import sample_h5netcdf
+
+
+client = TestClient(main.app)
+
+
+@pytest.fixture
+def progress():
+    return warmup.Progress()
+
+
+def settings(datasets):
+    return Config(warm_up={"enabled": True}, datasets=datasets)
+
+
+def test_progress_disabled_is_ready(progress):
+    assert progress.dict()["ready"]
+    assert progress.dict()["state"] == "disabled"
+
+
+def test_progress_steps(progress):
+    progress.start(["a", "b"])
+    assert progress.dict() == {
+        "ready": False,
+        "state": "running",
+        "completed": 0,
+        "total": 2,
+        "current": "a",
+        "errors": []
+    }
+    progress.step_done()
+    progress.step_done(error=Exception("boom"))
+    actual = progress.dict()
+    assert actual["ready"]
+    assert actual["errors"] == ["b: boom"]
+
+
+def test_run_records_failed_dataset(monkeypatch, progress):
+    monkeypatch.setattr(warmup, "warm_kernels", lambda: None)
+    warmup.run(settings([
+        {"label": "Missing", "driver": {"name": "not_a_driver"}},
+        {"label": "Palette only"}
+    ]), progress=progress)
+    actual = progress.dict()
+    assert actual["ready"]
+    assert actual["total"] == 2
+    assert actual["errors"][0].startswith("dataset Missing:")
+
+
+def test_warm_dataset(monkeypatch, tmpdir, progress):
+    path = str(tmpdir / "file.nc")
+    sample_h5netcdf(path)
+    monkeypatch.setattr(warmup, "warm_kernels", lambda: None)
+    warmup.run(settings([{
+        "label": "Label",
+        "driver": {"name": "xarray_h5netcdf",
+                   "settings": {"pattern": path}}
+    }]), progress=progress)
+    assert progress.dict()["errors"] == []
+
+
+def test_start_given_disabled_does_nothing(progress):
+    assert warmup.start(Config(), progress=progress) is None
+    assert progress.state == "disabled"
+
+
+def test_ready_endpoint(monkeypatch, progress):
+    monkeypatch.setattr(warmup, "progress", progress)
+    progress.start(["kernels"])
+    response = client.get("/ready")
+    assert response.status_code == 503
+    progress.step_done()
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json()["ready"]
@@ -5,6 +5,7 @@ import os
 import re
 import json
 import subprocess
+import sys
 import setuptools
 import setuptools.command.build_py
 import setuptools.command.develop
@@ -58,6 +59,10 @@ class BuildJSCommand(setuptools.command.build_py.build_py):
             subprocess.check_call(["npm", "install"])
         subprocess.check_call(["npm", "run", "build"])
         os.chdir(cwd)
+        # Compressed copies of assets served by /static
+        subprocess.check_call([sys.executable, "-m",
+                               "forest_lite.server.lib.assets",
+                               os.path.join(JS_DIR, "static")])
         super().run()
 
 
@@ -73,7 +78,7 @@ setuptools.setup(
         "build_js": BuildJSCommand,
     },
     packages=setuptools.find_packages(),
-    python_requires=">=3.6",
+    python_requires=">=3.8",
     entry_points={
         "console_scripts": [
             "forest_lite=forest_lite.cli:app"